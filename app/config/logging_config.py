@@ -1,21 +1,157 @@
+import atexit
+import copy
 import logging
-import logging.config
-
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "default": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"}
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-        }
-    },
-    "root": {
-        "level": "INFO",
-        "handlers": ["console"],
-    },
-}
-logging.config.dictConfig(LOGGING_CONFIG)
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from pythonjsonlogger.json import JsonFormatter
+from app.config.settings import get_settings
+from app.services.tracing import current_context
+
+TEXT_FORMAT = (
+    "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+)
+JSON_FORMAT = "%(name)s %(levelname)s %(message)s"
+
+REDACTED = "[REDACTED]"
+_JWT_PATTERN = re.compile(r"eyJ[\w-]*\.[\w-]+\.[\w-]*")
+_SESSION_ID_PATTERN = re.compile(r"(session_id[\"']?\s*[:=]\s*[\"']?)[\w-]+", re.I)
+_SENSITIVE_FIELDS = frozenset(
+    {"token", "session_id", "authorization", "password", "refresh_token"}
+)
+
+_listener: Optional[QueueListener] = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of a logger's sub-WARNING records, warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class RedactionFilter(logging.Filter):
+    """Masks JWTs, session ids and credential-like extra fields before a record is written."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # An exception here would end the listener thread, and every later
+        # record would be dropped without a trace
+        try:
+            message = record.getMessage()
+            formatted = True
+        except Exception:
+            # Arguments that don't fit the format string; they may hold
+            # anything, so only the format string is kept
+            message = f"{record.msg!s} [unformatted: arguments didn't match]"
+            formatted = False
+        redacted = _SESSION_ID_PATTERN.sub(
+            rf"\g<1>{REDACTED}", _JWT_PATTERN.sub(REDACTED, message)
+        )
+        if redacted != message or not formatted:
+            record.msg = redacted
+            record.args = None
+        for field in _SENSITIVE_FIELDS.intersection(record.__dict__):
+            setattr(record, field, REDACTED)
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamps records with the correlation id, caller and trace id of the request
+    being handled. Attached to the queue handler, so it runs on the thread that
+    logged, where the request context is visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = current_context()
+        if context is None:
+            record.correlation_id = record.caller = record.trace_id = "-"
+        else:
+            record.correlation_id = context.correlation_id
+            record.caller = context.caller
+            record.trace_id = context.trace_id
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock prepare() formats the whole record on the calling thread. Only
+    # msg % args is done here, before mutable arguments can change under the
+    # listener; the formatter and the redaction still run on its thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not record.args:
+            return record
+        try:
+            message = record.getMessage()
+        except Exception:
+            # Left for RedactionFilter, which reports it on the listener thread
+            return record
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on a slow stdout, drop the record instead
+            pass
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name] = float(rate)
+    return rates
+
+
+def setup_logging() -> None:
+    """
+    Routes all logging through a bounded queue drained by a background thread,
+    so request handlers only pay for creating the record.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    settings = get_settings()
+    output = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        output.setFormatter(JsonFormatter(JSON_FORMAT, timestamp=True))
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    output.addFilter(RedactionFilter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(settings.log_queue_size)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = _DeferredQueueHandler(log_queue)
+    # Handler filters run on the calling thread, before the record is queued
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    root.setLevel(settings.log_level)
+
+    for name, rate in parse_sampling(settings.log_sampling).items():
+        if rate < 1:
+            logging.getLogger(name).addFilter(SamplingFilter(rate))
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
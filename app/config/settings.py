@@ -0,0 +1,197 @@
+import dataclasses
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Mapping, Optional, get_type_hints
+
+from dotenv import load_dotenv
+
+_TRUE_VALUES = ("1", "true", "yes")
+
+
+def _cpu_count() -> int:
+    return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Every setting read from the environment (and .env), each one from the
+    variable named after the field in upper case, e.g. SECRET_KEY.
+    """
+
+    # JWT
+    secret_key: Optional[str] = None
+    jwt_algorithm: str = "HS256"
+    # hours, for tokens generated without an explicit lifetime
+    jwt_expiration_time: int = 1
+    # lifetime of the access tokens issued at login and refresh
+    jwt_access_token_seconds: int = 900
+    # directory of <kid>.pem keys; when set, tokens are signed with
+    # RS256/ES256/EdDSA keys from it instead of the shared secret_key
+    jwt_keys_dir: Optional[str] = None
+    jwt_signing_kid: Optional[str] = None
+    jwt_keys_reload_seconds: float = 30.0
+    jwks_max_age: int = 300
+    jwt_cache_max_entries: int = 10_000
+    # sliding lifetime of a refresh token family, extended on every rotation
+    refresh_token_ttl_seconds: int = 7 * 24 * 3600
+    # a login beyond this many refresh token families for one user ends and
+    # revokes their oldest; 0 is unlimited, which the "shm" backend refuses
+    refresh_token_max_per_user: int = 10
+    revocation_bloom_capacity: int = 100_000
+    # how often revocations made by other replicas are pulled from a shared backend
+    revocation_sync_seconds: float = 15.0
+    introspect_batch_max_items: int = 500
+
+    # Sessions: "memory" keeps them in this process, "shm" shares them between the
+    # worker processes of one host, "mongo" shares them between replicas
+    session_backend: str = "memory"
+    session_store_shards: int = 16
+    session_store_max_entries: int = 100_000
+    # how often the "memory" and "shm" backends drop expired sessions; 0 only
+    # drops them as new sessions come in
+    session_purge_seconds: float = 60.0
+    # creating a session beyond this many for one user ends their oldest; 0 is
+    # unlimited, which the "shm" backend refuses
+    session_max_per_user: int = 10
+    # key of the HMAC tag in session ids, derived from secret_key when unset
+    session_id_secret: Optional[str] = None
+    # a session ends this long after login however often it is touched; the
+    # limit is part of its id, so expired cookies are rejected without a lookup
+    session_max_lifetime_seconds: int = 3600
+    # keep accepting uuid4 session ids from before signed ids; each one is
+    # replaced by a signed id on its next use
+    session_accept_legacy_ids: bool = True
+    # path prefix of the "shm" backend's table files, default /dev/shm/aitext
+    session_shm_path: Optional[str] = None
+    # directory where the "memory" backend persists its sessions; unset keeps
+    # them in memory only
+    session_persist_dir: Optional[str] = None
+    session_persist_fsync_ms: int = 100
+    session_snapshot_seconds: float = 300.0
+
+    # Users
+    user_repository: str = "memory"
+    user_cache_ttl_seconds: float = 300.0
+    # unknown usernames are cached briefly so repeated bad logins skip the database
+    user_cache_negative_ttl_seconds: float = 30.0
+    user_cache_max_entries: int = 10_000
+
+    # MongoDB
+    mongo_uri: str = "mongodb://localhost:27017"
+    mongo_db_name: str = "aitext"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 10
+    mongo_session_collection: str = "sessions"
+    mongo_revocation_collection: str = "revoked_tokens"
+    mongo_refresh_token_collection: str = "refresh_tokens"
+    mongo_user_collection: str = "users"
+    # session writes are grouped into one bulk_write per batch, flushed when
+    # full or after the interval
+    mongo_write_batch_size: int = 100
+    mongo_write_flush_ms: int = 5
+
+    # Password hashing: 0 workers keeps bcrypt in-process (on a worker thread)
+    bcrypt_pool_workers: int = field(default_factory=_cpu_count)
+    # verifications allowed to wait for a free worker before logins are rejected
+    bcrypt_pool_max_pending: int = 64
+
+    # Login throttling, one token bucket per username, client IP and x-caller
+    login_throttle_enabled: bool = True
+    login_throttle_max_entries: int = 100_000
+    login_throttle_username_burst: float = 10.0
+    login_throttle_username_rate: float = 0.2
+    login_throttle_username_lockout_after: int = 5
+    # the client IP is the proxy's unless server_forwarded_allow_ips lists the
+    # proxies in front, and then every login would share one bucket; enable
+    # the IP dimension once it does
+    login_throttle_ip_enabled: bool = False
+    login_throttle_ip_burst: float = 50.0
+    login_throttle_ip_rate: float = 2.0
+    login_throttle_ip_lockout_after: int = 20
+    # x-caller is usually a whole upstream service, so it only caps the overall rate
+    login_throttle_caller_burst: float = 500.0
+    login_throttle_caller_rate: float = 50.0
+    login_throttle_caller_lockout_after: int = 0
+    # failures older than this are forgotten, so the lockout decays on its own
+    login_failure_window_seconds: float = 900.0
+    login_lockout_base_seconds: float = 1.0
+    login_lockout_max_seconds: float = 900.0
+
+    # Admission control: an adaptive concurrency limit per route, see readme.
+    # Comma separated "<path>=<priority>" pairs, critical, normal or low;
+    # routes not listed are normal
+    admission_enabled: bool = True
+    admission_route_priorities: str = (
+        "/auth/protected=critical,/auth/introspect/batch=critical,/auth/login=low"
+    )
+    # how long a request over the limit may wait for a slot before it is shed
+    admission_queue_timeout_ms: int = 50
+    admission_retry_after_seconds: int = 1
+
+    # Server, used by `python -m app.serve`
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    # uvicorn workers; 0 runs one per CPU allowed by the affinity mask and cgroup quota
+    web_concurrency: int = 0
+    server_backlog: int = 2048
+    # longer than the idle timeout of the load balancer in front (60s on most),
+    # so it never reuses a connection the server is closing
+    server_keepalive_seconds: int = 75
+    # in-flight requests get this long to finish after SIGTERM
+    server_graceful_timeout_seconds: int = 30
+    # each worker is replaced after this many requests plus up to the jitter,
+    # bounding slow leaks; 0 disables recycling
+    server_max_requests: int = 100_000
+    server_max_requests_jitter: int = 10_000
+    server_access_log: bool = False
+    # proxies trusted for X-Forwarded-For, which sets the client IP used by
+    # the login throttle
+    server_forwarded_allow_ips: str = "127.0.0.1"
+
+    # Observability
+    metrics_enabled: bool = True
+    # "json" for structured output, "text" for the classic single line format
+    log_format: str = "json"
+    log_level: str = "INFO"
+    log_queue_size: int = 10_000
+    # comma separated "<logger>=<rate>" pairs, rates apply to records below WARNING
+    log_sampling: str = (
+        "auth_router=0.1,session_service=0.1,app.services.auth_service=0.1"
+    )
+    # file that sampled request traces are appended to as OTLP/JSON lines;
+    # tracing is off when unset
+    trace_export_path: Optional[str] = None
+    trace_sample_rate: float = 0.01
+    trace_queue_size: int = 1000
+    # exposes /admin/profiler to users with the profiler:control permission
+    profiler_enabled: bool = False
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str]) -> "Settings":
+        hints = get_type_hints(cls)
+        values = {}
+        for setting in dataclasses.fields(cls):
+            raw = environ.get(setting.name.upper())
+            if raw is None or raw.strip() == "":
+                continue
+            values[setting.name] = _parse(raw.strip(), hints[setting.name])
+        return cls(**values)
+
+
+def _parse(raw: str, hint: Any) -> Any:
+    if hint is bool:
+        return raw.lower() in _TRUE_VALUES
+    if hint is int:
+        return int(raw)
+    if hint is float:
+        return float(raw)
+    return raw
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Loads .env and the environment once, on first use."""
+    load_dotenv()
+    return Settings.from_env(os.environ)
@@ -1,7 +1,15 @@
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, Tuple
 from pydantic import BaseModel
+from starlette.responses import Response
 import json
 
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:  # pragma: no cover - orjson is optional
+    HAS_ORJSON = False
+
 
 class BaseResponse(BaseModel):
     api_response_code: int
@@ -9,12 +17,23 @@ class BaseResponse(BaseModel):
     version: Optional[str] = None
 
 
+def encode_json(content: Any) -> bytes:
+    """Compact JSON bytes, identical to what JSONResponse/ORJSONResponse would send."""
+    if HAS_ORJSON:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
 class ShipotleError(Exception):
     INTERNAL_ERROR = 5000
     FORBIDDEN = 4003
     AUTHORIZATION = 4001
     BADREQUEST = 4000
     RESOURCE_NOT_FOUND = 4004
+    SERVICE_UNAVAILABLE = 5003
+    TOO_MANY_REQUESTS = 4029
 
     error_response: BaseResponse
 
@@ -23,32 +42,16 @@ class ShipotleError(Exception):
         error_response: BaseResponse,
         message: str = "An error occured",
         ex: Optional[Exception] = None,
+        headers: Optional[Dict[str, str]] = None,
     ):
         full_message = f"{message} && {str(ex)}" if ex else message
         super().__init__(full_message)
         self.error_response = error_response
+        self.headers = headers
 
     @staticmethod
     def get_error_mapping(api_response_code: int) -> Dict:
-        error_mappings = {
-            ShipotleError.INTERNAL_ERROR: {
-                "status_code": 500,
-                "message": "Internal Server Error",
-            },
-            ShipotleError.FORBIDDEN: {"status_code": 403, "message": "Forbidden Error"},
-            ShipotleError.AUTHORIZATION: {
-                "status_code": 401,
-                "message": "Authorization Error",
-            },
-            ShipotleError.BADREQUEST: {"status_code": 400, "message": "Bad Request"},
-            ShipotleError.RESOURCE_NOT_FOUND: {
-                "status_code": 404,
-                "message": "Resource Not Found",
-            },
-        }
-        return error_mappings.get(
-            api_response_code, {"status_code": 500, "message": "Unknown Error"}
-        )
+        return ERROR_MAPPINGS.get(api_response_code, UNKNOWN_ERROR_MAPPING)
 
     def __str__(self):
         return json.dumps(self.error_response.dict())
@@ -61,3 +64,60 @@ class ShipotleError(Exception):
             "status_code": error_mapping["status_code"],
             "message": self.error_response.message,
         }
+
+    def to_response(self) -> Response:
+        status_code, body = get_encoded_error(
+            self.error_response.api_response_code, self.error_response.message
+        )
+        return Response(
+            content=body,
+            status_code=status_code,
+            headers=self.headers,
+            media_type="application/json",
+        )
+
+
+ERROR_MAPPINGS: Dict[int, Dict[str, Any]] = {
+    ShipotleError.INTERNAL_ERROR: {
+        "status_code": 500,
+        "message": "Internal Server Error",
+    },
+    ShipotleError.FORBIDDEN: {"status_code": 403, "message": "Forbidden Error"},
+    ShipotleError.AUTHORIZATION: {
+        "status_code": 401,
+        "message": "Authorization Error",
+    },
+    ShipotleError.BADREQUEST: {"status_code": 400, "message": "Bad Request"},
+    ShipotleError.RESOURCE_NOT_FOUND: {
+        "status_code": 404,
+        "message": "Resource Not Found",
+    },
+    ShipotleError.SERVICE_UNAVAILABLE: {
+        "status_code": 503,
+        "message": "Service Unavailable",
+    },
+    ShipotleError.TOO_MANY_REQUESTS: {
+        "status_code": 429,
+        "message": "Too Many Requests",
+    },
+}
+UNKNOWN_ERROR_MAPPING: Dict[str, Any] = {"status_code": 500, "message": "Unknown Error"}
+
+# Error messages are almost always literals, so the set of (code, message) pairs is
+# small; the cap only guards against messages that embed request data
+MAX_ENCODED_ERRORS = 1024
+_encoded_errors: Dict[Tuple[int, str], Tuple[int, bytes]] = {}
+
+
+def get_encoded_error(api_response_code: int, message: str) -> Tuple[int, bytes]:
+    key = (api_response_code, message)
+    encoded = _encoded_errors.get(key)
+    if encoded is None:
+        status_code = ShipotleError.get_error_mapping(api_response_code)["status_code"]
+        encoded = (
+            status_code,
+            encode_json({"status_code": status_code, "message": message}),
+        )
+        if len(_encoded_errors) < MAX_ENCODED_ERRORS:
+            _encoded_errors[key] = encoded
+    return encoded
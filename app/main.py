@@ -1,25 +1,70 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI, Request
 from app.routers.auth_router import router as auth_router
-from app.middleware.session_middleware import session_middleware
-from app.config.logging_config import LOGGING_CONFIG
-from fastapi.responses import JSONResponse
-from app.error.py_error import ShipotleError
+from app.middleware.session_middleware import SessionMiddleware
+from app.middleware.admission_middleware import AdmissionMiddleware
+from app.middleware.profiling_middleware import ProfilingMiddleware
+from app.config.logging_config import setup_logging
+from app.config.settings import get_settings
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.error.py_error import HAS_ORJSON, ShipotleError
+from app.routers.metrics_router import router as metrics_router
+from app.routers.jwks_router import router as jwks_router
+from app.routers.profiler_router import router as profiler_router
+from app.services.metrics import SHIPOTLE_ERRORS
+from app.services.password_hasher import PasswordHasher
+from app.services.session_service import SessionService
+from app.services.revocation_service import RevocationService
+from app.services.auth_service import AuthenticationService
+from app.services.jwt_handler import JWTHandler
+from app.services.tracing import setup_tracing, shutdown_tracing
 import logging
+import time
 
-app = FastAPI()
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Nothing is configured or connected at import time, it all happens here
+    started = time.perf_counter()
+    setup_logging()
+    setup_tracing()
+    PasswordHasher.start()
+    JWTHandler.start()
+    await SessionService.start()
+    await RevocationService.start()
+    await AuthenticationService.start()
+    logger.info("Startup completed in %.3fs", time.perf_counter() - started)
+    yield
+    await AuthenticationService.close()
+    await RevocationService.close()
+    await SessionService.close()
+    PasswordHasher.shutdown()
+    shutdown_tracing()
+
+
+app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse,
+)
+
+
 @app.exception_handler(ShipotleError)
 async def pyerror_exception_handler(request: Request, exc: ShipotleError):
-    response_body = exc.to_action_result()
-    return JSONResponse(
-        status_code=response_body["status_code"],
-        content=response_body,
-    )
+    if get_settings().metrics_enabled:
+        SHIPOTLE_ERRORS.inc(str(exc.error_response.api_response_code))
+    return exc.to_response()
 
 
-app.middleware("http")(session_middleware)
+app.add_middleware(SessionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# Added last, so it is the outermost and sheds load before any other work
+app.add_middleware(AdmissionMiddleware)
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
+app.include_router(metrics_router)
+app.include_router(jwks_router)
+app.include_router(profiler_router, prefix="/admin/profiler", tags=["Admin"])
 
 # uvicorn app.main:app --reload
@@ -0,0 +1,78 @@
+import time
+from typing import Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config.settings import get_settings
+from app.error.py_error import ShipotleError, get_encoded_error
+from app.middleware.session_middleware import EXEMPT_PATHS
+from app.services.admission import AdmissionController, get_admission_controller
+from app.services.metrics import SHIPOTLE_ERRORS
+
+OVERLOADED_MESSAGE = "Server is overloaded, retry later"
+
+
+def _overloaded_response(retry_after: int) -> Tuple[Message, Message]:
+    status, body = get_encoded_error(
+        ShipotleError.SERVICE_UNAVAILABLE, OVERLOADED_MESSAGE
+    )
+    return (
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(retry_after).encode("latin-1")),
+            ],
+        },
+        {"type": "http.response.body", "body": body},
+    )
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware admitting each request through the adaptive
+    concurrency limiter of its route, before anything else is done for it.
+    Shed requests get a pre-encoded 503 with Retry-After; health, metrics and
+    documentation paths are never limited.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        settings = get_settings()
+        self.enabled = settings.admission_enabled
+        self.metrics_enabled = settings.metrics_enabled
+        self.controller: Optional[AdmissionController] = None
+        self.overloaded = _overloaded_response(settings.admission_retry_after_seconds)
+
+    def _setup(self, scope: Scope) -> AdmissionController:
+        controller = get_admission_controller()
+        # Starlette puts the application in the scope; its routes bound the
+        # set of limiters, unknown paths share one
+        application = scope.get("app")
+        if application is not None:
+            controller.set_routes(
+                getattr(route, "path", "") for route in application.routes
+            )
+        self.controller = controller
+        return controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller or self._setup(scope)
+        limiter = controller.limiter(scope["path"])
+        if not await limiter.acquire(controller.may_queue(limiter)):
+            start, body = self.overloaded
+            await send(start)
+            await send(body)
+            if self.metrics_enabled:
+                SHIPOTLE_ERRORS.inc(str(ShipotleError.SERVICE_UNAVAILABLE))
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
@@ -0,0 +1,32 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.services.profiler import active_session
+
+
+class ProfilingMiddleware:
+    """
+    Marks requests matching the running profile session (route and x-caller)
+    as in flight, so the sampler only records while they are being served.
+    Without a session this is a single lookup per request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        session = active_session()
+        if session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        caller = next(
+            (value for name, value in scope["headers"] if name == b"x-caller"), b""
+        )
+        if not session.matches(scope["path"], caller):
+            await self.app(scope, receive, send)
+            return
+
+        session.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished()
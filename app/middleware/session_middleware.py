@@ -1,41 +1,148 @@
+import json
 import logging
+import time
+from typing import Dict, Tuple
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.error.py_error import ShipotleError, BaseResponse
+from app.config.settings import get_settings
+from app.services.metrics import REQUEST_SECONDS, SHIPOTLE_ERRORS
+from app.services.tracing import (
+    current_context,
+    finish_request,
+    record_span,
+    start_request,
+)
 
 logger = logging.getLogger("session_middleware")
 
+REQUIRED_HEADERS = ("x-authscheme", "x-caller", "x-correlationid")
+EXEMPT_PATHS = frozenset(
+    {"/", "/docs", "/openapi.json", "/redoc", "/metrics", "/.well-known/jwks.json"}
+)
+# Anything else is reported as "other" to keep the metric label set bounded
+KNOWN_AUTHSCHEMES = {b"cookie": "cookie", b"jwt": "jwt"}
 
-async def session_middleware(request: Request, call_next):
-    logger.info(f"Session middleware invoked for path {request.url.path}")
+# Missing-header combinations are few, so each 400 response is encoded only once
+_missing_headers_responses: Dict[Tuple[str, ...], Tuple[Message, Message]] = {}
 
-    if request.url.path in ["/", "/docs", "/openapi.json", "/redoc"]:
-        return await call_next(request)
 
-    try:
-        check_required_headers(request, ["x-authscheme", "x-caller", "x-correlationid"])
-        request.state.x_caller = request.headers["x-caller"]
-        request.state.x_correlationid = request.headers["x-correlationid"]
-        request.state.x_authscheme = request.headers["x-authscheme"]
+def _missing_headers_response(missing: Tuple[str, ...]) -> Tuple[Message, Message]:
+    response = _missing_headers_responses.get(missing)
+    if response is None:
+        body = json.dumps(
+            {"detail": f"Missing required headers: {', '.join(missing)}"},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        response = (
+            {
+                "type": "http.response.start",
+                "status": 400,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            },
+            {"type": "http.response.body", "body": body},
+        )
+        _missing_headers_responses[missing] = response
+    return response
 
-        return await call_next(request)
 
-    except ShipotleError as e:
-        logger.error(f"middleware error {e}")
-        error_mapping = ShipotleError.get_error_mapping(
-            e.error_response.api_response_code
-        )
-        return JSONResponse(
-            status_code=error_mapping["status_code"],
-            content={"detail": e.error_response.message},
-        )
+class SessionMiddleware:
+    """
+    Pure ASGI middleware rejecting requests without the x-authscheme, x-caller
+    and x-correlationid headers, and exposing them on request.state and as the
+    request context picked up by log records and spans. Headers are read from
+    the raw ASGI scope in one pass; unexpected errors from the app are left to
+    Starlette's ServerErrorMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.metrics_enabled = get_settings().metrics_enabled
 
-    except Exception as e:
-        logger.error(f"Unexpected middleware error: {str(e)}")
-        return JSONResponse(
-            status_code=500,
-            content={"detail": "An unexpected error occurred in session middleware."},
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        started_ns = time.time_ns()
+        x_authscheme = x_caller = x_correlationid = b""
+        for name, value in scope["headers"]:
+            if name == b"x-authscheme":
+                x_authscheme = value
+            elif name == b"x-caller":
+                x_caller = value
+            elif name == b"x-correlationid":
+                x_correlationid = value
+
+        if not (x_authscheme and x_caller and x_correlationid):
+            missing = tuple(
+                header
+                for header, value in zip(
+                    REQUIRED_HEADERS, (x_authscheme, x_caller, x_correlationid)
+                )
+                if not value
+            )
+            logger.warning("Missing headers: %s", ", ".join(missing))
+            start, body = _missing_headers_response(missing)
+            await send(start)
+            await send(body)
+            if self.metrics_enabled:
+                SHIPOTLE_ERRORS.inc(str(ShipotleError.BADREQUEST))
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    "unmatched",
+                    "400",
+                    KNOWN_AUTHSCHEMES.get(x_authscheme, "other"),
+                )
+            return
+
+        state = scope.setdefault("state", {})
+        state["x_authscheme"] = x_authscheme.decode("latin-1")
+        state["x_caller"] = x_caller.decode("latin-1")
+        state["x_correlationid"] = x_correlationid.decode("latin-1")
+        context_token = start_request(
+            state["x_correlationid"], state["x_caller"], state["x_authscheme"]
         )
+        context = current_context()
+        sampled = context is not None and context.sampled
+        if sampled:
+            record_span("middleware.headers", started_ns, time.time_ns())
+
+        if not (self.metrics_enabled or sampled):
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                finish_request(context_token, "", started_ns, 0)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route_path = getattr(scope.get("route"), "path", "unmatched")
+            if self.metrics_enabled:
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    route_path,
+                    str(status),
+                    KNOWN_AUTHSCHEMES.get(x_authscheme, "other"),
+                )
+            finish_request(
+                context_token, f"{scope['method']} {route_path}", started_ns, status
+            )
 
 
 def check_required_headers(request: Request, required_headers: list):
@@ -48,7 +155,7 @@ def check_required_headers(request: Request, required_headers: list):
 
     if missing_headers:
         missing_headers_str = ", ".join(missing_headers)
-        logger.warning(f"Missing headers: {missing_headers_str}")
+        logger.warning("Missing headers: %s", missing_headers_str)
         raise ShipotleError(
             BaseResponse(
                 api_response_code=ShipotleError.BADREQUEST,
@@ -1,5 +1,7 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional, Union
+from app.models.session import UserSessionInfo
 
 
 class JWTToken(BaseModel):
@@ -10,8 +12,47 @@ class AuthResponse(BaseModel):
     auth_scheme: str
     success: bool
     token: Optional[str] = None
+    refresh_token: Optional[str] = None
+    # cookie logins return the session expiry, JWT logins the access token
+    # lifetime in seconds
+    expires_in: Optional[Union[int, datetime]] = None
+
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+class LogoutAllResponse(BaseModel):
+    message: str
+    # sessions and refresh token families ended
+    revoked: int
 
 
 class LoginRequest(BaseModel):
     username: str
     password: str
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class IntrospectItem(BaseModel):
+    # x-authscheme of the token: "jwt" for a JWT, "cookie" for a session ID
+    scheme: str
+    token: str
+
+
+class IntrospectBatchRequest(BaseModel):
+    items: List[IntrospectItem]
+
+
+class IntrospectResult(BaseModel):
+    active: bool
+    session: Optional[UserSessionInfo] = None
+    error_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class IntrospectBatchResponse(BaseModel):
+    results: List[IntrospectResult]
@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class ProfileStartRequest(BaseModel):
+    # Only requests to this path (e.g. "/auth/protected") and/or from this
+    # x-caller are profiled; None matches any
+    route: Optional[str] = None
+    caller: Optional[str] = None
+    duration_seconds: float = Field(30.0, gt=0, le=600)
+    # Stop early once this many matching requests have completed
+    max_requests: Optional[int] = Field(None, gt=0)
+    interval_ms: float = Field(5.0, ge=1, le=1000)
+
+
+class ProfileResult(BaseModel):
+    route: Optional[str] = None
+    caller: Optional[str] = None
+    started_at: float
+    running: bool
+    interval_ms: float
+    requests: int
+    samples: int
+    top: List[Dict[str, Any]]
+    # "root;...;leaf count" lines, ready for flamegraph.pl or speedscope
+    collapsed: List[str]
@@ -8,3 +8,27 @@ class Role(Enum):
 
     def __str__(self):
         return self.value
+
+
+class Permission(Enum):
+    PROTECTED_READ = "protected:read"
+    SESSIONS_MANAGE = "sessions:manage"
+    PROFILER_CONTROL = "profiler:control"
+    TOKENS_INTROSPECT = "tokens:introspect"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+ROLE_PERMISSIONS = {
+    Role.UNKNOWN: frozenset({Permission.PROTECTED_READ, Permission.SESSIONS_MANAGE}),
+    Role.ADMIN: frozenset(
+        {
+            Permission.PROTECTED_READ,
+            Permission.SESSIONS_MANAGE,
+            Permission.PROFILER_CONTROL,
+            Permission.TOKENS_INTROSPECT,
+        }
+    ),
+    Role.USER: frozenset({Permission.SESSIONS_MANAGE}),
+}
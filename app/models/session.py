@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+from typing import List
 from pydantic import BaseModel
 
 
@@ -11,3 +12,16 @@ class UserSessionInfo(BaseModel):
 
     def is_expired(self) -> bool:
         return (datetime.now(timezone.utc).replace(tzinfo=None)) > self.expiry_time
+
+
+class SessionSummary(BaseModel):
+    # a digest of the session ID, which is a credential and never returned
+    id: str
+    created_at: datetime
+    expiry_time: datetime
+    # whether this is the session cookie sent with the request
+    current: bool
+
+
+class SessionListResponse(BaseModel):
+    sessions: List[SessionSummary]
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class UserRecord(BaseModel):
+    username: str
+    user_id: str
+    password_hash: str
+    role: str
+    email: Optional[str] = None
+    public_username: Optional[str] = None
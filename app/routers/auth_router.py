@@ -1,104 +1,110 @@
+import hashlib
 import logging
 from fastapi import APIRouter, Response, Request, HTTPException, Depends
 from app.services.auth_service import AuthenticationService, AuthScheme
-from app.models.auth import LoginRequest
+from app.models.auth import (
+    AuthResponse,
+    IntrospectBatchRequest,
+    IntrospectBatchResponse,
+    LoginRequest,
+    LogoutAllResponse,
+    MessageResponse,
+    RefreshRequest,
+)
+from app.services.refresh_token_service import RefreshTokenService
 from app.services.session_service import SessionService
 from app.error.py_error import BaseResponse, ShipotleError
 from app.middleware.session_middleware import check_required_headers
-from typing import Dict, Any
-from datetime import datetime, timedelta, timezone
-from app.models.role import Role
+from app.models.role import Permission
+from app.models.session import SessionListResponse, SessionSummary, UserSessionInfo
+from app.services.authorization import require, set_session_cookie
 
 router = APIRouter()
 logger = logging.getLogger("auth_router")
 
 
-@router.post("/login")
-def login(
+@router.post("/login", response_model_exclude_none=True)
+async def login(
     response: Response, request: Request, login_data: LoginRequest
-) -> Dict[str, Any]:
+) -> AuthResponse:
     logger.info("Login endpoint hit")
     check_required_headers(request, ["x-authscheme"])
     x_authscheme = request.headers.get("x-authscheme")
 
     try:
-        auth_response = AuthenticationService.authenticate(
+        auth_response = await AuthenticationService.authenticate(
             username=login_data.username,
             password=login_data.password,
             auth_scheme=x_authscheme if x_authscheme else "",
+            client_ip=request.client.host if request.client else None,
+            caller=request.headers.get("x-caller"),
         )
         logger.info(
-            f"User '{login_data.username}' authenticated successfully using {x_authscheme}"
+            "User '%s' authenticated successfully using %s",
+            login_data.username,
+            x_authscheme,
         )
 
         if x_authscheme == AuthScheme.COOKIE:
-            expires = (datetime.now(timezone.utc).replace(tzinfo=None)) + timedelta(
-                hours=1
-            )
-            response.set_cookie(
-                key="session_id",
-                value=auth_response["session_id"],
-                httponly=True,
-                secure=False,
-                expires=expires.strftime("%a, %d %b %Y %H:%M:%S GMT"),
-            )
+            set_session_cookie(response, auth_response["session_id"])
             auth_response.pop("session_id")
     except Exception as e:
-        logger.error(
-            f"Authentication failed for user '{login_data.username}': {str(e)}"
-        )
+        if isinstance(e, ShipotleError) and e.error_response.api_response_code in (
+            ShipotleError.SERVICE_UNAVAILABLE,
+            ShipotleError.TOO_MANY_REQUESTS,
+        ):
+            # Overload and throttling are not credential problems, let the
+            # client back off and retry
+            raise e
+        logger.error("Authentication failed for user '%s': %s", login_data.username, e)
         raise ShipotleError(
             BaseResponse(
                 api_response_code=ShipotleError.AUTHORIZATION,
                 message="Authentication failed",
             )
         )
-    return auth_response
+    return AuthResponse(**auth_response)
 
 
-@router.get("/protected")
-async def protected_route(request: Request) -> Dict[str, str]:
-    auth_service = AuthenticationService()
-    logger.info("Protected endpoint hit")
-    check_required_headers(request, ["x-authscheme"])
-    x_authscheme = request.headers.get("x-authscheme")
+@router.post("/refresh", response_model_exclude_none=True)
+async def refresh(refresh_data: RefreshRequest) -> AuthResponse:
+    logger.info("Refresh endpoint hit")
+    auth_response = await AuthenticationService.refresh(refresh_data.refresh_token)
+    return AuthResponse(**auth_response)
 
-    required_roles = [role.value for role in [Role.UNKNOWN, Role.ADMIN]]
-
-    try:
-        token = (
-            request.headers.get("Authorization", "").split(" ")[1]
-            if x_authscheme == AuthScheme.JWT
-            else None
-        )
-        session_id = (
-            request.cookies.get("session_id")
-            if x_authscheme == AuthScheme.COOKIE
-            else None
-        )
-
-        session_info = await auth_service.authenticate_async(
-            auth_scheme=x_authscheme if x_authscheme else "",
-            token=token,
-            session_id=session_id,
-            required_roles=required_roles,
-        )
 
-        logger.info(f"Session verified successfully for user: {session_info.user_id}")
-        return {"message": "Accessed the protected route"}
-
-    except HTTPException as e:
-        logger.error(f"Authentication failed: {str(e.detail)}")
-        raise ShipotleError(
-            BaseResponse(
-                api_response_code=ShipotleError.AUTHORIZATION,
-                message="Authentication failed",
-            )
-        )
+@router.get("/protected")
+async def protected_route(
+    session_info: UserSessionInfo = Depends(require(Permission.PROTECTED_READ)),
+) -> MessageResponse:
+    logger.info("Protected endpoint hit")
+    logger.info("Session verified successfully for user: %s", session_info.user_id)
+    return MessageResponse(message="Accessed the protected route")
+
+
+@router.post("/introspect/batch", response_model_exclude_none=True)
+async def introspect_batch(
+    request: Request,
+    batch: IntrospectBatchRequest,
+    # Only trusted services may probe tokens in bulk, the caller authenticates
+    # itself through x-authscheme like any other route
+    caller: UserSessionInfo = Depends(
+        require(Permission.TOKENS_INTROSPECT, denied=ShipotleError.FORBIDDEN)
+    ),
+) -> IntrospectBatchResponse:
+    auth_service = AuthenticationService()
+    results = await auth_service.introspect_batch(batch.items)
+    logger.info(
+        "Introspected %d tokens for caller %s, user %s",
+        len(results),
+        request.headers.get("x-caller"),
+        caller.user_id,
+    )
+    return IntrospectBatchResponse(results=results)
 
 
 @router.post("/logout")
-def logout(request: Request, response: Response) -> Dict[str, str]:
+async def logout(request: Request, response: Response) -> MessageResponse:
     logger.info("Logout endpoint hit")
     check_required_headers(request, ["x-authscheme"])
     x_authscheme = request.headers.get("x-authscheme")
@@ -116,10 +122,9 @@ def logout(request: Request, response: Response) -> Dict[str, str]:
                 )
 
             token = authorization.split(" ")[1]
-            logger.info(f"Logging out user with JWT token: {token}")
-            return {
-                "message": "Logged out successfully. Please discard your token client-side."
-            }
+            await AuthenticationService.revoke_jwt(token)
+            logger.info("Logged out JWT session")
+            return MessageResponse(message="Logged out successfully")
 
         elif x_authscheme == AuthScheme.COOKIE:
             session_id = request.cookies.get("session_id")
@@ -132,10 +137,10 @@ def logout(request: Request, response: Response) -> Dict[str, str]:
                     )
                 )
 
-            SessionService.delete_session(session_id)
+            await SessionService.delete_session(session_id)
             response.delete_cookie(key="session_id")
-            logger.info(f"Logged out session: {session_id}")
-            return {"message": "Logged out successfully"}
+            logger.info("Logged out session_id: %s", session_id)
+            return MessageResponse(message="Logged out successfully")
 
         else:
             logger.error("Invalid x-authscheme value")
@@ -146,10 +151,62 @@ def logout(request: Request, response: Response) -> Dict[str, str]:
                 )
             )
     except Exception as e:
-        logger.error(f"Error during logout: {str(e)}")
+        logger.error("Error during logout: %s", e)
         raise ShipotleError(
             BaseResponse(
                 api_response_code=ShipotleError.INTERNAL_ERROR,
                 message="Error during session logout",
             )
         )
+
+
+def _session_handle(session_id: str) -> str:
+    # Identifies a session in listings without revealing the cookie value
+    return hashlib.sha256(session_id.encode()).hexdigest()[:16]
+
+
+@router.get("/sessions")
+async def list_sessions(
+    request: Request,
+    session_info: UserSessionInfo = Depends(require(Permission.SESSIONS_MANAGE)),
+) -> SessionListResponse:
+    sessions = await SessionService.list_sessions(session_info.user_id)
+    current = None
+    if request.headers.get("x-authscheme") == AuthScheme.COOKIE:
+        current = request.cookies.get("session_id")
+    return SessionListResponse(
+        sessions=[
+            SessionSummary(
+                id=_session_handle(session.session_id),
+                created_at=session.created_at,
+                expiry_time=session.expiry_time,
+                current=session.session_id == current,
+            )
+            for session in sessions
+        ]
+    )
+
+
+@router.post("/logout-all")
+async def logout_all(
+    request: Request,
+    response: Response,
+    session_info: UserSessionInfo = Depends(require(Permission.SESSIONS_MANAGE)),
+) -> LogoutAllResponse:
+    revoked = await SessionService.delete_user_sessions(session_info.user_id)
+    # JWT logins live on as refresh token families, each also revoking its
+    # outstanding access tokens
+    revoked += await RefreshTokenService.revoke_user_families(session_info.user_id)
+    x_authscheme = request.headers.get("x-authscheme")
+    if x_authscheme == AuthScheme.COOKIE:
+        response.delete_cookie(key="session_id")
+    elif x_authscheme == AuthScheme.JWT:
+        # The caller's own token ends too, even if issued without a family
+        authorization = request.headers.get("Authorization", "")
+        await AuthenticationService.revoke_jwt(authorization.partition(" ")[2])
+    logger.info(
+        "Logged out %d sessions and token families of user: %s",
+        revoked,
+        session_info.user_id,
+    )
+    return LogoutAllResponse(message="Logged out of all sessions", revoked=revoked)
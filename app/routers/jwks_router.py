@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request, Response
+from app.config.settings import get_settings
+from app.services.jwt_handler import JWTHandler
+
+router = APIRouter()
+
+
+@router.get("/.well-known/jwks.json", include_in_schema=False)
+async def jwks(request: Request) -> Response:
+    body, etag = JWTHandler.jwks()
+    headers = {
+        "Cache-Control": f"public, max-age={get_settings().jwks_max_age}",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
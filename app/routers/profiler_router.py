@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from app.config.settings import get_settings
+from app.error.py_error import BaseResponse, ShipotleError
+from app.models.profiler import ProfileResult, ProfileStartRequest
+from app.models.role import Permission
+from app.models.session import UserSessionInfo
+from app.services import profiler
+from app.services.authorization import require
+
+router = APIRouter()
+logger = logging.getLogger("profiler_router")
+
+
+def _profiling_enabled() -> None:
+    # Behaves as if the routes didn't exist unless PROFILER_ENABLED is set
+    if not get_settings().profiler_enabled:
+        raise ShipotleError(
+            BaseResponse(
+                api_response_code=ShipotleError.RESOURCE_NOT_FOUND,
+                message="Not Found",
+            )
+        )
+
+
+def _result(session: Optional[profiler.ProfileSession], top: int) -> ProfileResult:
+    if session is None:
+        raise ShipotleError(
+            BaseResponse(
+                api_response_code=ShipotleError.RESOURCE_NOT_FOUND,
+                message="No profile has been started",
+            )
+        )
+    return ProfileResult(**session.summary(top))
+
+
+@router.post("/start", dependencies=[Depends(_profiling_enabled)])
+async def start_profile(
+    profile: ProfileStartRequest,
+    session_info: UserSessionInfo = Depends(require(Permission.PROFILER_CONTROL)),
+) -> ProfileResult:
+    session = profiler.start_session(
+        route=profile.route,
+        caller=profile.caller,
+        duration=profile.duration_seconds,
+        max_requests=profile.max_requests,
+        interval=profile.interval_ms / 1000,
+    )
+    logger.warning(
+        "User %s started profiling route=%s caller=%s for %.0fs",
+        session_info.user_id,
+        profile.route,
+        profile.caller,
+        profile.duration_seconds,
+    )
+    return _result(session, 0)
+
+
+@router.post("/stop", dependencies=[Depends(_profiling_enabled)])
+async def stop_profile(
+    top: int = Query(25, ge=1, le=500),
+    session_info: UserSessionInfo = Depends(require(Permission.PROFILER_CONTROL)),
+) -> ProfileResult:
+    return _result(profiler.stop_session(), top)
+
+
+@router.get("/result", dependencies=[Depends(_profiling_enabled)])
+async def profile_result(
+    top: int = Query(25, ge=1, le=500),
+    session_info: UserSessionInfo = Depends(require(Permission.PROFILER_CONTROL)),
+) -> ProfileResult:
+    return _result(profiler.last_session(), top)
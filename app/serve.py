@@ -0,0 +1,228 @@
+"""
+Production entry point:
+
+    python -m app.serve [--host 0.0.0.0] [--port 8000] [--workers N] [--reload]
+
+Runs uvicorn with one worker per CPU the container may use, uvloop and
+httptools when installed, and workers recycled after a number of requests.
+--reload is for development: one process, restarted on code changes.
+"""
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import random
+import sys
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+from uvicorn.config import HTTPProtocolType, LoopSetupType
+from uvicorn.main import STARTUP_FAILURE
+from uvicorn.supervisors import ChangeReload, Multiprocess
+
+from app.config.logging_config import setup_logging
+from app.config.settings import get_settings
+from app.services.shm_session_backend import (
+    check_user_limits,
+    shared_tables,
+    shared_tables_size,
+)
+
+logger = logging.getLogger("serve")
+
+APP = "app.main:app"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the cgroup quota (v2, then v1), None when unlimited."""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    for directory in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        cfs_quota = _read(os.path.join(directory, "cpu.cfs_quota_us"))
+        cfs_period = _read(os.path.join(directory, "cpu.cfs_period_us"))
+        if cfs_quota and cfs_period and int(cfs_quota) > 0:
+            return int(cfs_quota) / int(cfs_period)
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs this process can actually use: affinity mask capped by the cgroup quota."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def shm_free_bytes(tables: Dict[str, Tuple[int, int]]) -> int:
+    """
+    Room left for the shm tables: the free space of their file system plus
+    what their files from an earlier run already hold, as those are reused.
+    """
+    paths = list(tables)
+    try:
+        stat = os.statvfs(os.path.dirname(paths[0]) or ".")
+    except OSError:
+        return 0
+    free = stat.f_bavail * stat.f_frsize
+    for path in paths:
+        try:
+            free += os.stat(path).st_blocks * 512
+        except OSError:
+            pass
+    return free
+
+
+def share_sessions(workers: int) -> int:
+    """
+    Workers to start so that every one of them sees every session: the
+    memory backend is switched to shm when its tables fit, otherwise a
+    single worker runs.
+    """
+    settings = get_settings()
+    if workers <= 1 or settings.session_backend != "memory":
+        return workers
+    if settings.session_persist_dir:
+        # The journal directory belongs to a single process
+        logger.warning("SESSION_PERSIST_DIR is set, running a single worker")
+        return 1
+    try:
+        check_user_limits()
+    except ValueError as e:
+        logger.warning("%s, running a single worker", e)
+        return 1
+    tables = shared_tables()
+    needed = shared_tables_size(tables)
+    free = shm_free_bytes(tables)
+    if free < needed:
+        # Every worker would fail to allocate the tables at startup
+        logger.warning(
+            "The shm session tables need %d MB but only %d MB are free at %s, "
+            "running a single worker. Raise the size of /dev/shm "
+            "(docker run --shm-size) or lower SESSION_STORE_MAX_ENTRIES",
+            needed // 1_000_000,
+            free // 1_000_000,
+            os.path.dirname(next(iter(tables))),
+        )
+        return 1
+    # In-process sessions would only be visible to the worker that made them
+    logger.warning("Using SESSION_BACKEND=shm to share sessions between workers")
+    os.environ["SESSION_BACKEND"] = "shm"
+    return workers
+
+
+class _Config(uvicorn.Config):
+    """
+    uvicorn recycles a worker after limit_max_requests requests. Each worker
+    process adds its own random jitter, so workers started together don't all
+    restart at the same moment.
+    """
+
+    max_requests_jitter = 0
+
+    @property
+    def limit_max_requests(self) -> Optional[int]:
+        base: Optional[int] = self.__dict__.get("_max_requests")
+        if not base:
+            return None
+        jittered: Optional[Tuple[int, int]] = self.__dict__.get("_jittered")
+        if jittered is None or jittered[0] != os.getpid():
+            jittered = (os.getpid(), base + random.randint(0, self.max_requests_jitter))
+            self.__dict__["_jittered"] = jittered
+        return jittered[1]
+
+    @limit_max_requests.setter
+    def limit_max_requests(self, value: Optional[int]) -> None:
+        self.__dict__["_max_requests"] = value
+        self.__dict__.pop("_jittered", None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, help="default: one per available CPU")
+    parser.add_argument(
+        "--reload", action="store_true", help="development only: restart on changes"
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    setup_logging()
+
+    cpus = available_cpus()
+    workers = 1 if args.reload else (args.workers or settings.web_concurrency or cpus)
+    workers = share_sessions(workers)
+    if "BCRYPT_POOL_WORKERS" not in os.environ:
+        # Each worker gets its share of the CPUs for bcrypt, not all of them
+        os.environ["BCRYPT_POOL_WORKERS"] = str(max(1, cpus // workers))
+
+    loop: LoopSetupType = "uvloop" if _installed("uvloop") else "asyncio"
+    http: HTTPProtocolType = "httptools" if _installed("httptools") else "h11"
+    config = _Config(
+        APP,
+        host=args.host or settings.server_host,
+        port=args.port or settings.server_port,
+        workers=workers,
+        reload=args.reload,
+        loop=loop,
+        http=http,
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keepalive_seconds,
+        timeout_graceful_shutdown=settings.server_graceful_timeout_seconds,
+        limit_max_requests=settings.server_max_requests or None,
+        access_log=settings.server_access_log,
+        # Workers set up logging in the app lifespan, keep uvicorn's own config out
+        log_config=None,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.server_forwarded_allow_ips,
+    )
+    config.max_requests_jitter = settings.server_max_requests_jitter
+    logger.info(
+        "Starting %d worker(s) on %d CPU(s) with loop=%s http=%s",
+        workers,
+        cpus,
+        loop,
+        http,
+    )
+    # On SIGTERM uvicorn stops accepting connections, lets in-flight requests
+    # finish for up to timeout_graceful_shutdown, then runs the lifespan shutdown
+    server = uvicorn.Server(config)
+    try:
+        if config.should_reload:
+            sock = config.bind_socket()
+            ChangeReload(config, target=server.run, sockets=[sock]).run()
+        elif config.workers > 1:
+            sock = config.bind_socket()
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    if not server.started and not config.should_reload and config.workers == 1:
+        sys.exit(STARTUP_FAILURE)
+
+
+if __name__ == "__main__":
+    main()
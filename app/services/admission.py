@@ -0,0 +1,263 @@
+import asyncio
+import math
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, FrozenSet, Iterable, Optional, Tuple
+from app.config.settings import get_settings
+from app.services.metrics import REGISTRY
+
+PRIORITIES = ("critical", "normal", "low")
+# initial, minimum and maximum concurrency limit, and queue size per priority.
+# Token checks are cheap, a login holds a bcrypt worker for ~100ms
+PRIORITY_LIMITS: Dict[str, Tuple[int, int, int, int]] = {
+    "critical": (200, 20, 2000, 200),
+    "normal": (50, 5, 500, 50),
+    "low": (32, 2, 256, 16),
+}
+# Requests for paths that aren't routes of the app share one limiter
+OTHER_ROUTE = "other"
+
+# A window closes after this many completed requests or this many seconds
+WINDOW_SAMPLES = 20
+WINDOW_SECONDS = 1.0
+# Weight of each window in the long-term latency average
+LONG_RTT_ALPHA = 0.05
+
+
+def parse_priorities(spec: str) -> Dict[str, str]:
+    priorities = {}
+    for item in spec.split(","):
+        path, _, priority = item.strip().partition("=")
+        if path and priority:
+            if priority not in PRIORITY_LIMITS:
+                raise ValueError(f"Unknown admission priority '{priority}' for {path}")
+            priorities[path] = priority
+    return priorities
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one route, adjusted from its latency like Netflix's
+    gradient limiter. Latencies are averaged per window and compared with a
+    slow moving long-term average: while the window stays within `tolerance`
+    times the long average the limit grows by about its square root per
+    window, beyond that it shrinks in proportion (by at most half). The limit
+    only grows while the route actually uses more than half of it.
+
+    Requests over the limit wait in a FIFO queue of at most max_queue for up
+    to queue_timeout seconds; a finishing request hands its slot to the
+    oldest waiter. Everything runs on the event loop, so there are no locks.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        priority: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+    ):
+        self.route = route
+        self.priority = priority
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.rejected = 0
+        self.gradient = 1.0
+        self.long_rtt = 0.0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._window_sum = 0.0
+        self._window_count = 0
+        self._window_peak = 0
+        self._window_started = time.monotonic()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def congested(self) -> bool:
+        return bool(self._waiters) or self.gradient < 1.0
+
+    async def acquire(self, may_queue: bool = True) -> bool:
+        """True once the request holds a slot, False when it must be shed."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self._take()
+            return True
+        if not may_queue or len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            # A slot handed over in the same loop iteration the timeout fired
+            # belongs to this request; shedding it now would leak the slot
+            if waiter.done() and not waiter.cancelled():
+                return True
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            # The client went away; give back a slot handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        if self.in_flight > self._window_peak:
+            self._window_peak = self.in_flight
+
+    def release(self, latency: Optional[float]) -> None:
+        """Frees the slot; latency is None for requests that never ran."""
+        self.in_flight -= 1
+        if latency is not None:
+            self._window_sum += latency
+            self._window_count += 1
+            if (
+                self._window_count >= WINDOW_SAMPLES
+                or time.monotonic() - self._window_started >= WINDOW_SECONDS
+            ):
+                self._update()
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._take()
+                waiter.set_result(None)
+
+    def _update(self) -> None:
+        short_rtt = self._window_sum / self._window_count
+        if not self.long_rtt:
+            self.long_rtt = short_rtt
+        else:
+            self.long_rtt += (short_rtt - self.long_rtt) * LONG_RTT_ALPHA
+            if self.long_rtt > 2 * short_rtt:
+                # Latency dropped well below the baseline (load went away),
+                # let the baseline follow faster
+                self.long_rtt = (self.long_rtt + short_rtt) / 2
+        self.gradient = max(
+            0.5, min(1.0, self.tolerance * self.long_rtt / max(short_rtt, 1e-9))
+        )
+        app_limited = self._window_peak < self.limit / 2
+        if not (self.gradient >= 1.0 and app_limited):
+            target = self.limit * self.gradient + math.sqrt(self.limit)
+            limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+            self.limit = float(min(self.max_limit, max(self.min_limit, limit)))
+
+        self._window_sum = 0.0
+        self._window_count = 0
+        self._window_peak = self.in_flight
+        self._window_started = time.monotonic()
+
+
+class AdmissionController:
+    """
+    One AdaptiveLimiter per route of the app, created on first use. While a
+    critical route is congested (queueing, or its latency rising), low
+    priority requests are shed instead of queued, so a burst of logins can't
+    hold back token checks.
+    """
+
+    def __init__(self, priorities: Dict[str, str], queue_timeout: float):
+        self.priorities = priorities
+        self.queue_timeout = queue_timeout
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self._routes: Optional[FrozenSet[str]] = None
+        self._critical: Tuple[AdaptiveLimiter, ...] = ()
+
+    def set_routes(self, paths: Iterable[str]) -> None:
+        self._routes = frozenset(paths)
+
+    def _create(self, route: str) -> AdaptiveLimiter:
+        priority = self.priorities.get(route, "normal")
+        initial, minimum, maximum, queue = PRIORITY_LIMITS[priority]
+        limiter = AdaptiveLimiter(
+            route, priority, initial, minimum, maximum, queue, self.queue_timeout
+        )
+        self.limiters[route] = limiter
+        if priority == "critical":
+            self._critical += (limiter,)
+        return limiter
+
+    def limiter(self, path: str) -> AdaptiveLimiter:
+        limiter = self.limiters.get(path)
+        if limiter is not None:
+            return limiter
+        if self._routes is not None and path not in self._routes:
+            path = OTHER_ROUTE
+            limiter = self.limiters.get(path)
+            if limiter is not None:
+                return limiter
+        return self._create(path)
+
+    def may_queue(self, limiter: AdaptiveLimiter) -> bool:
+        if limiter.priority != "low":
+            return True
+        return not any(critical.congested for critical in self._critical)
+
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    settings = get_settings()
+    return AdmissionController(
+        parse_priorities(settings.admission_route_priorities),
+        settings.admission_queue_timeout_ms / 1000,
+    )
+
+
+def _per_route(attribute: str) -> Dict[Tuple[str, ...], float]:
+    limiters = list(get_admission_controller().limiters.values())
+    return {
+        (limiter.route, limiter.priority): getattr(limiter, attribute)
+        for limiter in limiters
+    }
+
+
+REGISTRY.callback(
+    "admission_limit",
+    "Current adaptive concurrency limit by route",
+    lambda: _per_route("limit"),
+    labelnames=("route", "priority"),
+)
+REGISTRY.callback(
+    "admission_in_flight",
+    "Admitted requests being served by route",
+    lambda: _per_route("in_flight"),
+    labelnames=("route", "priority"),
+)
+REGISTRY.callback(
+    "admission_queued",
+    "Requests waiting for a concurrency slot by route",
+    lambda: _per_route("queued"),
+    labelnames=("route", "priority"),
+)
+REGISTRY.callback(
+    "admission_rejected_total",
+    "Requests shed with a 503 by route",
+    lambda: _per_route("rejected"),
+    labelnames=("route", "priority"),
+    kind="counter",
+)
@@ -1,15 +1,27 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import asyncio
+import math
 from app.services.session_service import SessionService, UserSessionInfo
 from app.services.jwt_handler import JWTHandler
 from fastapi import HTTPException
 import uuid
 import logging
 from datetime import datetime, timedelta, timezone
-import os
-from passlib.context import CryptContext
 import pytz
-from dotenv import load_dotenv
+from app.config.settings import get_settings
 from app.error.py_error import BaseResponse, ShipotleError
+from app.models.auth import IntrospectItem, IntrospectResult
+from app.services.login_throttle import (
+    acquire_login,
+    login_keys,
+    record_login_failure,
+    record_login_success,
+)
+from app.services.password_hasher import PasswordHasher
+from app.services.refresh_token_service import RefreshTokenService
+from app.services.revocation_service import RevocationService
+from app.services.tracing import span, traced
+from app.services.user_repository import UserRepository, create_user_repository
 
 
 class AuthScheme:
@@ -17,50 +29,92 @@ class AuthScheme:
     JWT = "jwt"
 
 
-load_dotenv()
-
-
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-# dummy in memory db
-user_data = {
-    "test_user": {
-        "password": pwd_context.hash("password123"),
-        "user_id": "123",
-        "email": "test@example.com",
-        "public_username": "test_user",
-        "role": "Admin",
-    }
-}
 
 
 class AuthenticationService:
-    @staticmethod
-    def authenticate(username: str, password: str, auth_scheme: str) -> Dict[str, Any]:
-        user = user_data.get(username)
-        if not user or not pwd_context.verify(password, user["password"]):
+    user_repository: Optional[UserRepository] = None
+
+    @classmethod
+    def configure(cls, user_repository: UserRepository) -> None:
+        cls.user_repository = user_repository
+
+    @classmethod
+    def get_user_repository(cls) -> UserRepository:
+        # Created on first use when the app lifespan hasn't started it
+        if cls.user_repository is None:
+            cls.user_repository = create_user_repository()
+        return cls.user_repository
+
+    @classmethod
+    async def start(cls) -> None:
+        await cls.get_user_repository().start()
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.user_repository is not None:
+            await cls.user_repository.close()
+
+    @classmethod
+    @traced("auth.authenticate")
+    async def authenticate(
+        cls,
+        username: str,
+        password: str,
+        auth_scheme: str,
+        client_ip: Optional[str] = None,
+        caller: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        # Throttled before the user lookup and bcrypt, so rejected attempts stay cheap
+        throttle_keys = login_keys(username, client_ip, caller)
+        with span("auth.throttle"):
+            retry_after = acquire_login(throttle_keys)
+        if retry_after > 0:
+            logger.warning(
+                "Throttled login for user '%s' from %s (%s)",
+                username,
+                client_ip,
+                caller,
+            )
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=ShipotleError.TOO_MANY_REQUESTS,
+                    message="Too many login attempts, please retry later",
+                ),
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+        with span("user.lookup"):
+            user = await cls.get_user_repository().get_by_username(username)
+        verified = False
+        if user:
+            with span("bcrypt.verify"):
+                verified = await PasswordHasher.verify(password, user.password_hash)
+        if user is None or not verified:
+            record_login_failure(throttle_keys)
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.AUTHORIZATION,
                     message="Invalid credentials",
                 )
             )
+        record_login_success(throttle_keys)
 
         expiry_time = (datetime.now(timezone.utc).replace(tzinfo=None)) + timedelta(
             hours=1
         )
         user_info = UserSessionInfo(
             session_id=str(uuid.uuid4()),
-            role=user["role"],
-            user_id=user["user_id"],
+            role=user.role,
+            user_id=user.user_id,
             created_at=datetime.now(timezone.utc).replace(tzinfo=None),
             expiry_time=expiry_time,
         )
 
         if auth_scheme == AuthScheme.COOKIE:
             try:
-                session_id = SessionService.create_session(user_info)
-                logger.info(f"Session created for user '{username}'")
+                session_id = await SessionService.create_session(user_info)
+                logger.info("Session created for user '%s'", username)
                 return {
                     "auth_scheme": AuthScheme.COOKIE,
                     "success": True,
@@ -68,7 +122,7 @@ class AuthenticationService:
                     "expires_in": expiry_time.replace(tzinfo=pytz.UTC),
                 }
             except Exception as e:
-                logger.error(f"Error creating session for user '{username}': {str(e)}")
+                logger.error("Error creating session for user '%s': %s", username, e)
                 raise ShipotleError(
                     BaseResponse(
                         api_response_code=ShipotleError.INTERNAL_ERROR,
@@ -78,27 +132,20 @@ class AuthenticationService:
 
         elif auth_scheme == AuthScheme.JWT:
             try:
-                payload = user_info.dict()
-                payload["created_at"] = user_info.created_at.isoformat(
-                    sep=" ", timespec="seconds"
-                )
-                payload["expiry_time"] = user_info.expiry_time.isoformat(
-                    sep=" ", timespec="seconds"
-                )
-                payload["sub"] = user["user_id"]
-
-                token = JWTHandler.generate_jwt(payload)
-                logger.info(f"JWT generated for user '{username}'")
+                with span("jwt.issue"):
+                    token = cls._issue_access_token(user_info)
+                with span("refresh_token.issue"):
+                    refresh_token = await RefreshTokenService.issue(user_info)
+                logger.info("JWT generated for user '%s'", username)
                 return {
                     "auth_scheme": AuthScheme.JWT,
                     "success": True,
                     "token": token,
-                    "expires_in": int(
-                        os.getenv("JWT_EXPIRATION_TIME", 1)
-                    ),  # currently set to 1 day
+                    "refresh_token": refresh_token,
+                    "expires_in": get_settings().jwt_access_token_seconds,
                 }
             except Exception as e:
-                logger.error(f"Error generating JWT for user '{username}': {str(e)}")
+                logger.error("Error generating JWT for user '%s': %s", username, e)
                 raise ShipotleError(
                     BaseResponse(
                         api_response_code=ShipotleError.INTERNAL_ERROR,
@@ -108,7 +155,9 @@ class AuthenticationService:
 
         else:
             logger.error(
-                f"Invalid authentication scheme provided for user '{username}': {auth_scheme}"
+                "Invalid authentication scheme provided for user '%s': %s",
+                username,
+                auth_scheme,
             )
             raise ShipotleError(
                 BaseResponse(
@@ -117,35 +166,75 @@ class AuthenticationService:
                 )
             )
 
-    def has_required_roles(self, user_role: str, required_roles: List[str]) -> bool:
-        return user_role in required_roles
+    @staticmethod
+    def _issue_access_token(user_info: UserSessionInfo) -> str:
+        lifetime = timedelta(seconds=get_settings().jwt_access_token_seconds)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        user_info.created_at = now
+        user_info.expiry_time = now + lifetime
+        payload = user_info.dict()
+        payload["created_at"] = user_info.created_at.isoformat(
+            sep=" ", timespec="seconds"
+        )
+        payload["expiry_time"] = user_info.expiry_time.isoformat(
+            sep=" ", timespec="seconds"
+        )
+        payload["sub"] = user_info.user_id
+        return JWTHandler.generate_jwt(payload, expires_in=lifetime)
+
+    @classmethod
+    @traced("auth.refresh")
+    async def refresh(cls, refresh_token: str) -> Dict[str, Any]:
+        """Rotates the refresh token and issues a new access token for its family."""
+        record, new_refresh_token = await RefreshTokenService.rotate(refresh_token)
+        user_info = UserSessionInfo(
+            session_id=record.family_id,
+            user_id=record.user_id,
+            role=record.role,
+            created_at=record.created_at,
+            expiry_time=record.expiry_time,
+        )
+        token = cls._issue_access_token(user_info)
+        logger.info("Refreshed JWT for user %s", record.user_id)
+        return {
+            "auth_scheme": AuthScheme.JWT,
+            "success": True,
+            "token": token,
+            "refresh_token": new_refresh_token,
+            "expires_in": get_settings().jwt_access_token_seconds,
+        }
+
+    @staticmethod
+    async def revoke_jwt(token: str) -> None:
+        try:
+            session_info, jti, expires_at = JWTHandler.verify_jwt_claims(token)
+        except ShipotleError as e:
+            # Expired, invalid or already revoked tokens are unusable anyway,
+            # so logging out with one is not an error
+            if e.error_response.api_response_code == ShipotleError.AUTHORIZATION:
+                return
+            raise e
+        JWTHandler.invalidate_token(token)
+        if jti:
+            await RevocationService.revoke(jti, expires_at)
+            logger.info("Revoked JWT %s", jti)
+        # Logging out also ends the refresh token family the token came from
+        await RefreshTokenService.revoke_family(session_info.session_id)
 
     async def authenticate_async(
         self,
         auth_scheme: str,
         token: Optional[str] = None,
         session_id: Optional[str] = None,
-        required_roles: Optional[List[str]] = None,
     ) -> UserSessionInfo:
         session_info: Optional[UserSessionInfo] = None
 
         if auth_scheme == AuthScheme.JWT and token:
-            logger.info(f"Verifying JWT token: {token}")
             try:
-                session_info = JWTHandler.verify_jwt(token)
-                logger.info(f"Decoded JWT: {session_info}")
+                with span("jwt.verify"):
+                    session_info = JWTHandler.verify_jwt(token)
 
                 if isinstance(session_info, UserSessionInfo):
-                    if required_roles and not self.has_required_roles(
-                        session_info.role, required_roles
-                    ):
-                        raise ShipotleError(
-                            BaseResponse(
-                                api_response_code=ShipotleError.AUTHORIZATION,
-                                message="You do not have access to this resource",
-                            )
-                        )
-
                     session_info.created_at = session_info.created_at.replace(
                         tzinfo=None
                     )
@@ -164,16 +253,7 @@ class AuthenticationService:
 
         elif auth_scheme == AuthScheme.COOKIE and session_id:
             try:
-                session_info = SessionService.get_session(session_id)
-                if required_roles and not self.has_required_roles(
-                    session_info.role, required_roles
-                ):
-                    raise ShipotleError(
-                        BaseResponse(
-                            api_response_code=ShipotleError.AUTHORIZATION,
-                            message="You do not have access to this resource",
-                        )
-                    )
+                session_info = await SessionService.get_session(session_id)
             except ShipotleError as e:
                 raise e
 
@@ -194,3 +274,55 @@ class AuthenticationService:
             )
 
         return session_info
+
+    async def _introspect(self, scheme: str, token: str) -> IntrospectResult:
+        try:
+            session_info = await self.authenticate_async(
+                auth_scheme=scheme,
+                token=token if scheme == AuthScheme.JWT else None,
+                session_id=token if scheme == AuthScheme.COOKIE else None,
+            )
+        except ShipotleError as e:
+            return IntrospectResult(
+                active=False,
+                error_code=e.error_response.api_response_code,
+                error=e.error_response.message,
+            )
+        return IntrospectResult(active=True, session=session_info)
+
+    @traced("auth.introspect_batch")
+    async def introspect_batch(
+        self, items: List[IntrospectItem]
+    ) -> List[IntrospectResult]:
+        """
+        Verifies many tokens at once and returns one result per item, in input
+        order. Repeated tokens are verified once. JWTs are mostly answered by
+        the verified-token cache; session lookups run concurrently so a shared
+        backend serves them in parallel rather than one round trip at a time.
+        """
+        max_items = get_settings().introspect_batch_max_items
+        if len(items) > max_items:
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=ShipotleError.BADREQUEST,
+                    message=f"At most {max_items} tokens per batch",
+                )
+            )
+
+        unique = dict.fromkeys((item.scheme, item.token) for item in items)
+
+        # JWT checks never wait on I/O, so they run inline instead of paying
+        # for a task each; only session lookups are fanned out
+        results: Dict[Tuple[str, str], IntrospectResult] = {}
+        lookups = []
+        for key in unique:
+            if key[0] == AuthScheme.JWT:
+                results[key] = await self._introspect(*key)
+            else:
+                lookups.append(key)
+        if lookups:
+            looked_up = await asyncio.gather(
+                *(self._introspect(*key) for key in lookups)
+            )
+            results.update(zip(lookups, looked_up))
+        return [results[(item.scheme, item.token)] for item in items]
@@ -0,0 +1,122 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+from fastapi import Depends, Request, Response
+from app.error.py_error import BaseResponse, ShipotleError
+from app.models.role import ROLE_PERMISSIONS, Permission, Role
+from app.models.session import UserSessionInfo
+from app.services.auth_service import AuthenticationService, AuthScheme
+from app.services.session_service import SessionService
+
+logger = logging.getLogger("authorization")
+
+Grant = Union[Role, Permission]
+
+# Every role and permission owns one bit; compiled once at import
+GRANT_BITS: Dict[Grant, int] = {
+    grant: 1 << bit for bit, grant in enumerate([*Role, *Permission])
+}
+
+
+def compile_mask(grants: Iterable[Grant]) -> int:
+    mask = 0
+    for grant in grants:
+        mask |= GRANT_BITS[grant]
+    return mask
+
+
+# Role string as stored on sessions -> the role's own bit plus its permissions
+ROLE_MASKS: Dict[str, int] = {
+    role.value: GRANT_BITS[role] | compile_mask(ROLE_PERMISSIONS.get(role, ()))
+    for role in Role
+}
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    return token if scheme == "Bearer" and token else None
+
+
+def set_session_cookie(response: Response, session_id: str) -> None:
+    expires = (datetime.now(timezone.utc).replace(tzinfo=None)) + timedelta(hours=1)
+    response.set_cookie(
+        key="session_id",
+        value=session_id,
+        httponly=True,
+        secure=False,
+        expires=expires.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+    )
+
+
+async def current_session(request: Request, response: Response) -> UserSessionInfo:
+    """
+    Resolves the caller's session from the JWT or session cookie selected by
+    x-authscheme. The result is cached on request.state, so any number of
+    dependencies in one request verify the credentials once. A cookie still
+    holding a legacy uuid4 session id is swapped for a signed one.
+    """
+    state = request.state
+    session_info: Optional[UserSessionInfo] = getattr(state, "session_info", None)
+    if session_info is not None:
+        return session_info
+
+    x_authscheme = getattr(state, "x_authscheme", None) or request.headers.get(
+        "x-authscheme", ""
+    )
+    session_info = await AuthenticationService().authenticate_async(
+        auth_scheme=x_authscheme,
+        token=_bearer_token(request) if x_authscheme == AuthScheme.JWT else None,
+        session_id=(
+            request.cookies.get("session_id")
+            if x_authscheme == AuthScheme.COOKIE
+            else None
+        ),
+    )
+    if x_authscheme == AuthScheme.COOKIE and SessionService.is_legacy_session_id(
+        session_info.session_id
+    ):
+        session_info.session_id = await SessionService.migrate_session(session_info)
+        set_session_cookie(response, session_info.session_id)
+    state.session_info = session_info
+    state.auth_mask = ROLE_MASKS.get(session_info.role, 0)
+    return session_info
+
+
+def require(
+    *grants: Grant, all_of: bool = False, denied: int = ShipotleError.AUTHORIZATION
+) -> Callable[..., Awaitable[UserSessionInfo]]:
+    """
+    Dependency factory for routes: `Depends(require(Role.ADMIN))` or
+    `Depends(require(Permission.PROTECTED_READ))`. The caller needs any one of
+    the grants, or every one of them with all_of=True; `require()` only asks
+    for a valid session. A caller without them gets the `denied` error code.
+    Grants are compiled to a bitmask here, so the per-request check is a
+    single AND.
+    """
+    required = compile_mask(grants)
+
+    async def dependency(
+        request: Request, session_info: UserSessionInfo = Depends(current_session)
+    ) -> UserSessionInfo:
+        granted = request.state.auth_mask & required
+        if all_of or not required:
+            allowed = granted == required
+        else:
+            allowed = granted != 0
+        if not allowed:
+            logger.warning(
+                "User %s with role %s denied, requires %s",
+                session_info.user_id,
+                session_info.role,
+                ", ".join(str(grant) for grant in grants),
+            )
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=denied,
+                    message="You do not have access to this resource",
+                )
+            )
+        return session_info
+
+    return dependency
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.models.session import UserSessionInfo
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens whose signature and claims were already verified,
+    keyed by a digest of the token. Entries are only served until the token's
+    own exp, so the cache never extends a token's lifetime. The token id (jti)
+    is kept next to the session so revocation is still checked on a hit.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: (
+            "OrderedDict[bytes, Tuple[float, UserSessionInfo, Optional[str]]]"
+        ) = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[Tuple[UserSessionInfo, Optional[str], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, session_info, jti = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers adjust the returned model, never hand out the cached instance
+        return session_info.model_copy(), jti, expires_at
+
+    def put(
+        self,
+        key: bytes,
+        session_info: UserSessionInfo,
+        expires_at: float,
+        jti: Optional[str] = None,
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, session_info.model_copy(), jti)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: bytes) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
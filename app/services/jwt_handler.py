@@ -1,32 +1,163 @@
 import jwt
+import hashlib
+import time
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
-from typing import Dict, Any
-from dotenv import load_dotenv
-import os
+from typing import Dict, Any, Optional, Tuple
+import uuid
 from app.error.py_error import ShipotleError, BaseResponse
 import pytz
+from app.config.settings import get_settings
 from app.models.session import UserSessionInfo
+from app.services.jwt_cache import VerifiedTokenCache
+from app.services.key_ring import KeyRing
+from app.services.metrics import JWT_VERIFY_SECONDS, REGISTRY
+from app.services.revocation_service import RevocationService
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-load_dotenv()
+EMPTY_JWKS = (b'{"keys":[]}', '"empty"')
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-JWT_EXPIRATION_TIME = int(os.getenv("JWT_EXPIRATION_TIME", 1))
+
+@lru_cache(maxsize=1)
+def get_key_ring() -> Optional[KeyRing]:
+    settings = get_settings()
+    if not settings.jwt_keys_dir:
+        return None
+    return KeyRing(
+        settings.jwt_keys_dir,
+        signing_kid=settings.jwt_signing_kid,
+        reload_interval=settings.jwt_keys_reload_seconds,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_token_cache() -> VerifiedTokenCache:
+    return VerifiedTokenCache(max_entries=get_settings().jwt_cache_max_entries)
+
+
+REGISTRY.callback(
+    "jwt_cache_size",
+    "Verified tokens currently cached",
+    lambda: len(get_token_cache()),
+)
+REGISTRY.callback(
+    "jwt_cache_lookups_total",
+    "Verified-token cache lookups by result",
+    lambda: {
+        ("hit",): get_token_cache().hits,
+        ("miss",): get_token_cache().misses,
+    },
+    labelnames=("result",),
+    kind="counter",
+)
+
+
+@lru_cache(maxsize=4)
+def _cache_key_secret(secret: str, algorithm: str) -> bytes:
+    return hashlib.sha256(f"{algorithm}:{secret}".encode()).digest()
 
 
 class JWTHandler:
     @staticmethod
-    def generate_jwt(payload: Dict[str, Any]) -> str:
+    def start() -> None:
+        # Loads the key ring (if any) at startup rather than on the first request
+        get_key_ring()
+        get_token_cache()
+
+    @staticmethod
+    def token_cache_key(token: str) -> Optional[bytes]:
+        # Keyed with the current key material, so entries verified under an old
+        # secret or key ring generation never match
+        settings = get_settings()
+        key_ring = get_key_ring()
+        if key_ring is not None:
+            key_ring.maybe_reload()
+            material = f"key_ring:{key_ring.generation}"
+        elif settings.secret_key:
+            material = settings.secret_key
+        else:
+            return None
+        return hashlib.blake2b(
+            token.encode(),
+            key=_cache_key_secret(material, settings.jwt_algorithm),
+            digest_size=16,
+        ).digest()
+
+    @staticmethod
+    def jwks() -> Tuple[bytes, str]:
+        key_ring = get_key_ring()
+        if key_ring is None:
+            return EMPTY_JWKS
+        return key_ring.jwks()
+
+    @staticmethod
+    def _secret_key() -> str:
+        secret_key = get_settings().secret_key
+        if not secret_key:
+            raise ValueError("SECRET_KEY is not set")
+        return secret_key
+
+    @staticmethod
+    def _encode(payload: Dict[str, Any]) -> str:
+        key_ring = get_key_ring()
+        if key_ring is None:
+            return jwt.encode(
+                payload,
+                JWTHandler._secret_key(),
+                algorithm=get_settings().jwt_algorithm,
+            )
+        signing_key = key_ring.signing_key
+        if signing_key is None:
+            raise ValueError("No JWT signing key available")
+        return jwt.encode(
+            payload,
+            signing_key.private_key,
+            algorithm=signing_key.algorithm,
+            headers={"kid": signing_key.kid},
+        )
+
+    @staticmethod
+    def _decode(token: str) -> Dict[str, Any]:
+        key_ring = get_key_ring()
+        payload: Dict[str, Any]
+        if key_ring is None:
+            payload = jwt.decode(
+                token,
+                JWTHandler._secret_key(),
+                algorithms=[get_settings().jwt_algorithm],
+            )
+            return payload
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = key_ring.get(kid) if isinstance(kid, str) else None
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        # Pin the algorithm to the key's own, never trust the header's alg
+        payload = jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+        return payload
+
+    @staticmethod
+    def invalidate_token(token: str) -> None:
+        cache_key = JWTHandler.token_cache_key(token)
+        if cache_key is not None:
+            get_token_cache().invalidate(cache_key)
+
+    @staticmethod
+    def generate_jwt(
+        payload: Dict[str, Any], expires_in: Optional[timedelta] = None
+    ) -> str:
         now = datetime.now(timezone.utc)
         payload["iat"] = now
-        payload["exp"] = now + timedelta(hours=JWT_EXPIRATION_TIME)
+        payload["exp"] = now + (
+            expires_in
+            if expires_in is not None
+            else timedelta(hours=get_settings().jwt_expiration_time)
+        )
+        payload.setdefault("jti", uuid.uuid4().hex)
 
-        if not SECRET_KEY:
+        if not JWTHandler._has_key_material():
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.INTERNAL_ERROR,
@@ -34,7 +165,7 @@ class JWTHandler:
                 )
             )
         try:
-            token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+            token = JWTHandler._encode(payload)
             return token
         except Exception as e:
             raise ShipotleError(
@@ -44,28 +175,71 @@ class JWTHandler:
                 )
             )
 
+    @staticmethod
+    def _has_key_material() -> bool:
+        return get_key_ring() is not None or bool(get_settings().secret_key)
+
+    @staticmethod
+    def _check_revoked(jti: Optional[str], session_id: Optional[str]) -> None:
+        # session_id covers every access token of a revoked refresh token family
+        if (jti and RevocationService.is_revoked(jti)) or (
+            session_id and RevocationService.is_revoked(session_id)
+        ):
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=ShipotleError.AUTHORIZATION,
+                    message="Token has been revoked",
+                )
+            )
+
     @staticmethod
     def verify_jwt(token: str) -> UserSessionInfo:
-        if not SECRET_KEY:
+        session_info, _, _ = JWTHandler.verify_jwt_claims(token)
+        return session_info
+
+    @staticmethod
+    def verify_jwt_claims(token: str) -> Tuple[UserSessionInfo, Optional[str], float]:
+        """Verifies the token and returns its session, token id (jti) and exp."""
+        if not JWTHandler._has_key_material():
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.INTERNAL_ERROR,
                     message="Error getting secret key",
                 )
             )
+        metrics_enabled = get_settings().metrics_enabled
+        started = time.perf_counter()
+        token_cache = get_token_cache()
+        cache_key = JWTHandler.token_cache_key(token)
+        if cache_key is not None:
+            cached = token_cache.get(cache_key)
+            if cached is not None:
+                JWTHandler._check_revoked(cached[1], cached[0].session_id)
+                if metrics_enabled:
+                    JWT_VERIFY_SECONDS.observe(time.perf_counter() - started, "hit")
+                return cached
+
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            payload = JWTHandler._decode(token)
 
             session_info = UserSessionInfo(
-                session_id=payload.get("session_id"),
-                user_id=payload.get("user_id"),
+                session_id=payload["session_id"],
+                user_id=payload["user_id"],
                 created_at=datetime.fromtimestamp(payload["iat"], tz=pytz.UTC),
                 expiry_time=datetime.fromtimestamp(payload["exp"], tz=pytz.UTC),
-                role=payload.get("role"),
+                role=payload["role"],
             )
+            # Tokens issued before jti was added are revoked by their session_id
+            jti = payload.get("jti") or payload.get("session_id")
+            expires_at = float(payload["exp"])
 
-            return session_info
+            if cache_key is not None:
+                token_cache.put(cache_key, session_info, expires_at, jti)
+            JWTHandler._check_revoked(jti, session_info.session_id)
+            return session_info, jti, expires_at
 
+        except ShipotleError:
+            raise
         except jwt.ExpiredSignatureError:
             raise ShipotleError(
                 BaseResponse(
@@ -87,3 +261,6 @@ class JWTHandler:
                     message="Error decoding token",
                 )
             )
+        finally:
+            if metrics_enabled:
+                JWT_VERIFY_SECONDS.observe(time.perf_counter() - started, "miss")
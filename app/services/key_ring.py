@@ -0,0 +1,186 @@
+import json
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+
+logger = logging.getLogger("key_ring")
+
+_EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+
+class JWTKey:
+    """A parsed signing or verification key, loaded once and reused for every token."""
+
+    __slots__ = ("kid", "algorithm", "private_key", "public_key", "modified_at")
+
+    def __init__(
+        self,
+        kid: str,
+        algorithm: str,
+        private_key: Any,
+        public_key: Any,
+        modified_at: float,
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = public_key
+        self.modified_at = modified_at
+
+    @property
+    def can_sign(self) -> bool:
+        return self.private_key is not None
+
+    def to_jwk(self) -> Dict[str, Any]:
+        if self.algorithm.startswith("RS"):
+            jwk = RSAAlgorithm.to_jwk(self.public_key, as_dict=True)
+        elif self.algorithm.startswith("ES"):
+            jwk = ECAlgorithm.to_jwk(self.public_key, as_dict=True)
+        else:
+            jwk = OKPAlgorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+def _algorithm_for(public_key: Any) -> Optional[str]:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return "RS256"
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return _EC_ALGORITHMS.get(public_key.curve.name)
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return "EdDSA"
+    return None
+
+
+def load_key(path: str, kid: str) -> Optional[JWTKey]:
+    with open(path, "rb") as f:
+        data = f.read()
+    private_key = None
+    try:
+        private_key = serialization.load_pem_private_key(data, password=None)
+        public_key = private_key.public_key()
+    except ValueError:
+        public_key = serialization.load_pem_public_key(data)
+
+    algorithm = _algorithm_for(public_key)
+    if algorithm is None:
+        logger.warning("Skipping key '%s': unsupported key type", kid)
+        return None
+    return JWTKey(kid, algorithm, private_key, public_key, os.path.getmtime(path))
+
+
+class KeyRing:
+    """
+    Asymmetric JWT keys loaded from a directory of PEM files, one key per file
+    named <kid>.pem. Private keys sign and verify, public-only keys (e.g. keys
+    being retired, or another issuer's keys) only verify. The signing key is
+    signing_kid when given, otherwise the most recently modified private key,
+    so rotating means dropping a new file next to the old one.
+
+    The directory is re-scanned at most every reload_interval seconds when the
+    ring is used; a changed file set bumps `generation`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        signing_kid: Optional[str] = None,
+        reload_interval: float = 30.0,
+    ):
+        self.directory = directory
+        self.signing_kid = signing_kid
+        self.reload_interval = reload_interval
+        self.generation = 0
+        self._keys: Dict[str, JWTKey] = {}
+        self._signing_key: Optional[JWTKey] = None
+        self._jwks: bytes = b'{"keys":[]}'
+        self._jwks_etag = ""
+        self._snapshot: Tuple[Tuple[str, float], ...] = ()
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _scan(self) -> Tuple[Tuple[str, float], ...]:
+        entries: List[Tuple[str, float]] = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".pem"):
+                    entries.append((entry.name, entry.stat().st_mtime))
+        return tuple(sorted(entries))
+
+    def reload(self) -> bool:
+        """Re-reads the directory if its contents changed, returns whether keys changed."""
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            snapshot = self._scan()
+            if snapshot == self._snapshot and self.generation:
+                return False
+
+            keys: Dict[str, JWTKey] = {}
+            for name, _ in snapshot:
+                kid = name[: -len(".pem")]
+                try:
+                    key = load_key(os.path.join(self.directory, name), kid)
+                except (OSError, ValueError) as e:
+                    logger.error("Failed to load JWT key '%s': %s", kid, e)
+                    continue
+                if key is not None:
+                    keys[kid] = key
+
+            signers = [key for key in keys.values() if key.can_sign]
+            if self.signing_kid:
+                signing_key = keys.get(self.signing_kid)
+            else:
+                signing_key = max(
+                    signers, key=lambda key: (key.modified_at, key.kid), default=None
+                )
+
+            jwks = json.dumps(
+                {"keys": [key.to_jwk() for key in keys.values()]},
+                separators=(",", ":"),
+                sort_keys=True,
+            ).encode()
+
+            # Swap everything in at once, readers never see a half-loaded ring
+            self._keys = keys
+            self._signing_key = (
+                signing_key if signing_key and signing_key.can_sign else None
+            )
+            self._jwks = jwks
+            self._jwks_etag = '"' + hashlib.sha256(jwks).hexdigest()[:32] + '"'
+            self._snapshot = snapshot
+            self.generation += 1
+            logger.info(
+                "Loaded %d JWT keys, signing with '%s'",
+                len(keys),
+                self._signing_key.kid if self._signing_key else None,
+            )
+            return True
+
+    def maybe_reload(self) -> None:
+        if time.monotonic() < self._next_check:
+            return
+        try:
+            self.reload()
+        except OSError as e:
+            logger.error("Failed to scan JWT key directory: %s", e)
+
+    @property
+    def signing_key(self) -> Optional[JWTKey]:
+        self.maybe_reload()
+        return self._signing_key
+
+    def get(self, kid: str) -> Optional[JWTKey]:
+        self.maybe_reload()
+        return self._keys.get(kid)
+
+    def jwks(self) -> Tuple[bytes, str]:
+        """Encoded JWKS document of every public key, plus its ETag."""
+        self.maybe_reload()
+        return self._jwks, self._jwks_etag
@@ -0,0 +1,230 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from app.config.settings import get_settings
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger("login_throttle")
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at", "failures", "last_failure", "locked_until")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+        self.failures = 0
+        self.last_failure = 0.0
+        self.locked_until = 0.0
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+
+class LoginThrottle:
+    """
+    Token buckets for one dimension of login attempts (username, client IP or
+    x-caller), sharded by key. Each attempt takes a token, refilled at `rate`
+    per second up to `burst`. After `lockout_after` failures within
+    `failure_window` seconds the key is locked for `lockout_base` seconds,
+    doubling with every further failure up to `lockout_max`; 0 disables the
+    lockout. Each shard is an LRU of at most its share of `max_entries`, so
+    memory stays bounded under key floods.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        burst: float,
+        rate: float,
+        lockout_after: int = 0,
+        failure_window: float = 900.0,
+        lockout_base: float = 1.0,
+        lockout_max: float = 900.0,
+        num_shards: int = 16,
+        max_entries: int = 100_000,
+    ):
+        self.name = name
+        self.burst = burst
+        self.rate = rate
+        self.lockout_after = lockout_after
+        self.failure_window = failure_window
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._mask = num_shards - 1 if num_shards & (num_shards - 1) == 0 else None
+        self._max_per_shard = max(1, max_entries // num_shards)
+        self.rejected = 0
+
+    def _shard(self, key: str) -> _Shard:
+        index = hash(key)
+        if self._mask is not None:
+            return self._shards[index & self._mask]
+        return self._shards[index % len(self._shards)]
+
+    def _bucket(self, shard: _Shard, key: str, now: float) -> _Bucket:
+        bucket = shard.buckets.get(key)
+        if bucket is None:
+            bucket = shard.buckets[key] = _Bucket(self.burst, now)
+            if len(shard.buckets) > self._max_per_shard:
+                shard.buckets.popitem(last=False)
+        else:
+            shard.buckets.move_to_end(key)
+            bucket.tokens = min(
+                self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate
+            )
+            bucket.updated_at = now
+            if now - bucket.last_failure > self.failure_window:
+                bucket.failures = 0
+        return bucket
+
+    def check(self, key: str, now: Optional[float] = None) -> float:
+        """
+        0 if key has an attempt left, else seconds to wait (counted as a
+        rejection). Takes nothing, see take.
+        """
+        now = time.monotonic() if now is None else now
+        shard = self._shard(key)
+        with shard.lock:
+            bucket = self._bucket(shard, key, now)
+            if bucket.locked_until > now:
+                wait = bucket.locked_until - now
+            elif bucket.tokens < 1:
+                wait = (1 - bucket.tokens) / self.rate if self.rate > 0 else math.inf
+            else:
+                return 0.0
+            self.rejected += 1
+            return wait
+
+    def take(self, key: str, now: Optional[float] = None) -> None:
+        """Uses up one attempt of key."""
+        now = time.monotonic() if now is None else now
+        shard = self._shard(key)
+        with shard.lock:
+            self._bucket(shard, key, now).tokens -= 1
+
+    def record_failure(self, key: str, now: Optional[float] = None) -> None:
+        if self.lockout_after <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        shard = self._shard(key)
+        with shard.lock:
+            bucket = self._bucket(shard, key, now)
+            bucket.failures += 1
+            bucket.last_failure = now
+            excess = bucket.failures - self.lockout_after
+            if excess >= 0:
+                lockout = min(
+                    self.lockout_base * 2 ** min(excess, 32), self.lockout_max
+                )
+                bucket.locked_until = now + lockout
+                logger.warning(
+                    "Locking %s after %d failed logins for %.0fs",
+                    self.name,
+                    bucket.failures,
+                    lockout,
+                )
+
+    def reset(self, key: str) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+DIMENSIONS = ("username", "ip", "caller")
+
+
+@lru_cache(maxsize=1)
+def get_throttles() -> Tuple[LoginThrottle, ...]:
+    """One throttle per entry of DIMENSIONS, in that order."""
+    settings = get_settings()
+    return tuple(
+        LoginThrottle(
+            name,
+            burst=getattr(settings, f"login_throttle_{name}_burst"),
+            rate=getattr(settings, f"login_throttle_{name}_rate"),
+            lockout_after=getattr(settings, f"login_throttle_{name}_lockout_after"),
+            failure_window=settings.login_failure_window_seconds,
+            lockout_base=settings.login_lockout_base_seconds,
+            lockout_max=settings.login_lockout_max_seconds,
+            max_entries=settings.login_throttle_max_entries,
+        )
+        for name in DIMENSIONS
+    )
+
+
+REGISTRY.callback(
+    "login_throttle_keys",
+    "Login throttle buckets held in memory by dimension",
+    lambda: {(throttle.name,): len(throttle) for throttle in get_throttles()},
+    labelnames=("dimension",),
+)
+REGISTRY.callback(
+    "login_throttle_rejections_total",
+    "Login attempts rejected before password verification by dimension",
+    lambda: {(throttle.name,): throttle.rejected for throttle in get_throttles()},
+    labelnames=("dimension",),
+    kind="counter",
+)
+
+
+def login_keys(
+    username: str, client_ip: Optional[str], caller: Optional[str]
+) -> List[Optional[str]]:
+    """
+    Keys in DIMENSIONS order; a missing IP or caller is simply not limited,
+    nor is the IP unless LOGIN_THROTTLE_IP_ENABLED says it is the client's.
+    """
+    if not get_settings().login_throttle_ip_enabled:
+        client_ip = None
+    return [username.lower(), client_ip or None, caller or None]
+
+
+def acquire_login(keys: Sequence[Optional[str]]) -> float:
+    """0 when the attempt may proceed, otherwise the longest wait among the keys."""
+    if not get_settings().login_throttle_enabled:
+        return 0.0
+    now = time.monotonic()
+    throttled = [
+        (throttle, key)
+        for throttle, key in zip(get_throttles(), keys)
+        if key is not None
+    ]
+    # Every dimension is checked before any is taken from, so an attempt one
+    # of them turns away doesn't use up the others
+    retry_after = max(
+        (throttle.check(key, now) for throttle, key in throttled), default=0.0
+    )
+    if retry_after > 0:
+        return retry_after
+    for throttle, key in throttled:
+        throttle.take(key, now)
+    return 0.0
+
+
+def record_login_failure(keys: Sequence[Optional[str]]) -> None:
+    if not get_settings().login_throttle_enabled:
+        return
+    now = time.monotonic()
+    for throttle, key in zip(get_throttles(), keys):
+        if key is not None:
+            throttle.record_failure(key, now)
+
+
+def record_login_success(keys: Sequence[Optional[str]]) -> None:
+    # Only the account is forgiven; a valid login must not clear the failures
+    # an address or caller racked up against other accounts
+    if get_settings().login_throttle_enabled and keys[0] is not None:
+        get_throttles()[0].reset(keys[0])
@@ -0,0 +1,222 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+Labels = Tuple[str, ...]
+CallbackValue = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """
+    Monotonic counter. Updates are plain dict operations without locks: they are
+    atomic enough under the GIL for monitoring and never make a request wait.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in list(self._values.items())
+        ]
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+
+
+class Histogram:
+    """Fixed-bucket histogram, observe() is a bisect plus two increments."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(
+                labels, _HistogramSeries(len(self.buckets) + 1)
+            )
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series.counts) if series is not None else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, series.counts):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {repr(series.total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from the owning component at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        callback: Callable[[], CallbackValue],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [f"{self.name} {_format_value(value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(sample)}"
+            for labels, sample in value.items()
+        ]
+
+
+Metric = Union[Counter, Histogram, CallbackMetric]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering (e.g. a reloaded module) replaces the previous collector
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, help_text: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def callback(
+        self,
+        name: str,
+        help_text: str,
+        callback: Callable[[], CallbackValue],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        metric = CallbackMetric(name, help_text, callback, labelnames, kind)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Request latency by route, status and x-authscheme",
+    ("route", "status", "authscheme"),
+)
+BCRYPT_VERIFY_SECONDS = REGISTRY.histogram(
+    "bcrypt_verify_duration_seconds",
+    "Password verification time including the wait for a pool worker",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0),
+)
+JWT_VERIFY_SECONDS = REGISTRY.histogram(
+    "jwt_verify_duration_seconds",
+    "JWTHandler.verify_jwt time by verified-token cache result",
+    ("cache",),
+    # Cache hits take microseconds, all below the smallest latency bucket
+    buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025) + LATENCY_BUCKETS,
+)
+SHIPOTLE_ERRORS = REGISTRY.counter(
+    "shipotle_errors_total",
+    "Error responses by ShipotleError code",
+    ("code",),
+)
@@ -0,0 +1,44 @@
+import logging
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.config.settings import get_settings
+
+logger = logging.getLogger("mongo_client")
+
+# Documents are read and written as plain dicts
+Document = Dict[str, Any]
+
+# One client per process, every collection shares its connection pool
+_client: Optional[AsyncIOMotorClient[Document]] = None
+
+
+def get_mongo_client() -> AsyncIOMotorClient[Document]:
+    global _client
+    if _client is None:
+        settings = get_settings()
+        _client = AsyncIOMotorClient(
+            settings.mongo_uri,
+            maxPoolSize=settings.mongo_max_pool_size,
+            minPoolSize=settings.mongo_min_pool_size,
+            maxIdleTimeMS=60_000,
+            serverSelectionTimeoutMS=5_000,
+            retryWrites=True,
+        )
+        logger.info(
+            "Created MongoDB client with pool size %d-%d",
+            settings.mongo_min_pool_size,
+            settings.mongo_max_pool_size,
+        )
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase[Document]:
+    return get_mongo_client()[get_settings().mongo_db_name]
+
+
+def close_mongo_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        logger.info("Closed MongoDB client")
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ReplaceOne, UpdateOne
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.config.settings import get_settings
+from app.models.session import UserSessionInfo
+from app.services.mongo_client import Document, get_database
+from app.services.session_backend import SessionBackend
+from app.services.session_store import RefreshTokenRecord, SessionRecord
+
+logger = logging.getLogger("mongo_session_backend")
+
+WriteOp = Any
+
+
+class MongoSessionBackend(SessionBackend):
+    """
+    Sessions stored in MongoDB, one document per session keyed by session_id.
+    A TTL index on expiry_time lets the server drop expired sessions (and
+    revoked JWT ids and refresh tokens) on its own.
+    Creates and touches are group-committed: callers enqueue their operation and
+    wait until the batch containing it has been written with a single bulk_write.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        collection: Optional[AsyncIOMotorCollection[Document]] = None,
+        revocation_collection: Optional[AsyncIOMotorCollection[Document]] = None,
+        refresh_token_collection: Optional[AsyncIOMotorCollection[Document]] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        settings = get_settings()
+        self._collection = collection
+        self._revocation_collection = revocation_collection
+        self._refresh_token_collection = refresh_token_collection
+        self.batch_size = (
+            batch_size if batch_size is not None else settings.mongo_write_batch_size
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else settings.mongo_write_flush_ms / 1000
+        )
+        self._pending: List[Tuple[WriteOp, "asyncio.Future[None]"]] = []
+        self._batch_full = asyncio.Event()
+        self._flusher: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def collection(self) -> AsyncIOMotorCollection[Document]:
+        if self._collection is None:
+            self._collection = get_database()[get_settings().mongo_session_collection]
+        return self._collection
+
+    @property
+    def revocation_collection(self) -> AsyncIOMotorCollection[Document]:
+        if self._revocation_collection is None:
+            self._revocation_collection = get_database()[
+                get_settings().mongo_revocation_collection
+            ]
+        return self._revocation_collection
+
+    @property
+    def refresh_token_collection(self) -> AsyncIOMotorCollection[Document]:
+        if self._refresh_token_collection is None:
+            self._refresh_token_collection = get_database()[
+                get_settings().mongo_refresh_token_collection
+            ]
+        return self._refresh_token_collection
+
+    async def start(self) -> None:
+        await self.collection.create_index("expiry_time", expireAfterSeconds=0)
+        await self.collection.create_index([("user_id", 1), ("created_at", 1)])
+        await self.revocation_collection.create_index(
+            "expiry_time", expireAfterSeconds=0
+        )
+        await self.revocation_collection.create_index("revoked_at")
+        await self.refresh_token_collection.create_index(
+            "expiry_time", expireAfterSeconds=0
+        )
+        await self.refresh_token_collection.create_index("user_id")
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info("Mongo session backend ready on '%s'", self.collection.name)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self._flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await self.collection.bulk_write([op for op, _ in batch], ordered=True)
+        except Exception as e:
+            logger.error(
+                "Session batch write of %d operations failed: %s", len(batch), e
+            )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _write(self, op: WriteOp) -> None:
+        if self._flusher is None:
+            # Not started (e.g. used outside the app lifespan), write straight through
+            await self.collection.bulk_write([op])
+            return
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        await future
+
+    async def create(self, session_info: UserSessionInfo) -> str:
+        document = {
+            "_id": session_info.session_id,
+            "user_id": session_info.user_id,
+            "role": session_info.role,
+            "created_at": session_info.created_at,
+            "expiry_time": session_info.expiry_time,
+        }
+        await self._write(
+            ReplaceOne({"_id": session_info.session_id}, document, upsert=True)
+        )
+        return session_info.session_id
+
+    @staticmethod
+    def _session_record(document: Dict[str, Any]) -> SessionRecord:
+        return SessionRecord(
+            session_id=document["_id"],
+            user_id=document["user_id"],
+            role=document["role"],
+            created_at=document["created_at"],
+            expiry_time=document["expiry_time"],
+        )
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        document = await self.collection.find_one({"_id": session_id})
+        if document is None:
+            return None
+        return self._session_record(document)
+
+    async def delete(self, session_id: str) -> bool:
+        # Not batched: the caller needs to know whether the session existed
+        result = await self.collection.delete_one({"_id": session_id})
+        return bool(result.deleted_count)
+
+    async def touch(self, session_id: str, expiry_time: datetime) -> None:
+        await self._write(
+            UpdateOne({"_id": session_id}, {"$set": {"expiry_time": expiry_time}})
+        )
+
+    async def list_user_sessions(self, user_id: str) -> List[SessionRecord]:
+        # Served by the (user_id, created_at) index, only the user's documents are read
+        cursor = self.collection.find(
+            {
+                "user_id": user_id,
+                "expiry_time": {"$gt": datetime.now(timezone.utc).replace(tzinfo=None)},
+            }
+        ).sort("created_at", 1)
+        return [self._session_record(document) async for document in cursor]
+
+    async def delete_user_sessions(self, user_id: str) -> int:
+        result = await self.collection.delete_many({"user_id": user_id})
+        return result.deleted_count
+
+    async def revoke_token(self, jti: str, expiry_time: datetime) -> None:
+        # Revocations are rare (one per logout), written straight through
+        await self.revocation_collection.update_one(
+            {"_id": jti},
+            {
+                "$set": {
+                    "expiry_time": expiry_time,
+                    "revoked_at": datetime.now(timezone.utc).replace(tzinfo=None),
+                }
+            },
+            upsert=True,
+        )
+
+    async def load_revoked_tokens(
+        self, since: Optional[datetime] = None
+    ) -> Dict[str, datetime]:
+        query: Dict[str, Any] = {
+            "expiry_time": {"$gt": datetime.now(timezone.utc).replace(tzinfo=None)}
+        }
+        if since is not None:
+            query["revoked_at"] = {"$gte": since}
+        revoked = {}
+        async for document in self.revocation_collection.find(
+            query, {"expiry_time": 1}
+        ):
+            revoked[document["_id"]] = document["expiry_time"]
+        return revoked
+
+    async def save_refresh_token(self, record: RefreshTokenRecord) -> None:
+        await self.refresh_token_collection.insert_one(
+            {
+                "_id": record.family_id,
+                "user_id": record.user_id,
+                "role": record.role,
+                "token_digest": record.token_digest,
+                "created_at": record.created_at,
+                "expiry_time": record.expiry_time,
+            }
+        )
+
+    async def get_refresh_token(self, family_id: str) -> Optional[RefreshTokenRecord]:
+        document = await self.refresh_token_collection.find_one({"_id": family_id})
+        if document is None:
+            return None
+        return RefreshTokenRecord(
+            family_id=document["_id"],
+            user_id=document["user_id"],
+            role=document["role"],
+            token_digest=document["token_digest"],
+            created_at=document["created_at"],
+            expiry_time=document["expiry_time"],
+        )
+
+    async def list_user_refresh_families(self, user_id: str) -> List[str]:
+        cursor = self.refresh_token_collection.find(
+            {
+                "user_id": user_id,
+                "expiry_time": {"$gt": datetime.now(timezone.utc).replace(tzinfo=None)},
+            },
+            {"_id": 1},
+        )
+        return [document["_id"] async for document in cursor]
+
+    async def rotate_refresh_token(
+        self,
+        family_id: str,
+        current_digest: str,
+        new_digest: str,
+        expiry_time: datetime,
+    ) -> bool:
+        # The digest in the filter makes this a compare-and-swap across replicas
+        result = await self.refresh_token_collection.update_one(
+            {"_id": family_id, "token_digest": current_digest},
+            {"$set": {"token_digest": new_digest, "expiry_time": expiry_time}},
+        )
+        return bool(result.modified_count)
+
+    async def delete_refresh_token(self, family_id: str) -> bool:
+        result = await self.refresh_token_collection.delete_one({"_id": family_id})
+        return bool(result.deleted_count)
@@ -0,0 +1,44 @@
+import logging
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.config.settings import get_settings
+from app.models.user import UserRecord
+from app.services.mongo_client import Document, get_database
+from app.services.user_repository import UserRepository
+
+logger = logging.getLogger("mongo_user_repository")
+
+_USER_PROJECTION = {
+    "_id": 0,
+    "username": 1,
+    "user_id": 1,
+    "password_hash": 1,
+    "role": 1,
+    "email": 1,
+    "public_username": 1,
+}
+
+
+class MongoUserRepository(UserRepository):
+    """Users stored in MongoDB, looked up by a unique index on username."""
+
+    def __init__(self, collection: Optional[AsyncIOMotorCollection[Document]] = None):
+        self._collection = collection
+
+    @property
+    def collection(self) -> AsyncIOMotorCollection[Document]:
+        if self._collection is None:
+            self._collection = get_database()[get_settings().mongo_user_collection]
+        return self._collection
+
+    async def start(self) -> None:
+        await self.collection.create_index("username", unique=True)
+        logger.info("Mongo user repository ready on '%s'", self.collection.name)
+
+    async def get_by_username(self, username: str) -> Optional[UserRecord]:
+        document = await self.collection.find_one(
+            {"username": username}, _USER_PROJECTION
+        )
+        if document is None:
+            return None
+        return UserRecord(**document)
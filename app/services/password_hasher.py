@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+from app.config.settings import get_settings
+from app.error.py_error import BaseResponse, ShipotleError
+from app.services.metrics import BCRYPT_VERIFY_SECONDS
+
+logger = logging.getLogger("password_hasher")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    # Runs inside the pool processes, so it must stay a picklable module-level function
+    verified: bool = pwd_context.verify(password, hashed_password)
+    return verified
+
+
+def _warm_up() -> None:
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt verification on a dedicated process pool so it neither holds the
+    GIL of the serving process nor occupies Starlette's request threadpool.
+    Admission is bounded: once every worker is busy and bcrypt_pool_max_pending
+    verifications are queued, callers get a SERVICE_UNAVAILABLE error instead of
+    an ever-growing queue.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _in_flight: int = 0
+
+    @classmethod
+    def start(cls) -> None:
+        workers = get_settings().bcrypt_pool_workers
+        if cls._executor is not None or workers <= 0:
+            return
+        cls._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        # Spawn every worker up front so the first logins don't pay process start-up
+        for _ in range(workers):
+            cls._executor.submit(_warm_up)
+        logger.info("Started bcrypt process pool with %d workers", workers)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls._executor is None:
+            return
+        cls._executor.shutdown(wait=True, cancel_futures=True)
+        cls._executor = None
+        logger.info("Stopped bcrypt process pool")
+
+    @classmethod
+    def capacity(cls) -> int:
+        settings = get_settings()
+        return max(settings.bcrypt_pool_workers, 1) + settings.bcrypt_pool_max_pending
+
+    @classmethod
+    async def verify(cls, password: str, hashed_password: str) -> bool:
+        # Only ever touched from the event loop thread, so a plain counter is enough
+        if cls._in_flight >= cls.capacity():
+            logger.warning(
+                "Rejecting password verification, %d already in flight",
+                cls._in_flight,
+            )
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=ShipotleError.SERVICE_UNAVAILABLE,
+                    message="Too many concurrent logins, please retry shortly",
+                )
+            )
+
+        cls._in_flight += 1
+        started = time.perf_counter()
+        try:
+            if get_settings().bcrypt_pool_workers <= 0:
+                return await asyncio.to_thread(
+                    _verify_password, password, hashed_password
+                )
+            cls.start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                cls._executor, _verify_password, password, hashed_password
+            )
+        finally:
+            cls._in_flight -= 1
+            if get_settings().metrics_enabled:
+                BCRYPT_VERIFY_SECONDS.observe(time.perf_counter() - started)
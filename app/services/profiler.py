@@ -0,0 +1,191 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+# Leaf frames in these files mean the thread is idle: the event loop waiting
+# in select() or a threadpool worker waiting for work
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+# Threadpools running sync endpoints and dependencies (anyio) and
+# asyncio.to_thread calls such as in-process bcrypt (the loop's default executor)
+_WORKER_THREAD_PREFIXES = ("AnyIO worker thread", "asyncio_")
+_MAX_DEPTH = 128
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    short = os.path.join(
+        os.path.basename(os.path.dirname(path)), os.path.basename(path)
+    )
+    name = getattr(code, "co_qualname", code.co_name)
+    # ';' separates frames in collapsed stacks
+    return f"{short}:{name}".replace(";", ",")
+
+
+def _stack(frame: Optional[FrameType]) -> Tuple[str, ...]:
+    """Root-first labels of the frame's stack."""
+    labels: List[str] = []
+    while frame is not None and len(labels) < _MAX_DEPTH:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class ProfileSession:
+    """
+    One profiling window. While at least one matching request is in flight, a
+    background thread samples the stacks of the event loop thread and the
+    threadpool workers every interval; idle threads are skipped. Samples are
+    taken per process, so with several workers only the one that started the
+    session is profiled. The window closes after duration seconds or once
+    max_requests matching requests have completed, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        route: Optional[str] = None,
+        caller: Optional[str] = None,
+        duration: float = 30.0,
+        max_requests: Optional[int] = None,
+        interval: float = 0.005,
+    ):
+        self.route = route
+        self.caller = caller
+        self.duration = duration
+        self.max_requests = max_requests
+        self.interval = interval
+        self.loop_thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + duration
+        self.in_flight = 0
+        self.completed = 0
+        self.samples = 0
+        self.stacks: Counter[Tuple[str, ...]] = Counter()
+        self.finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.finished.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+
+    def matches(self, path: str, caller: bytes) -> bool:
+        if self.finished.is_set():
+            return False
+        if self.route is not None and path != self.route:
+            return False
+        return self.caller is None or caller.decode("latin-1") == self.caller
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        if self.max_requests is not None and self.completed >= self.max_requests:
+            self.finished.set()
+
+    def _threads(self) -> List[int]:
+        thread_ids = [self.loop_thread_id]
+        for thread in threading.enumerate():
+            if thread.name.startswith(_WORKER_THREAD_PREFIXES) and thread.ident:
+                thread_ids.append(thread.ident)
+        return thread_ids
+
+    def _run(self) -> None:
+        thread_ids = self._threads()
+        refreshed = time.monotonic()
+        while not self.finished.wait(self.interval):
+            now = time.monotonic()
+            if now >= self.deadline:
+                break
+            if not self.in_flight:
+                continue
+            if now - refreshed > 1.0:
+                # The threadpool grows on demand, pick up new workers
+                thread_ids = self._threads()
+                refreshed = now
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                self.stacks[_stack(frame)] += 1
+                self.samples += 1
+        self.finished.set()
+
+    def collapsed(self) -> List[str]:
+        """Stacks in collapsed format ("root;...;leaf count"), as flamegraph.pl reads."""
+        # Copied first, the sampler thread may still be adding to it
+        stacks = Counter(dict(self.stacks))
+        return [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()]
+
+    def top(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """Hottest functions by self samples, with the samples of their callees."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in list(self.stacks.items()):
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [
+            {
+                "function": label,
+                "self_samples": count,
+                "total_samples": total[label],
+                "self_percent": round(100 * count / max(self.samples, 1), 2),
+            }
+            for label, count in own.most_common(limit)
+        ]
+
+    def summary(self, limit: int = 25) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "caller": self.caller,
+            "started_at": self.started_at,
+            "running": not self.finished.is_set(),
+            "interval_ms": self.interval * 1000,
+            "requests": self.completed,
+            "samples": self.samples,
+            "top": self.top(limit),
+            "collapsed": self.collapsed(),
+        }
+
+
+# The current or last session; None until profiling is first started
+_session: Optional[ProfileSession] = None
+
+
+def active_session() -> Optional[ProfileSession]:
+    session = _session
+    if session is None or session.finished.is_set():
+        return None
+    return session
+
+
+def last_session() -> Optional[ProfileSession]:
+    return _session
+
+
+def start_session(**kwargs: Any) -> ProfileSession:
+    """Replaces any running session; must be called on the event loop thread."""
+    global _session
+    if _session is not None:
+        _session.stop()
+    _session = ProfileSession(**kwargs)
+    _session.start()
+    return _session
+
+
+def stop_session() -> Optional[ProfileSession]:
+    if _session is not None:
+        _session.stop()
+    return _session
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+from app.config.settings import get_settings
+from app.error.py_error import BaseResponse, ShipotleError
+from app.models.session import UserSessionInfo
+from app.services.revocation_service import RevocationService
+from app.services.session_service import SessionService
+from app.services.session_store import RefreshTokenRecord
+
+logger = logging.getLogger("refresh_token_service")
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _invalid(message: str) -> ShipotleError:
+    return ShipotleError(
+        BaseResponse(api_response_code=ShipotleError.AUTHORIZATION, message=message)
+    )
+
+
+class RefreshTokenService:
+    """
+    Refresh tokens are "<family_id>.<secret>", where the family is the login
+    session and also the session_id of every access token issued for it. Each
+    refresh swaps the secret for a new one; presenting a secret that was
+    already rotated away means the token leaked, so the whole family is
+    revoked, including its outstanding access tokens.
+    """
+
+    @staticmethod
+    async def issue(session_info: UserSessionInfo) -> str:
+        secret = secrets.token_urlsafe(32)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        await SessionService.get_backend().save_refresh_token(
+            RefreshTokenRecord(
+                family_id=session_info.session_id,
+                user_id=session_info.user_id,
+                role=session_info.role,
+                token_digest=_digest(secret),
+                created_at=now,
+                expiry_time=now
+                + timedelta(seconds=get_settings().refresh_token_ttl_seconds),
+            )
+        )
+        await RefreshTokenService._trim_user_families(session_info.user_id)
+        return f"{session_info.session_id}.{secret}"
+
+    @staticmethod
+    async def _trim_user_families(user_id: str) -> None:
+        max_per_user = get_settings().refresh_token_max_per_user
+        if not max_per_user:
+            return
+        evicted = await SessionService.get_backend().trim_user_refresh_families(
+            user_id, max_per_user
+        )
+        for family_id in evicted:
+            await RefreshTokenService._revoke_access_tokens(family_id)
+        if evicted:
+            logger.info(
+                "Ended %d oldest refresh token families of user %s over the limit of %d",
+                len(evicted),
+                user_id,
+                max_per_user,
+            )
+
+    @staticmethod
+    async def rotate(refresh_token: str) -> Tuple[RefreshTokenRecord, str]:
+        """Consumes refresh_token, returning its family and the replacement token."""
+        family_id, _, secret = refresh_token.partition(".")
+        if not family_id or not secret:
+            raise _invalid("Invalid refresh token")
+
+        backend = SessionService.get_backend()
+        record = await backend.get_refresh_token(family_id)
+        if record is None:
+            raise _invalid("Invalid refresh token")
+        if record.is_expired():
+            await backend.delete_refresh_token(family_id)
+            raise _invalid("Refresh token has expired")
+
+        new_secret = secrets.token_urlsafe(32)
+        expiry_time = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(
+            seconds=get_settings().refresh_token_ttl_seconds
+        )
+        if not await backend.rotate_refresh_token(
+            family_id, _digest(secret), _digest(new_secret), expiry_time
+        ):
+            logger.warning(
+                "Refresh token reuse detected for user %s, revoking family %s",
+                record.user_id,
+                family_id,
+            )
+            await RefreshTokenService.revoke_family(family_id)
+            raise _invalid("Refresh token has been revoked")
+        return record, f"{family_id}.{new_secret}"
+
+    @staticmethod
+    async def revoke_family(family_id: str) -> bool:
+        if not await SessionService.get_backend().delete_refresh_token(family_id):
+            return False
+        await RefreshTokenService._revoke_access_tokens(family_id)
+        return True
+
+    @staticmethod
+    async def _revoke_access_tokens(family_id: str) -> None:
+        # Access tokens of the family can't outlive this, one access lifetime from now
+        await RevocationService.revoke(
+            family_id, time.time() + get_settings().jwt_access_token_seconds
+        )
+
+    @staticmethod
+    async def revoke_user_families(user_id: str) -> int:
+        """Revokes every refresh token family of the user, returning how many."""
+        family_ids = await SessionService.get_backend().list_user_refresh_families(
+            user_id
+        )
+        revoked = 0
+        for family_id in family_ids:
+            if await RefreshTokenService.revoke_family(family_id):
+                revoked += 1
+        return revoked
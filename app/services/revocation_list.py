@@ -0,0 +1,113 @@
+import hashlib
+import heapq
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationList:
+    """
+    Revoked token ids (jti) with their expiry. Lookups go through a Bloom filter
+    first, so the common case of a token that was never revoked is answered
+    without touching the dict. Entries are pruned once their expiry passes and
+    the filter is rebuilt when enough of them are gone or it outgrows its
+    capacity; readers never take the lock.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+        prune_interval: float = 60.0,
+    ):
+        self.error_rate = error_rate
+        self.prune_interval = prune_interval
+        self._revoked: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._pruned_since_rebuild = 0
+        self._next_prune = time.monotonic() + prune_interval
+        self._lock = threading.Lock()
+        self.false_positives = 0
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            if self._revoked.get(jti, 0.0) >= expires_at:
+                return
+            self._revoked[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+            if len(self._revoked) > self._bloom.capacity:
+                self._rebuild(self._bloom.capacity * 2)
+            else:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        if time.monotonic() >= self._next_prune:
+            self.prune()
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            self.false_positives += 1
+            return False
+        return expires_at > time.time()
+
+    def prune(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        pruned = 0
+        with self._lock:
+            self._next_prune = time.monotonic() + self.prune_interval
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, jti = heapq.heappop(heap)
+                # A later revoke() may have extended the entry, keep it then
+                if self._revoked.get(jti) == expires_at:
+                    del self._revoked[jti]
+                    pruned += 1
+            self._pruned_since_rebuild += pruned
+            if self._pruned_since_rebuild > max(len(self._revoked), 1024):
+                self._rebuild(self._bloom.capacity)
+        return pruned
+
+    def _rebuild(self, capacity: int) -> None:
+        bloom = BloomFilter(max(capacity, len(self._revoked)), self.error_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        # Single reference swap, concurrent readers see either filter in full
+        self._bloom = bloom
+        self._pruned_since_rebuild = 0
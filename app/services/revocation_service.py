@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from app.config.settings import get_settings
+from app.services.metrics import REGISTRY
+from app.services.revocation_list import RevocationList
+from app.services.session_service import SessionService
+
+logger = logging.getLogger("revocation_service")
+
+# Re-read a little before the previous sync to cover clock skew between replicas
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+
+@lru_cache(maxsize=1)
+def get_revocation_list() -> RevocationList:
+    return RevocationList(capacity=get_settings().revocation_bloom_capacity)
+
+
+REGISTRY.callback(
+    "jwt_revocations",
+    "Unexpired revoked JWT ids held in memory",
+    lambda: len(get_revocation_list()),
+)
+REGISTRY.callback(
+    "jwt_revocation_bloom_false_positives_total",
+    "Revocation lookups that passed the Bloom filter but were not revoked",
+    lambda: get_revocation_list().false_positives,
+    kind="counter",
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RevocationService:
+    _sync_task: Optional["asyncio.Task[None]"] = None
+    _last_sync: Optional[datetime] = None
+
+    @classmethod
+    async def start(cls) -> None:
+        await cls.sync()
+        if (
+            SessionService.get_backend().shared
+            and get_settings().revocation_sync_seconds > 0
+        ):
+            cls._sync_task = asyncio.create_task(cls._sync_loop())
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._sync_task is not None:
+            cls._sync_task.cancel()
+            try:
+                await cls._sync_task
+            except asyncio.CancelledError:
+                pass
+            cls._sync_task = None
+
+    @classmethod
+    async def _sync_loop(cls) -> None:
+        while True:
+            await asyncio.sleep(get_settings().revocation_sync_seconds)
+            try:
+                await cls.sync()
+            except Exception as e:
+                logger.error("Failed to sync revoked tokens: %s", e)
+
+    @classmethod
+    async def sync(cls) -> None:
+        started = _utcnow()
+        since = cls._last_sync - _SYNC_OVERLAP if cls._last_sync else None
+        revoked = await SessionService.get_backend().load_revoked_tokens(since=since)
+        revocation_list = get_revocation_list()
+        for jti, expiry_time in revoked.items():
+            revocation_list.revoke(
+                jti, expiry_time.replace(tzinfo=timezone.utc).timestamp()
+            )
+        cls._last_sync = started
+        revocation_list.prune()
+        if revoked:
+            logger.info("Loaded %d revoked tokens", len(revoked))
+
+    @staticmethod
+    async def revoke(jti: str, expires_at: float) -> None:
+        get_revocation_list().revoke(jti, expires_at)
+        await SessionService.get_backend().revoke_token(
+            jti,
+            datetime.fromtimestamp(expires_at, tz=timezone.utc).replace(tzinfo=None),
+        )
+
+    @staticmethod
+    def is_revoked(jti: str) -> bool:
+        return get_revocation_list().is_revoked(jti)
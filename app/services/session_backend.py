@@ -0,0 +1,298 @@
+from abc import ABC, abstractmethod
+import asyncio
+import hmac
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from app.config.settings import get_settings
+from app.models.session import UserSessionInfo
+from app.services.session_journal import SessionJournal
+from app.services.session_store import (
+    RefreshTokenRecord,
+    SessionRecord,
+    ShardedSessionStore,
+)
+
+
+logger = logging.getLogger("session_backend")
+
+
+async def purge_periodically(purge: Callable[[], int], interval: float) -> None:
+    """
+    Runs purge every interval seconds in a thread. Stores otherwise only drop
+    expired sessions as new ones come in, so a quiet store keeps them.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await asyncio.to_thread(purge)
+        except Exception as e:
+            logger.error("Failed to purge expired sessions: %s", e)
+        else:
+            if purged:
+                logger.debug("Purged %d expired sessions", purged)
+
+
+async def stop_task(task: Optional["asyncio.Task[None]"]) -> None:
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+class SessionBackend(ABC):
+    """Storage behind SessionService. Implementations must be safe to share across requests."""
+
+    # Whether other processes can write to the same storage (and must be synced from)
+    shared = False
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def create(self, session_info: UserSessionInfo) -> str:
+        """Persists the session and returns its session_id."""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        """Returns the stored session, expired or not, or None when it doesn't exist."""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        """Removes the session, returning False when there was nothing to remove."""
+
+    @abstractmethod
+    async def touch(self, session_id: str, expiry_time: datetime) -> None:
+        """Moves the expiry of an existing session, ignoring unknown ids."""
+
+    @abstractmethod
+    async def list_user_sessions(self, user_id: str) -> List[SessionRecord]:
+        """Returns the user's unexpired sessions, oldest first."""
+
+    async def delete_user_sessions(self, user_id: str) -> int:
+        """Removes every session of the user, returning how many were removed."""
+        deleted = 0
+        for record in await self.list_user_sessions(user_id):
+            if await self.delete(record.session_id):
+                deleted += 1
+        return deleted
+
+    async def trim_user_sessions(self, user_id: str, keep: int) -> List[str]:
+        """Removes the user's oldest sessions beyond keep, returning their ids."""
+        records = await self.list_user_sessions(user_id)
+        evicted = []
+        for record in records[: max(0, len(records) - keep)]:
+            if await self.delete(record.session_id):
+                evicted.append(record.session_id)
+        return evicted
+
+    @abstractmethod
+    async def revoke_token(self, jti: str, expiry_time: datetime) -> None:
+        """Records a revoked JWT id until the token's own expiry."""
+
+    @abstractmethod
+    async def load_revoked_tokens(
+        self, since: Optional[datetime] = None
+    ) -> Dict[str, datetime]:
+        """Returns unexpired revoked JWT ids, only those revoked after since if given."""
+
+    @abstractmethod
+    async def save_refresh_token(self, record: RefreshTokenRecord) -> None:
+        """Stores a new refresh token family."""
+
+    @abstractmethod
+    async def get_refresh_token(self, family_id: str) -> Optional[RefreshTokenRecord]:
+        """Returns the refresh token family, expired or not, or None."""
+
+    @abstractmethod
+    async def list_user_refresh_families(self, user_id: str) -> List[str]:
+        """Returns the ids of the user's unexpired refresh token families."""
+
+    async def trim_user_refresh_families(self, user_id: str, keep: int) -> List[str]:
+        """
+        Removes the user's oldest refresh token families beyond keep,
+        returning their ids.
+        """
+        records = []
+        for family_id in await self.list_user_refresh_families(user_id):
+            record = await self.get_refresh_token(family_id)
+            if record is not None:
+                records.append(record)
+        records.sort(key=lambda record: record.created_at)
+        evicted = []
+        for record in records[: max(0, len(records) - keep)]:
+            if await self.delete_refresh_token(record.family_id):
+                evicted.append(record.family_id)
+        return evicted
+
+    @abstractmethod
+    async def rotate_refresh_token(
+        self,
+        family_id: str,
+        current_digest: str,
+        new_digest: str,
+        expiry_time: datetime,
+    ) -> bool:
+        """
+        Atomically replaces the family's token digest if it still equals
+        current_digest; False means another refresh already used that token.
+        """
+
+    @abstractmethod
+    async def delete_refresh_token(self, family_id: str) -> bool:
+        """Removes the family, returning False when there was nothing to remove."""
+
+
+class InMemorySessionBackend(SessionBackend):
+    def __init__(
+        self, store: ShardedSessionStore, journal: Optional[SessionJournal] = None
+    ):
+        self.store = store
+        # Persists the sessions across restarts when set
+        self.journal = journal
+        # jti -> (expiry_time, revoked_at), all naive UTC
+        self.revoked_tokens: Dict[str, Tuple[datetime, datetime]] = {}
+        self._revoked_prune_at = 1024
+        self.refresh_tokens: Dict[str, RefreshTokenRecord] = {}
+        # user_id -> family ids, pruned together with refresh_tokens
+        self.user_refresh_families: Dict[str, Set[str]] = {}
+        self._refresh_prune_at = 1024
+        self._purger: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        if self.journal is not None:
+            await self.journal.start(self.store)
+        interval = get_settings().session_purge_seconds
+        if interval > 0 and self._purger is None:
+            self._purger = asyncio.create_task(
+                purge_periodically(self.store.purge_expired, interval)
+            )
+
+    async def close(self) -> None:
+        await stop_task(self._purger)
+        self._purger = None
+        if self.journal is not None:
+            await self.journal.close(self.store)
+
+    async def create(self, session_info: UserSessionInfo) -> str:
+        record = SessionRecord.from_session_info(session_info)
+        self.store.put(record)
+        if self.journal is not None:
+            self.journal.record_put(record)
+        return session_info.session_id
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self.store.get(session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        if self.store.pop(session_id) is None:
+            return False
+        if self.journal is not None:
+            self.journal.record_delete(session_id)
+        return True
+
+    async def touch(self, session_id: str, expiry_time: datetime) -> None:
+        record = self.store.get(session_id)
+        if record is None:
+            return
+        record = SessionRecord(
+            session_id=record.session_id,
+            user_id=record.user_id,
+            role=record.role,
+            created_at=record.created_at,
+            expiry_time=expiry_time,
+        )
+        self.store.put(record)
+        if self.journal is not None:
+            self.journal.record_put(record)
+
+    async def list_user_sessions(self, user_id: str) -> List[SessionRecord]:
+        return self.store.user_sessions(user_id)
+
+    async def revoke_token(self, jti: str, expiry_time: datetime) -> None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.revoked_tokens[jti] = (expiry_time, now)
+        if len(self.revoked_tokens) > self._revoked_prune_at:
+            self.revoked_tokens = {
+                jti: entry
+                for jti, entry in self.revoked_tokens.items()
+                if entry[0] > now
+            }
+            self._revoked_prune_at = max(1024, 2 * len(self.revoked_tokens))
+
+    async def load_revoked_tokens(
+        self, since: Optional[datetime] = None
+    ) -> Dict[str, datetime]:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return {
+            jti: expiry_time
+            for jti, (expiry_time, revoked_at) in self.revoked_tokens.items()
+            if expiry_time > now and (since is None or revoked_at >= since)
+        }
+
+    async def save_refresh_token(self, record: RefreshTokenRecord) -> None:
+        self.refresh_tokens[record.family_id] = record
+        self.user_refresh_families.setdefault(record.user_id, set()).add(
+            record.family_id
+        )
+        if len(self.refresh_tokens) > self._refresh_prune_at:
+            self.refresh_tokens = {
+                family_id: record
+                for family_id, record in self.refresh_tokens.items()
+                if not record.is_expired()
+            }
+            self.user_refresh_families = {}
+            for family_id, record in self.refresh_tokens.items():
+                self.user_refresh_families.setdefault(record.user_id, set()).add(
+                    family_id
+                )
+            self._refresh_prune_at = max(1024, 2 * len(self.refresh_tokens))
+
+    async def get_refresh_token(self, family_id: str) -> Optional[RefreshTokenRecord]:
+        return self.refresh_tokens.get(family_id)
+
+    async def list_user_refresh_families(self, user_id: str) -> List[str]:
+        return [
+            family_id
+            for family_id in self.user_refresh_families.get(user_id, ())
+            if not self.refresh_tokens[family_id].is_expired()
+        ]
+
+    async def rotate_refresh_token(
+        self,
+        family_id: str,
+        current_digest: str,
+        new_digest: str,
+        expiry_time: datetime,
+    ) -> bool:
+        # No await in between, so the compare and the swap are atomic on the loop
+        record = self.refresh_tokens.get(family_id)
+        if record is None or not hmac.compare_digest(
+            record.token_digest, current_digest
+        ):
+            return False
+        self.refresh_tokens[family_id] = RefreshTokenRecord(
+            family_id=record.family_id,
+            user_id=record.user_id,
+            role=record.role,
+            token_digest=new_digest,
+            created_at=record.created_at,
+            expiry_time=expiry_time,
+        )
+        return True
+
+    async def delete_refresh_token(self, family_id: str) -> bool:
+        record = self.refresh_tokens.pop(family_id, None)
+        if record is None:
+            return False
+        family_ids = self.user_refresh_families.get(record.user_id)
+        if family_ids is not None:
+            family_ids.discard(family_id)
+            if not family_ids:
+                del self.user_refresh_families[record.user_id]
+        return True
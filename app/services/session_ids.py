@@ -0,0 +1,116 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import struct
+import time
+from functools import lru_cache
+from typing import Optional
+from app.config.settings import get_settings
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger("session_ids")
+
+# Raw layout: version in the low 2 bits of the first byte and the shard hint in
+# its high 6 bits, expiry in epoch seconds, random bytes, truncated HMAC-SHA256
+# of everything before it. 30 bytes are exactly 40 base64url characters.
+VERSION = 1
+_EXPIRY = struct.Struct(">I")
+_RANDOM_BYTES = 15
+_TAG_BYTES = 10
+RAW_SIZE = 1 + _EXPIRY.size + _RANDOM_BYTES + _TAG_BYTES
+ENCODED_SIZE = RAW_SIZE * 4 // 3
+
+_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+# The first character encodes the shard hint alone, so it is read without decoding
+SHARD_HINTS = {character: index for index, character in enumerate(_ALPHABET)}
+
+# Session ids issued before signed ids: str(uuid.uuid4())
+_LEGACY = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$"
+)
+
+SESSION_ID_REJECTIONS = REGISTRY.counter(
+    "session_id_rejections_total",
+    "Session cookies rejected before the store lookup by reason",
+    ("reason",),
+)
+
+
+def shard_hint(session_id: str) -> Optional[int]:
+    """The 0-63 shard hint of a signed session id, None for other strings."""
+    if len(session_id) != ENCODED_SIZE:
+        return None
+    return SHARD_HINTS.get(session_id[0])
+
+
+class SessionIdCodec:
+    """
+    Issues and checks self-validating session ids. Checking one costs a fixed
+    size decode and one HMAC, so forged, garbled and expired cookies are turned
+    away without a store lookup. The embedded expiry is a hard limit: touching
+    a session never extends it past the expiry its id was issued with.
+    """
+
+    def __init__(self, key: bytes, accept_legacy: bool = True):
+        self._key = key
+        self.accept_legacy = accept_legacy
+
+    def _tag(self, body: bytes) -> bytes:
+        return hmac.digest(self._key, body, "sha256")[:_TAG_BYTES]
+
+    def new(self, expires_at: float) -> str:
+        body = (
+            bytes(((secrets.randbelow(64) << 2) | VERSION,))
+            + _EXPIRY.pack(int(expires_at))
+            + secrets.token_bytes(_RANDOM_BYTES)
+        )
+        return base64.urlsafe_b64encode(body + self._tag(body)).decode("ascii")
+
+    def _decode(self, session_id: str) -> Optional[bytes]:
+        if len(session_id) != ENCODED_SIZE:
+            return None
+        try:
+            raw = base64.b64decode(session_id, altchars=b"-_", validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) != RAW_SIZE or raw[0] & 3 != VERSION:
+            return None
+        return raw
+
+    def is_legacy(self, session_id: str) -> bool:
+        return len(session_id) != ENCODED_SIZE and _LEGACY.match(session_id) is not None
+
+    def check(self, session_id: str, now: Optional[float] = None) -> Optional[str]:
+        """None when the id may be looked up, otherwise why it was rejected."""
+        raw = self._decode(session_id)
+        if raw is None:
+            if self.accept_legacy and self.is_legacy(session_id):
+                return None
+            return "malformed"
+        if not hmac.compare_digest(self._tag(raw[:-_TAG_BYTES]), raw[-_TAG_BYTES:]):
+            return "forged"
+        if _EXPIRY.unpack_from(raw, 1)[0] <= (time.time() if now is None else now):
+            return "expired"
+        return None
+
+    def expires_at(self, session_id: str) -> Optional[float]:
+        """Embedded expiry in epoch seconds, None for legacy or malformed ids."""
+        raw = self._decode(session_id)
+        return None if raw is None else float(_EXPIRY.unpack_from(raw, 1)[0])
+
+
+@lru_cache(maxsize=1)
+def get_session_id_codec() -> Optional[SessionIdCodec]:
+    """None when there is no secret to sign with; sessions then get uuid4 ids."""
+    settings = get_settings()
+    secret = settings.session_id_secret or settings.secret_key
+    if not secret:
+        logger.warning("Neither SESSION_ID_SECRET nor SECRET_KEY set, using uuid4 ids")
+        return None
+    # A key of its own, so session ids never share a MAC key with JWTs
+    key = hmac.digest(secret.encode(), b"aitext session id", hashlib.sha256)
+    return SessionIdCodec(key, settings.session_accept_legacy_ids)
@@ -0,0 +1,332 @@
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+from app.services.session_store import (
+    SessionRecord,
+    ShardedSessionStore,
+    from_epoch_us,
+    to_epoch_us,
+)
+
+logger = logging.getLogger("session_journal")
+
+# Every record, in the log and in the snapshot: payload length, crc32, payload
+_FRAME = struct.Struct("<II")
+# Put payload after its opcode: created_at and expiry_time in epoch microseconds
+_TIMES = struct.Struct("<qq")
+_PUT = b"P"
+_DELETE = b"D"
+# Length prefix of each string in a payload
+_LENGTH = struct.Struct("<H")
+
+# Snapshot header: magic, first log generation that is not part of the snapshot
+_SNAPSHOT_HEADER = struct.Struct("<8sQ")
+_SNAPSHOT_MAGIC = b"AITXSNP1"
+_SNAPSHOT = "sessions.snapshot"
+_LOG = re.compile(r"^sessions\.(\d+)\.log$")
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+def _strings(*values: str) -> bytes:
+    encoded = [value.encode() for value in values]
+    return b"".join(_LENGTH.pack(len(value)) + value for value in encoded)
+
+
+def encode_put(record: SessionRecord) -> bytes:
+    payload = (
+        _PUT
+        + _TIMES.pack(to_epoch_us(record.created_at), to_epoch_us(record.expiry_time))
+        + _strings(record.session_id, record.user_id, record.role)
+    )
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def encode_delete(session_id: str) -> bytes:
+    payload = _DELETE + _strings(session_id)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_strings(payload: bytes, position: int) -> List[str]:
+    values = []
+    while position < len(payload):
+        (length,) = _LENGTH.unpack_from(payload, position)
+        position += _LENGTH.size
+        values.append(payload[position : position + length].decode())
+        position += length
+    return values
+
+
+def decode_frames(
+    data: Buffer, start: int = 0
+) -> Iterator[Tuple[bytes, Union[SessionRecord, str]]]:
+    """
+    (opcode, record or session_id) for every intact frame from start; stops at
+    the first torn or corrupt one, which is where a crash cut the log off.
+    """
+    position = start
+    while position + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, position)
+        payload = data[position + _FRAME.size : position + _FRAME.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            logger.warning("Stopping replay at a torn record, offset %d", position)
+            return
+        position += _FRAME.size + length
+        opcode = payload[:1]
+        if opcode == _PUT:
+            created_us, expires_us = _TIMES.unpack_from(payload, 1)
+            session_id, user_id, role = _decode_strings(payload, 1 + _TIMES.size)
+            yield opcode, SessionRecord(
+                session_id=session_id,
+                user_id=user_id,
+                role=role,
+                created_at=from_epoch_us(created_us),
+                expiry_time=from_epoch_us(expires_us),
+            )
+        elif opcode == _DELETE:
+            yield opcode, _decode_strings(payload, 1)[0]
+
+
+class SessionJournal:
+    """
+    Makes an in-process ShardedSessionStore survive restarts. Creates, touches
+    and deletes are appended to an in-memory buffer, written and fsync'd to
+    sessions.<generation>.log every fsync_interval by a background task, so
+    requests never wait for the disk. A crash loses at most that interval.
+
+    Every snapshot_interval the journal switches to a new log generation,
+    writes the live sessions to sessions.snapshot (atomically, through a
+    rename) and deletes the older logs. The snapshot records the generation it
+    was started at; startup maps it, then replays the logs from that
+    generation on. Records are full session states, so operations logged
+    while the snapshot was being copied replay to the same result.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync_interval: float = 0.1,
+        snapshot_interval: float = 300.0,
+    ):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.generation = 0
+        self.log_bytes = 0
+        self._buffer = bytearray()
+        self._log: Optional[BinaryIO] = None
+        self._lock_file: Optional[BinaryIO] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping = asyncio.Event()
+        self._next_snapshot = 0.0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _log_generations(self) -> List[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            match = _LOG.match(name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def record_put(self, record: SessionRecord) -> None:
+        if self._log is not None:
+            self._buffer += encode_put(record)
+
+    def record_delete(self, session_id: str) -> None:
+        if self._log is not None:
+            self._buffer += encode_delete(session_id)
+
+    async def start(self, store: ShardedSessionStore) -> None:
+        started = time.perf_counter()
+        loaded, replayed = await asyncio.to_thread(self._open, store)
+        logger.info(
+            "Restored %d sessions (%d log records replayed) in %.3fs",
+            loaded,
+            replayed,
+            time.perf_counter() - started,
+        )
+        # Compact right away when the previous run left a log behind
+        self._next_snapshot = time.monotonic() + (
+            0 if replayed else self.snapshot_interval
+        )
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run(store))
+
+    async def close(self, store: ShardedSessionStore) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        # A clean shutdown leaves only a snapshot, the next start has no log to replay
+        await self.snapshot(store)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _open(self, store: ShardedSessionStore) -> Tuple[int, int]:
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(self._path("sessions.lock"), "wb")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(
+                f"Session journal '{self.directory}' is used by another process"
+            )
+
+        now = time.time()
+        loaded = replayed = 0
+        first_generation = 0
+        if os.path.exists(self._path(_SNAPSHOT)):
+            first_generation, loaded = self._load_snapshot(store, now)
+        self.generation = first_generation
+        for generation in self._log_generations():
+            if generation >= first_generation:
+                replayed += self._replay_log(store, generation, now)
+            self.generation = max(self.generation, generation)
+
+        self.generation += 1
+        self._log = self._open_log(self.generation)
+        self.log_bytes = 0
+        return loaded, replayed
+
+    def _open_log(self, generation: int) -> BinaryIO:
+        # Unbuffered, so a failed write leaves nothing behind to be written later
+        return open(self._path(f"sessions.{generation}.log"), "ab", buffering=0)
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_snapshot(self, store: ShardedSessionStore, now: float) -> Tuple[int, int]:
+        data = self._map(self._path(_SNAPSHOT))
+        if data is None or len(data) < _SNAPSHOT_HEADER.size:
+            return 0, 0
+        with data:
+            magic, first_generation = _SNAPSHOT_HEADER.unpack_from(data)
+            if magic != _SNAPSHOT_MAGIC:
+                logger.error("Ignoring session snapshot with unknown format")
+                return 0, 0
+            loaded = 0
+            for _, record in decode_frames(data, _SNAPSHOT_HEADER.size):
+                if isinstance(record, SessionRecord) and not record.is_expired(now):
+                    store.put(record)
+                    loaded += 1
+        return first_generation, loaded
+
+    def _replay_log(
+        self, store: ShardedSessionStore, generation: int, now: float
+    ) -> int:
+        data = self._map(self._path(f"sessions.{generation}.log"))
+        if data is None:
+            return 0
+        replayed = 0
+        with data:
+            for _, value in decode_frames(data):
+                replayed += 1
+                if isinstance(value, str):
+                    store.pop(value)
+                elif value.is_expired(now):
+                    # Replaces whatever older, still valid state came before it
+                    store.pop(value.session_id)
+                else:
+                    store.put(value)
+        return replayed
+
+    async def _run(self, store: ShardedSessionStore) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.fsync_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+                if time.monotonic() >= self._next_snapshot:
+                    await self.snapshot(store)
+            except Exception as e:
+                logger.error("Session journal write failed: %s", e)
+
+    async def flush(self) -> None:
+        if not self._buffer or self._log is None:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        try:
+            await asyncio.to_thread(self._write, self._log, data)
+        except BaseException:
+            # Ahead of whatever was recorded meanwhile, so the next flush
+            # writes everything in order
+            self._buffer[:0] = data
+            raise
+        self.log_bytes += len(data)
+
+    @staticmethod
+    def _write(log: BinaryIO, data: bytes) -> None:
+        descriptor = log.fileno()
+        start = os.fstat(descriptor).st_size
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(descriptor, view) :]
+            os.fsync(descriptor)
+        except BaseException:
+            # Cut off the part that made it, the next flush writes all of data
+            os.ftruncate(descriptor, start)
+            raise
+
+    async def snapshot(self, store: ShardedSessionStore) -> None:
+        started = time.perf_counter()
+        await self.flush()
+        # Operations from here on go to the new generation, which the snapshot
+        # tells startup to replay on top of it
+        previous = self._log
+        self.generation += 1
+        self._log = self._open_log(self.generation)
+        self.log_bytes = 0
+        if previous is not None:
+            previous.close()
+
+        count = await asyncio.to_thread(self._write_snapshot, store, self.generation)
+        self._next_snapshot = time.monotonic() + self.snapshot_interval
+        logger.info(
+            "Wrote session snapshot of %d sessions in %.3fs",
+            count,
+            time.perf_counter() - started,
+        )
+
+    def _write_snapshot(self, store: ShardedSessionStore, generation: int) -> int:
+        now = time.time()
+        records = [record for record in store.records() if not record.is_expired(now)]
+        temporary = self._path(_SNAPSHOT + ".tmp")
+        with open(temporary, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, generation))
+            f.write(b"".join(encode_put(record) for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._path(_SNAPSHOT))
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+        for old in self._log_generations():
+            if old < generation:
+                os.remove(self._path(f"sessions.{old}.log"))
+        return len(records)
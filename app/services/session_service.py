@@ -1,30 +1,116 @@
 import logging
-from typing import Any, Dict
+import time
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from app.models.session import UserSessionInfo
 from datetime import datetime, timedelta, timezone
+from app.config.settings import get_settings
 from app.error.py_error import ShipotleError, BaseResponse
-
-# In-memory session store
-session_store: Dict[str, Dict[str, Any]] = {}
+from app.services.session_backend import InMemorySessionBackend, SessionBackend
+from app.services.session_ids import SESSION_ID_REJECTIONS, get_session_id_codec
+from app.services.session_journal import SessionJournal
+from app.services.session_store import ShardedSessionStore
+from app.services.metrics import REGISTRY
+from app.services.tracing import traced
 
 logger = logging.getLogger("session_service")
 
+# A replaced legacy session id stays valid this long, for requests already sent with it
+LEGACY_ID_GRACE_SECONDS = 60
+# A session ends this long after its last use, and never after the hard
+# limit embedded in a signed id
+SESSION_IDLE_TIMEOUT = timedelta(hours=1)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def create_session_backend(name: Optional[str] = None) -> SessionBackend:
+    settings = get_settings()
+    name = name or settings.session_backend
+    if name == "shm":
+        from app.services.shm_session_backend import SharedMemorySessionBackend
+
+        return SharedMemorySessionBackend()
+    if name == "mongo":
+        # Imported lazily so the in-memory setup doesn't need motor at all
+        from app.services.mongo_session_backend import MongoSessionBackend
+
+        return MongoSessionBackend()
+    if name != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND '{name}'")
+    journal = None
+    if settings.session_persist_dir:
+        journal = SessionJournal(
+            settings.session_persist_dir,
+            fsync_interval=settings.session_persist_fsync_ms / 1000,
+            snapshot_interval=settings.session_snapshot_seconds,
+        )
+    return InMemorySessionBackend(
+        ShardedSessionStore(
+            num_shards=settings.session_store_shards,
+            max_entries=settings.session_store_max_entries,
+        ),
+        journal,
+    )
+
 
 class SessionService:
-    @staticmethod
-    def create_session(user_info: UserSessionInfo) -> str:
+    backend: Optional[SessionBackend] = None
+    # Legacy session id -> (signed id it was moved to, end of its grace period),
+    # so requests racing with the migration get the same new id
+    _migrated: Dict[str, Tuple[str, float]] = {}
+
+    @classmethod
+    def configure(cls, backend: SessionBackend) -> None:
+        cls.backend = backend
+
+    @classmethod
+    def get_backend(cls) -> SessionBackend:
+        # Created on first use when the app lifespan hasn't started it
+        if cls.backend is None:
+            cls.backend = create_session_backend()
+        return cls.backend
+
+    @classmethod
+    async def start(cls) -> None:
+        await cls.get_backend().start()
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.backend is not None:
+            await cls.backend.close()
+            # A later start (e.g. the next TestClient) opens a fresh backend
+            cls.backend = None
+
+    @classmethod
+    @traced("session.create")
+    async def create_session(cls, user_info: UserSessionInfo) -> str:
         try:
-            user_info.expiry_time = (
-                datetime.now(timezone.utc).replace(tzinfo=None)
-            ) + timedelta(hours=1)
-            session_store[user_info.session_id] = user_info.dict()
+            user_info.expiry_time = _utc_now() + SESSION_IDLE_TIMEOUT
+            codec = get_session_id_codec()
+            if codec is not None:
+                # Cookie sessions get a signed id whose expiry caps the session's
+                expires_at = time.time() + get_settings().session_max_lifetime_seconds
+                user_info.session_id = codec.new(expires_at)
+                user_info.expiry_time = min(
+                    user_info.expiry_time, _from_timestamp(expires_at)
+                )
+            await cls.get_backend().create(user_info)
             logger.info(
-                f"Created session for user: {user_info.user_id}, session_id: {user_info.session_id}"
+                "Created session for user: %s, session_id: %s",
+                user_info.user_id,
+                user_info.session_id,
             )
+            await cls._trim_user_sessions(user_info.user_id)
             return user_info.session_id
         except Exception as e:
-            logger.error(f"Error creating session: {str(e)}")
+            logger.error("Error creating session: %s", e)
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.INTERNAL_ERROR,
@@ -32,11 +118,31 @@ class SessionService:
                 )
             )
 
-    @staticmethod
-    def get_session(session_id: str) -> UserSessionInfo:
-        session_data = session_store.get(session_id)
-        if not session_data:
-            logger.warning(f"Session not found for session_id: {session_id}")
+    @classmethod
+    async def _trim_user_sessions(cls, user_id: str) -> None:
+        max_per_user = get_settings().session_max_per_user
+        if not max_per_user:
+            return
+        evicted = await cls.get_backend().trim_user_sessions(user_id, max_per_user)
+        if evicted:
+            logger.info(
+                "Ended %d oldest sessions of user %s over the limit of %d",
+                len(evicted),
+                user_id,
+                max_per_user,
+            )
+
+    @classmethod
+    @traced("session.get")
+    async def get_session(cls, session_id: str) -> UserSessionInfo:
+        codec = get_session_id_codec()
+        rejected = codec.check(session_id) if codec is not None else None
+        if rejected is not None:
+            # Forged, garbled and expired cookies are common, no store lookup
+            # and only a debug log for them
+            if get_settings().metrics_enabled:
+                SESSION_ID_REJECTIONS.inc(rejected)
+            logger.debug("Rejected %s session id", rejected)
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.AUTHORIZATION,
@@ -44,10 +150,22 @@ class SessionService:
                 )
             )
 
-        session = UserSessionInfo(**session_data)
-        if session.is_expired():
+        record = await cls.get_backend().get(session_id)
+        if record is None:
+            logger.warning("Session not found for session_id: %s", session_id)
+            raise ShipotleError(
+                BaseResponse(
+                    api_response_code=ShipotleError.AUTHORIZATION,
+                    message="Session invalid",
+                )
+            )
+
+        if record.is_expired():
+            await cls.get_backend().delete(session_id)
             logger.warning(
-                f"Session expired for user: {session.user_id}, session_id: {session_id}"
+                "Session expired for user: %s, session_id: %s",
+                record.user_id,
+                session_id,
             )
             raise ShipotleError(
                 BaseResponse(
@@ -57,20 +175,147 @@ class SessionService:
             )
 
         logger.info(
-            f"Session retrieved for user: {session.user_id}, session_id: {session_id}"
+            "Session retrieved for user: %s, session_id: %s", record.user_id, session_id
         )
-        return session
+        session_info = record.to_session_info()
+        expiry_time = cls._sliding_expiry(session_id)
+        # Extended once half the idle timeout has passed, not written on every
+        # request
+        if expiry_time - record.expiry_time > SESSION_IDLE_TIMEOUT / 2:
+            await cls.touch_session(session_id, expiry_time)
+            session_info.expiry_time = expiry_time
+        return session_info
 
     @staticmethod
-    def delete_session(session_id: str):
-        if session_id in session_store:
-            session_store.pop(session_id)
-            logger.info(f"Deleted session for session_id: {session_id}")
+    def _sliding_expiry(session_id: str) -> datetime:
+        expiry_time = _utc_now() + SESSION_IDLE_TIMEOUT
+        codec = get_session_id_codec()
+        expires_at = codec.expires_at(session_id) if codec is not None else None
+        if expires_at is not None:
+            expiry_time = min(expiry_time, _from_timestamp(expires_at))
+        return expiry_time
+
+    @classmethod
+    @traced("session.touch")
+    async def touch_session(
+        cls, session_id: str, expiry_time: Optional[datetime] = None
+    ) -> None:
+        """Moves the session's expiry to SESSION_IDLE_TIMEOUT from now."""
+        if expiry_time is None:
+            expiry_time = cls._sliding_expiry(session_id)
+        await cls.get_backend().touch(session_id, expiry_time)
+
+    @classmethod
+    def is_legacy_session_id(cls, session_id: str) -> bool:
+        codec = get_session_id_codec()
+        return codec is not None and codec.is_legacy(session_id)
+
+    @classmethod
+    @traced("session.migrate")
+    async def migrate_session(cls, session_info: UserSessionInfo) -> str:
+        """
+        Moves a session with a legacy uuid4 id to a new signed id and returns
+        it. The old id keeps working for LEGACY_ID_GRACE_SECONDS, so requests
+        already sent with it don't fail; those that migrate it again get the
+        same new id. Like a new session, the migrated one counts against the
+        per-user limit.
+        """
+        old_session_id = session_info.session_id
+        codec = get_session_id_codec()
+        if codec is None:
+            return old_session_id
+        now = time.time()
+        while cls._migrated:
+            # Entries are added with the same grace period, so oldest first
+            oldest = next(iter(cls._migrated))
+            if cls._migrated[oldest][1] > now:
+                break
+            del cls._migrated[oldest]
+        replaced = cls._migrated.get(old_session_id)
+        if replaced is not None:
+            return replaced[0]
+
+        expires_at = now + get_settings().session_max_lifetime_seconds
+        migrated = UserSessionInfo(
+            session_id=codec.new(expires_at),
+            user_id=session_info.user_id,
+            role=session_info.role,
+            created_at=_utc_now(),
+            expiry_time=min(session_info.expiry_time, _from_timestamp(expires_at)),
+        )
+        # Recorded before the first await, so a concurrent request already sees it
+        cls._migrated[old_session_id] = (
+            migrated.session_id,
+            now + LEGACY_ID_GRACE_SECONDS,
+        )
+        backend = cls.get_backend()
+        try:
+            await backend.create(migrated)
+        except Exception:
+            cls._migrated.pop(old_session_id, None)
+            raise
+        grace = _utc_now() + timedelta(seconds=LEGACY_ID_GRACE_SECONDS)
+        await backend.touch(old_session_id, min(session_info.expiry_time, grace))
+        logger.info(
+            "Migrated legacy session of user: %s to a signed id", session_info.user_id
+        )
+        await cls._trim_user_sessions(session_info.user_id)
+        return migrated.session_id
+
+    @classmethod
+    @traced("session.delete")
+    async def delete_session(cls, session_id: str) -> None:
+        codec = get_session_id_codec()
+        valid = codec is None or codec.check(session_id) is None
+        if valid and await cls.get_backend().delete(session_id):
+            logger.info("Deleted session for session_id: %s", session_id)
         else:
-            logger.warning(f"Attempted to delete non-existent session_id: {session_id}")
+            logger.warning(
+                "Attempted to delete non-existent session_id: %s", session_id
+            )
             raise ShipotleError(
                 BaseResponse(
                     api_response_code=ShipotleError.AUTHORIZATION,
                     message="Invalid or expired session ID",
                 )
             )
+
+    @classmethod
+    @traced("session.list")
+    async def list_sessions(cls, user_id: str) -> List[UserSessionInfo]:
+        records = await cls.get_backend().list_user_sessions(user_id)
+        return [record.to_session_info() for record in records]
+
+    @classmethod
+    @traced("session.delete_all")
+    async def delete_user_sessions(cls, user_id: str) -> int:
+        deleted = await cls.get_backend().delete_user_sessions(user_id)
+        logger.info("Deleted %d sessions of user: %s", deleted, user_id)
+        return deleted
+
+
+def _memory_store() -> Optional[ShardedSessionStore]:
+    # The in-process and shared memory backends both keep their sessions in .store
+    return getattr(SessionService.backend, "store", None)
+
+
+REGISTRY.callback(
+    "session_store_size",
+    "Sessions held by the in-process or shared memory store",
+    lambda: len(_memory_store() or ()),
+)
+REGISTRY.callback(
+    "session_store_evictions_total",
+    "Sessions evicted from the in-process or shared memory store by reason",
+    lambda: {
+        ("expired",): getattr(_memory_store(), "expired_evictions", 0),
+        ("lru",): getattr(_memory_store(), "lru_evictions", 0),
+    },
+    labelnames=("reason",),
+    kind="counter",
+)
+REGISTRY.callback(
+    "session_journal_log_bytes",
+    "Bytes appended to the session log since the last snapshot",
+    lambda: getattr(getattr(SessionService.backend, "journal", None), "log_bytes", 0),
+)
@@ -0,0 +1,301 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.models.session import UserSessionInfo
+from app.services.session_ids import shard_hint
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Naive UTC datetime to epoch microseconds, exact in both directions."""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value: int) -> datetime:
+    return _EPOCH + value * _MICROSECOND
+
+
+class SessionRecord:
+    """Compact in-memory form of a session, converted to UserSessionInfo on read."""
+
+    __slots__ = (
+        "session_id",
+        "user_id",
+        "role",
+        "created_at",
+        "expiry_time",
+        "expires_at",
+    )
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: str,
+        role: str,
+        created_at: datetime,
+        expiry_time: datetime,
+    ):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.role = role
+        self.created_at = created_at
+        self.expiry_time = expiry_time
+        # expiry_time is naive UTC, keep an epoch copy for cheap comparisons
+        self.expires_at = expiry_time.replace(tzinfo=timezone.utc).timestamp()
+
+    @classmethod
+    def from_session_info(cls, session_info: UserSessionInfo) -> "SessionRecord":
+        return cls(
+            session_id=session_info.session_id,
+            user_id=session_info.user_id,
+            role=session_info.role,
+            created_at=session_info.created_at,
+            expiry_time=session_info.expiry_time,
+        )
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) > self.expires_at
+
+    def to_session_info(self) -> UserSessionInfo:
+        # Fields were validated when the session was created, skip validating again
+        return UserSessionInfo.model_construct(
+            session_id=self.session_id,
+            user_id=self.user_id,
+            created_at=self.created_at,
+            expiry_time=self.expiry_time,
+            role=self.role,
+        )
+
+
+class RefreshTokenRecord:
+    """
+    A refresh token family: one per login, rotated on every refresh. Only a
+    digest of the current token is kept, never the token itself.
+    """
+
+    __slots__ = (
+        "family_id",
+        "user_id",
+        "role",
+        "token_digest",
+        "created_at",
+        "expiry_time",
+        "expires_at",
+    )
+
+    def __init__(
+        self,
+        family_id: str,
+        user_id: str,
+        role: str,
+        token_digest: str,
+        created_at: datetime,
+        expiry_time: datetime,
+    ):
+        self.family_id = family_id
+        self.user_id = user_id
+        self.role = role
+        self.token_digest = token_digest
+        self.created_at = created_at
+        self.expiry_time = expiry_time
+        self.expires_at = expiry_time.replace(tzinfo=timezone.utc).timestamp()
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) > self.expires_at
+
+
+class _Shard:
+    __slots__ = ("lock", "entries", "expiry_heap", "lru_evictions", "expired_evictions")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, SessionRecord]" = OrderedDict()
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.lru_evictions = 0
+        self.expired_evictions = 0
+
+
+class _UserShard:
+    __slots__ = ("lock", "sessions")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # user_id -> session ids in insertion order (a dict used as an ordered set)
+        self.sessions: Dict[str, Dict[str, None]] = {}
+
+
+class ShardedSessionStore:
+    """
+    Session store split into independently locked shards. Each shard keeps its
+    records in LRU order plus a min-heap of expiry times, so expired sessions are
+    dropped from the top of the heap without scanning the whole shard, and the
+    least recently used session is evicted once the shard reaches its share of
+    max_entries. Locks are only held for dict/heap operations, which makes the
+    store safe to share between threadpool and event loop callers.
+
+    A secondary index, sharded by user_id, maps each user to their session ids.
+    Every path that adds or removes a record (put, pop, expiry and LRU
+    eviction) updates it under the session shard's lock, so a user's sessions
+    are found without scanning the store. Index locks are only ever taken
+    inside a session shard lock or on their own, never the other way round.
+    """
+
+    def __init__(self, num_shards: int = 16, max_entries: int = 100_000):
+        # Round up to a power of two so the shard index is a single mask
+        shard_count = 1
+        while shard_count < max(num_shards, 1):
+            shard_count <<= 1
+        self._mask = shard_count - 1
+        self._shards = [_Shard() for _ in range(shard_count)]
+        self._max_per_shard = max(1, -(-max_entries // shard_count))
+        self._user_shards = [_UserShard() for _ in range(shard_count)]
+
+    def _shard_for(self, session_id: str) -> _Shard:
+        # Signed ids carry a random shard hint in their first character, which
+        # saves hashing them; only the first 64 shards get hinted ids
+        hint = shard_hint(session_id)
+        if hint is not None:
+            return self._shards[hint & self._mask]
+        return self._shards[hash(session_id) & self._mask]
+
+    def _user_shard_for(self, user_id: str) -> _UserShard:
+        return self._user_shards[hash(user_id) & self._mask]
+
+    def _index_add(self, record: SessionRecord) -> None:
+        user_shard = self._user_shard_for(record.user_id)
+        with user_shard.lock:
+            user_shard.sessions.setdefault(record.user_id, {})[record.session_id] = None
+
+    def _index_remove(self, record: SessionRecord) -> None:
+        user_shard = self._user_shard_for(record.user_id)
+        with user_shard.lock:
+            session_ids = user_shard.sessions.get(record.user_id)
+            if session_ids is not None:
+                session_ids.pop(record.session_id, None)
+                if not session_ids:
+                    del user_shard.sessions[record.user_id]
+
+    def _purge_shard(self, shard: _Shard, now: float) -> int:
+        purged = 0
+        heap = shard.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(heap)
+            record = shard.entries.get(session_id)
+            # Heap entries of deleted or replaced sessions are stale, just drop them
+            if record is not None and record.expires_at == expires_at:
+                del shard.entries[session_id]
+                self._index_remove(record)
+                purged += 1
+        shard.expired_evictions += purged
+        return purged
+
+    def put(self, record: SessionRecord) -> None:
+        shard = self._shard_for(record.session_id)
+        with shard.lock:
+            self._purge_shard(shard, time.time())
+            previous = shard.entries.get(record.session_id)
+            if previous is not None and previous.user_id != record.user_id:
+                self._index_remove(previous)
+            shard.entries[record.session_id] = record
+            shard.entries.move_to_end(record.session_id)
+            heapq.heappush(shard.expiry_heap, (record.expires_at, record.session_id))
+            if previous is None or previous.user_id != record.user_id:
+                self._index_add(record)
+
+            while len(shard.entries) > self._max_per_shard:
+                _, evicted = shard.entries.popitem(last=False)
+                self._index_remove(evicted)
+                shard.lru_evictions += 1
+
+            if len(shard.expiry_heap) > 2 * len(shard.entries) + 64:
+                shard.expiry_heap = [
+                    (entry.expires_at, entry.session_id)
+                    for entry in shard.entries.values()
+                ]
+                heapq.heapify(shard.expiry_heap)
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        shard = self._shard_for(session_id)
+        with shard.lock:
+            record = shard.entries.get(session_id)
+            if record is not None:
+                shard.entries.move_to_end(session_id)
+            return record
+
+    def pop(self, session_id: str) -> Optional[SessionRecord]:
+        shard = self._shard_for(session_id)
+        with shard.lock:
+            record = shard.entries.pop(session_id, None)
+            if record is not None:
+                self._index_remove(record)
+            return record
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        purged = 0
+        for shard in self._shards:
+            with shard.lock:
+                purged += self._purge_shard(shard, now)
+        return purged
+
+    def user_sessions(
+        self, user_id: str, now: Optional[float] = None
+    ) -> List[SessionRecord]:
+        """The user's unexpired sessions, oldest first; costs O(their count)."""
+        now = time.time() if now is None else now
+        user_shard = self._user_shard_for(user_id)
+        with user_shard.lock:
+            session_ids = list(user_shard.sessions.get(user_id, ()))
+        records = []
+        for session_id in session_ids:
+            shard = self._shard_for(session_id)
+            with shard.lock:
+                record = shard.entries.get(session_id)
+            if record is not None and not record.is_expired(now):
+                records.append(record)
+        records.sort(key=lambda record: record.created_at)
+        return records
+
+    def records(self) -> List[SessionRecord]:
+        """Every stored session, copied shard by shard."""
+        records: List[SessionRecord] = []
+        for shard in self._shards:
+            with shard.lock:
+                records.extend(shard.entries.values())
+        return records
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiry_heap.clear()
+        for user_shard in self._user_shards:
+            with user_shard.lock:
+                user_shard.sessions.clear()
+
+    def __contains__(self, session_id: str) -> bool:
+        shard = self._shard_for(session_id)
+        with shard.lock:
+            return session_id in shard.entries
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self._shards:
+            with shard.lock:
+                session_ids = list(shard.entries)
+            yield from session_ids
+
+    @property
+    def lru_evictions(self) -> int:
+        return sum(shard.lru_evictions for shard in self._shards)
+
+    @property
+    def expired_evictions(self) -> int:
+        return sum(shard.expired_evictions for shard in self._shards)
@@ -0,0 +1,503 @@
+import asyncio
+import hmac
+import logging
+import os
+import struct
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from app.config.settings import get_settings
+from app.models.session import UserSessionInfo
+from app.services.session_backend import (
+    SessionBackend,
+    purge_periodically,
+    stop_task,
+)
+from app.services.session_store import (
+    RefreshTokenRecord,
+    SessionRecord,
+    from_epoch_us,
+    to_epoch_us,
+)
+from app.services.shm_table import SharedHashTable, now_us, table_size
+
+logger = logging.getLogger("shm_session_backend")
+
+USER_ID_MAX = 48
+ROLE_MAX = 16
+DIGEST_MAX = 64
+# Signed session ids are 40 characters, legacy uuid4 ones 36; the user index
+# stores them inline
+SESSION_ID_MAX = 40
+
+_TIMESTAMP = struct.Struct("<q")
+
+# created_at plus length-prefixed user_id and role
+SESSION_VALUE_SIZE = _TIMESTAMP.size + 2 + USER_ID_MAX + ROLE_MAX
+# created_at plus length-prefixed token digest, user_id and role
+REFRESH_VALUE_SIZE = _TIMESTAMP.size + 3 + DIGEST_MAX + USER_ID_MAX + ROLE_MAX
+# revoked_at
+REVOCATION_VALUE_SIZE = _TIMESTAMP.size
+
+
+def _pack(timestamp: int, *fields: str) -> bytes:
+    packed = [_TIMESTAMP.pack(timestamp)]
+    for field in fields:
+        encoded = field.encode()
+        packed.append(bytes((len(encoded),)) + encoded)
+    return b"".join(packed)
+
+
+def _unpack_strings(value: bytes, position: int = 0) -> List[str]:
+    fields = []
+    while position < len(value):
+        length = value[position]
+        fields.append(value[position + 1 : position + 1 + length].decode())
+        position += 1 + length
+    return fields
+
+
+def _unpack(value: bytes) -> Tuple[int, List[str]]:
+    return _TIMESTAMP.unpack_from(value)[0], _unpack_strings(value, _TIMESTAMP.size)
+
+
+def _pack_strings(fields: List[str]) -> bytes:
+    encoded = [field.encode() for field in fields]
+    return b"".join(bytes((len(field),)) + field for field in encoded)
+
+
+def _index_add(
+    table: SharedHashTable,
+    key: str,
+    member: str,
+    expires_us: int,
+    keep: int,
+    alive: Callable[[str, int], bool],
+) -> List[str]:
+    """
+    Appends member to the list stored under key, dropping members no longer
+    alive, and returns those beyond the newest keep, which the caller ends.
+    """
+    evicted: List[str] = []
+
+    def add(current: Optional[Tuple[bytes, int]]) -> Tuple[bytes, int]:
+        members, index_expires = [], 0
+        if current is not None:
+            members, index_expires = _unpack_strings(current[0]), current[1]
+        now = now_us()
+        members = [other for other in members if other != member and alive(other, now)]
+        members.append(member)
+        excess = len(members) - keep
+        if excess > 0:
+            evicted.extend(members[:excess])
+            members = members[excess:]
+        return _pack_strings(members), max(index_expires, expires_us)
+
+    # The whole read-modify-write runs under the key's bucket lock
+    table.upsert(key.encode(), add)
+    return evicted
+
+
+def _index_remove(table: SharedHashTable, key: str, member: str) -> None:
+    def remove(current: Optional[Tuple[bytes, int]]) -> object:
+        if current is None:
+            return ...
+        members = _unpack_strings(current[0])
+        if member not in members:
+            return ...
+        members.remove(member)
+        return (_pack_strings(members), current[1]) if members else None
+
+    table.upsert(key.encode(), remove)
+
+
+def _index_extend(table: SharedHashTable, key: str, expires_us: int) -> None:
+    # An index entry must live as long as the longest lived of its members
+    table.update(
+        key.encode(),
+        lambda current: None if current[1] >= expires_us else (current[0], expires_us),
+    )
+
+
+def default_shm_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "aitext")
+
+
+def shared_tables(
+    path: Optional[str] = None,
+    capacity: Optional[int] = None,
+    revocation_capacity: Optional[int] = None,
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Capacity and value size of every table file, keyed by its path, with the
+    arguments left as None taken from the settings.
+    """
+    settings = get_settings()
+    path = path or settings.session_shm_path or default_shm_path()
+    capacity = capacity or settings.session_store_max_entries
+    revocation_capacity = revocation_capacity or settings.revocation_bloom_capacity
+    session_slots, refresh_slots = _user_index_slots()
+    return {
+        f"{path}-sessions": (capacity, SESSION_VALUE_SIZE),
+        # Most users hold more than one session, so fewer entries than sessions
+        f"{path}-user-sessions": (capacity // 2, session_slots * (1 + SESSION_ID_MAX)),
+        f"{path}-refresh-tokens": (capacity, REFRESH_VALUE_SIZE),
+        f"{path}-user-refresh-tokens": (
+            capacity // 2,
+            refresh_slots * (1 + SESSION_ID_MAX),
+        ),
+        f"{path}-revoked-tokens": (revocation_capacity, REVOCATION_VALUE_SIZE),
+    }
+
+
+def check_user_limits() -> None:
+    """
+    Raises ValueError unless both per-user limits are set: the user indexes
+    hold a fixed number of ids per user, so they can't be unlimited here.
+    """
+    settings = get_settings()
+    if not settings.session_max_per_user or not settings.refresh_token_max_per_user:
+        raise ValueError(
+            "SESSION_BACKEND=shm needs SESSION_MAX_PER_USER and "
+            "REFRESH_TOKEN_MAX_PER_USER above 0"
+        )
+
+
+def _user_index_slots() -> Tuple[int, int]:
+    settings = get_settings()
+    # One refresh family more than the limit: RefreshTokenService ends the
+    # oldest once the new one is saved, which needs the new one listed
+    return (
+        max(1, settings.session_max_per_user),
+        max(1, settings.refresh_token_max_per_user) + 1,
+    )
+
+
+def shared_tables_size(tables: Dict[str, Tuple[int, int]]) -> int:
+    """Bytes the tables allocate up front, all of it in /dev/shm by default."""
+    return sum(table_size(*layout) for layout in tables.values())
+
+
+class SharedSessionStore:
+    """
+    Sessions in a SharedHashTable, with the interface of ShardedSessionStore.
+    user_table indexes them by user_id: each entry lists up to max_per_user
+    session ids, oldest first, and expires with the user's last session. A
+    put beyond max_per_user ends the user's oldest session. Ids of sessions
+    that expired or were evicted from the session table are dropped from the
+    index the next time the user's entry is written.
+    """
+
+    def __init__(
+        self, table: SharedHashTable, user_table: SharedHashTable, max_per_user: int
+    ):
+        self.table = table
+        self.user_table = user_table
+        self.max_per_user = max_per_user
+
+    @staticmethod
+    def _decode(session_id: str, value: bytes, expires_us: int) -> SessionRecord:
+        created_us, (user_id, role) = _unpack(value)
+        return SessionRecord(
+            session_id=session_id,
+            user_id=user_id,
+            role=role,
+            created_at=from_epoch_us(created_us),
+            expiry_time=from_epoch_us(expires_us),
+        )
+
+    def _alive(self, session_id: str, now: int) -> bool:
+        entry = self.table.get(session_id.encode())
+        return entry is not None and entry[1] > now
+
+    def put(self, record: SessionRecord) -> None:
+        if len(record.user_id.encode()) > USER_ID_MAX or len(record.role) > ROLE_MAX:
+            raise ValueError("user_id or role too long for the shared session table")
+        if len(record.session_id) > SESSION_ID_MAX:
+            raise ValueError("session_id too long for the shared session table")
+        expires_us = to_epoch_us(record.expiry_time)
+        self.table.put(
+            record.session_id.encode(),
+            _pack(to_epoch_us(record.created_at), record.user_id, record.role),
+            expires_us,
+        )
+        evicted = _index_add(
+            self.user_table,
+            record.user_id,
+            record.session_id,
+            expires_us,
+            self.max_per_user,
+            self._alive,
+        )
+        for session_id in evicted:
+            self.table.pop(session_id.encode())
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        entry = self.table.get(session_id.encode())
+        if entry is None:
+            return None
+        return self._decode(session_id, *entry)
+
+    def pop(self, session_id: str) -> Optional[SessionRecord]:
+        entry = self.table.pop(session_id.encode())
+        if entry is None:
+            return None
+        record = self._decode(session_id, *entry)
+        _index_remove(self.user_table, record.user_id, session_id)
+        return record
+
+    def touch(self, session_id: str, expiry_time: datetime) -> bool:
+        """Moves the expiry in place, so a concurrent delete can't be undone."""
+        expires_us = to_epoch_us(expiry_time)
+        user_ids: List[str] = []
+
+        def extend(current: Tuple[bytes, int]) -> Tuple[bytes, int]:
+            user_ids.append(_unpack(current[0])[1][0])
+            return current[0], expires_us
+
+        if not self.table.update(session_id.encode(), extend):
+            return False
+        _index_extend(self.user_table, user_ids[0], expires_us)
+        return True
+
+    def user_sessions(
+        self, user_id: str, now: Optional[float] = None
+    ) -> List[SessionRecord]:
+        """The user's unexpired sessions, oldest first; costs O(their count)."""
+        entry = self.user_table.get(user_id.encode())
+        if entry is None:
+            return []
+        now_value = now_us() if now is None else int(now * 1e6)
+        records = []
+        for session_id in _unpack_strings(entry[0]):
+            session = self.table.get(session_id.encode())
+            if session is not None and session[1] > now_value:
+                record = self._decode(session_id, *session)
+                if record.user_id == user_id:
+                    records.append(record)
+        records.sort(key=lambda record: record.created_at)
+        return records
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now_value = None if now is None else int(now * 1e6)
+        self.user_table.purge_expired(now_value)
+        return self.table.purge_expired(now_value)
+
+    def clear(self) -> None:
+        self.table.clear()
+        self.user_table.clear()
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.table.get(session_id.encode()) is not None
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __iter__(self) -> Iterator[str]:
+        for key, _, _ in self.table.items():
+            yield key.decode()
+
+    @property
+    def lru_evictions(self) -> int:
+        return self.table.evictions
+
+    @property
+    def expired_evictions(self) -> int:
+        return self.table.expired_evictions
+
+
+class SharedMemorySessionBackend(SessionBackend):
+    """
+    Sessions, refresh tokens and revoked JWT ids in memory-mapped tables under
+    path (one file each), shared by every worker process on the host. Workers
+    pick up each other's revocations through the regular revocation sync.
+
+    Like sessions, refresh token families are indexed by user_id, one more
+    of them than REFRESH_TOKEN_MAX_PER_USER, so the service's limit applies
+    as with the other backends. Should concurrent logins overflow the index
+    anyway, saving a family ends the user's oldest one and revokes its access
+    tokens. Neither limit may be 0 with this backend.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        capacity: Optional[int] = None,
+        revocation_capacity: Optional[int] = None,
+    ):
+        check_user_limits()
+        settings = get_settings()
+        path = path or settings.session_shm_path or default_shm_path()
+        tables = shared_tables(path, capacity, revocation_capacity)
+        session_slots, self.refresh_slots = _user_index_slots()
+        self.store = SharedSessionStore(
+            SharedHashTable(f"{path}-sessions", *tables[f"{path}-sessions"]),
+            SharedHashTable(f"{path}-user-sessions", *tables[f"{path}-user-sessions"]),
+            session_slots,
+        )
+        self.refresh_tokens = SharedHashTable(
+            f"{path}-refresh-tokens", *tables[f"{path}-refresh-tokens"]
+        )
+        self.user_refresh_tokens = SharedHashTable(
+            f"{path}-user-refresh-tokens", *tables[f"{path}-user-refresh-tokens"]
+        )
+        self.revoked_tokens = SharedHashTable(
+            f"{path}-revoked-tokens", *tables[f"{path}-revoked-tokens"]
+        )
+        self._purger: Optional["asyncio.Task[None]"] = None
+        logger.info(
+            "Opened shared session tables at %s-*, %d session slots, %d MB",
+            path,
+            self.store.table.capacity,
+            shared_tables_size(tables) // 1_000_000,
+        )
+
+    async def start(self) -> None:
+        interval = get_settings().session_purge_seconds
+        if interval > 0 and self._purger is None:
+            # Every worker purges; a pass over already purged buckets is cheap
+            self._purger = asyncio.create_task(
+                purge_periodically(self.store.purge_expired, interval)
+            )
+
+    async def close(self) -> None:
+        await stop_task(self._purger)
+        self._purger = None
+        self.store.table.close()
+        self.store.user_table.close()
+        self.refresh_tokens.close()
+        self.user_refresh_tokens.close()
+        self.revoked_tokens.close()
+
+    async def create(self, session_info: UserSessionInfo) -> str:
+        self.store.put(SessionRecord.from_session_info(session_info))
+        return session_info.session_id
+
+    async def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self.store.get(session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        return self.store.pop(session_id) is not None
+
+    async def touch(self, session_id: str, expiry_time: datetime) -> None:
+        self.store.touch(session_id, expiry_time)
+
+    async def list_user_sessions(self, user_id: str) -> List[SessionRecord]:
+        return self.store.user_sessions(user_id)
+
+    async def revoke_token(self, jti: str, expiry_time: datetime) -> None:
+        self.revoked_tokens.put(
+            jti.encode(), _TIMESTAMP.pack(now_us()), to_epoch_us(expiry_time)
+        )
+
+    async def load_revoked_tokens(
+        self, since: Optional[datetime] = None
+    ) -> Dict[str, datetime]:
+        now = now_us()
+        since_us = to_epoch_us(since) if since is not None else None
+        revoked = {}
+        for jti, value, expires_us in self.revoked_tokens.items():
+            if expires_us <= now:
+                continue
+            if since_us is None or _TIMESTAMP.unpack(value)[0] >= since_us:
+                revoked[jti.decode()] = from_epoch_us(expires_us)
+        return revoked
+
+    @staticmethod
+    def _decode_refresh(
+        family_id: str, value: bytes, expires_us: int
+    ) -> RefreshTokenRecord:
+        created_us, (token_digest, user_id, role) = _unpack(value)
+        return RefreshTokenRecord(
+            family_id=family_id,
+            user_id=user_id,
+            role=role,
+            token_digest=token_digest,
+            created_at=from_epoch_us(created_us),
+            expiry_time=from_epoch_us(expires_us),
+        )
+
+    def _refresh_alive(self, family_id: str, now: int) -> bool:
+        entry = self.refresh_tokens.get(family_id.encode())
+        return entry is not None and entry[1] > now
+
+    async def save_refresh_token(self, record: RefreshTokenRecord) -> None:
+        if len(record.user_id.encode()) > USER_ID_MAX or len(record.role) > ROLE_MAX:
+            raise ValueError("user_id or role too long for the shared session table")
+        if len(record.family_id) > SESSION_ID_MAX:
+            raise ValueError("family_id too long for the shared session table")
+        expires_us = to_epoch_us(record.expiry_time)
+        self.refresh_tokens.put(
+            record.family_id.encode(),
+            _pack(
+                to_epoch_us(record.created_at),
+                record.token_digest,
+                record.user_id,
+                record.role,
+            ),
+            expires_us,
+        )
+        evicted = _index_add(
+            self.user_refresh_tokens,
+            record.user_id,
+            record.family_id,
+            expires_us,
+            self.refresh_slots,
+            self._refresh_alive,
+        )
+        # Only when logins race past RefreshTokenService's limit
+        revoke_until = now_us() + get_settings().jwt_access_token_seconds * 1_000_000
+        for family_id in evicted:
+            if self.refresh_tokens.pop(family_id.encode()) is not None:
+                await self.revoke_token(family_id, from_epoch_us(revoke_until))
+
+    async def list_user_refresh_families(self, user_id: str) -> List[str]:
+        entry = self.user_refresh_tokens.get(user_id.encode())
+        if entry is None:
+            return []
+        now = now_us()
+        return [
+            family_id
+            for family_id in _unpack_strings(entry[0])
+            if self._refresh_alive(family_id, now)
+        ]
+
+    async def get_refresh_token(self, family_id: str) -> Optional[RefreshTokenRecord]:
+        entry = self.refresh_tokens.get(family_id.encode())
+        if entry is None:
+            return None
+        return self._decode_refresh(family_id, *entry)
+
+    async def rotate_refresh_token(
+        self,
+        family_id: str,
+        current_digest: str,
+        new_digest: str,
+        expiry_time: datetime,
+    ) -> bool:
+        expires_us = to_epoch_us(expiry_time)
+        user_ids: List[str] = []
+
+        def swap(current: Tuple[bytes, int]) -> Optional[Tuple[bytes, int]]:
+            created_us, (token_digest, user_id, role) = _unpack(current[0])
+            if not hmac.compare_digest(token_digest, current_digest):
+                return None
+            user_ids.append(user_id)
+            return _pack(created_us, new_digest, user_id, role), expires_us
+
+        # Compare and swap under the bucket lock, atomic across workers
+        if not self.refresh_tokens.update(family_id.encode(), swap):
+            return False
+        _index_extend(self.user_refresh_tokens, user_ids[0], expires_us)
+        return True
+
+    async def delete_refresh_token(self, family_id: str) -> bool:
+        entry = self.refresh_tokens.pop(family_id.encode())
+        if entry is None:
+            return False
+        user_id = self._decode_refresh(family_id, *entry).user_id
+        _index_remove(self.user_refresh_tokens, user_id, family_id)
+        return True
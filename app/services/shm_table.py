@@ -0,0 +1,397 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("shm_table")
+
+# File header: magic, layout version, slot size, slots per bucket, bucket count
+_HEADER = struct.Struct("<8sIIII")
+_MAGIC = b"AITXSHM\x00"
+_VERSION = 1
+_HEADER_SIZE = 4096
+
+# Bucket header: seqlock counter, used slots
+_BUCKET_HEADER = struct.Struct("<IH2x")
+# Slot header: key hash, expiry (epoch microseconds), key length, value length
+_SLOT_HEADER = struct.Struct("<QqB1xH4x")
+_SEQ = struct.Struct("<I")
+_USED = struct.Struct("<H")
+
+KEY_MAX = 64
+BUCKET_SLOTS = 8
+LOCK_STRIPES = 256
+# Reader retries before checking whether the bucket's writer died mid-update
+_REPAIR_AFTER_SPINS = 10_000
+
+# Byte offsets locked with fcntl (the bytes themselves are never touched by the
+# locks): 0 guards initialisation, 1 + stripe guards the buckets of that stripe
+_INIT_LOCK = 0
+
+
+def _key_hash(key: bytes) -> int:
+    # Must be identical in every worker, so not the per-process randomized hash()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _layout(capacity: int, value_size: int) -> Tuple[int, int]:
+    """Bucket count and slot size of a table holding capacity values."""
+    # A quarter of headroom, so a table holding capacity entries rarely
+    # finds a bucket full
+    buckets = 1
+    while buckets * BUCKET_SLOTS < max(capacity, 1) * 5 // 4:
+        buckets <<= 1
+    slot_size = -(-(_SLOT_HEADER.size + KEY_MAX + value_size) // 8) * 8
+    return buckets, slot_size
+
+
+def table_size(capacity: int, value_size: int) -> int:
+    """Bytes a SharedHashTable of that capacity and value size allocates."""
+    buckets, slot_size = _layout(capacity, value_size)
+    return _HEADER_SIZE + buckets * (_BUCKET_HEADER.size + BUCKET_SLOTS * slot_size)
+
+
+class SharedHashTable:
+    """
+    Fixed-size hash table in a memory-mapped file, shared by every process that
+    opens the same path. Keys hash to a bucket of BUCKET_SLOTS fixed-size slots
+    holding the key, an opaque value of at most value_size bytes and an expiry.
+
+    Writers lock the bucket's stripe with an fcntl byte-range lock (plus a
+    thread lock, as fcntl locks don't exclude threads of the same process) and
+    bump the bucket's seqlock counter around the change. Readers take no lock:
+    they copy the bucket and retry when the counter was odd or moved meanwhile.
+
+    A full bucket makes room by dropping its expired entries, then the entry
+    closest to expiry, which is the least recently touched one for sessions.
+    """
+
+    def __init__(self, path: str, capacity: int, value_size: int):
+        buckets, self.slot_size = _layout(capacity, value_size)
+        self.path = path
+        self.value_size = value_size
+        self.bucket_size = _BUCKET_HEADER.size + BUCKET_SLOTS * self.slot_size
+        self.bucket_count = buckets
+        self.capacity = buckets * BUCKET_SLOTS
+        self._mask = buckets - 1
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.evictions = 0
+        self.expired_evictions = 0
+
+        size = table_size(capacity, value_size)
+        header = _HEADER.pack(_MAGIC, _VERSION, self.slot_size, BUCKET_SLOTS, buckets)
+        self._fd = self._open_locked(path)
+        try:
+            file_size = os.fstat(self._fd).st_size
+            if file_size == 0:
+                # A new file, nobody has mapped it yet
+                self._initialize(self._fd, header, size)
+            elif os.pread(self._fd, _HEADER.size, 0) != header or file_size != size:
+                # Laid out by another configuration. Processes still running
+                # with it have the file mapped and would get a SIGBUS if it
+                # shrank under them, so a new file replaces it instead; they
+                # keep the old one until they restart
+                logger.warning(
+                    "Replacing shared table %s laid out by another configuration",
+                    path,
+                )
+                replaced = self._fd
+                self._fd = self._create(path, header, size)
+                os.close(replaced)
+            self._mm = mmap.mmap(self._fd, size, mmap.MAP_SHARED)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _INIT_LOCK)
+
+    @staticmethod
+    def _open_locked(path: str) -> int:
+        """Descriptor of the file now at path, holding its initialisation lock."""
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, _INIT_LOCK)
+            opened = os.fstat(fd)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and (current.st_dev, current.st_ino) == (
+                opened.st_dev,
+                opened.st_ino,
+            ):
+                return fd
+            # Another process replaced the file while this one waited for the lock
+            os.close(fd)
+
+    @staticmethod
+    def _initialize(fd: int, header: bytes, size: int) -> None:
+        os.ftruncate(fd, size)
+        # Reserve every page now: running out of room in a tmpfs later would
+        # be a SIGBUS on some write instead of an error here
+        os.posix_fallocate(fd, 0, size)
+        os.pwrite(fd, header, 0)
+
+    @classmethod
+    def _create(cls, path: str, header: bytes, size: int) -> int:
+        """Lays out an empty table in a new file and renames it over path."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            cls._initialize(fd, header, size)
+            os.replace(temporary, path)
+        except BaseException:
+            os.close(fd)
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return fd
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def _bucket_offset(self, key_hash: int) -> int:
+        return _HEADER_SIZE + (key_hash & self._mask) * self.bucket_size
+
+    def _snapshot(self, offset: int) -> bytes:
+        mm = self._mm
+        spins = 0
+        while True:
+            seq = _SEQ.unpack_from(mm, offset)[0]
+            if not seq & 1:
+                data = mm[offset : offset + self.bucket_size]
+                if _SEQ.unpack_from(mm, offset)[0] == seq:
+                    return data
+            spins += 1
+            if spins % _REPAIR_AFTER_SPINS == 0:
+                self._repair(offset)
+
+    def _repair(self, offset: int) -> None:
+        """
+        A counter left odd after the writer released its lock means the writer
+        died mid-update; its bucket may be torn, so it is emptied.
+        """
+        with self._locked(offset):
+            if _SEQ.unpack_from(self._mm, offset)[0] & 1:
+                self._write(offset, [(i, None) for i in range(BUCKET_SLOTS)], 0, 1)
+
+    @contextmanager
+    def _locked(self, bucket_offset: int) -> Iterator[None]:
+        stripe = (bucket_offset // self.bucket_size) % LOCK_STRIPES
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 1 + stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 1 + stripe)
+
+    def _slots(self, bucket: bytes) -> Iterator[Tuple[int, int, int, bytes, bytes]]:
+        """(index, key hash, expires_us, key, value) of every used slot."""
+        for index in range(BUCKET_SLOTS):
+            start = _BUCKET_HEADER.size + index * self.slot_size
+            key_hash, expires_us, key_len, value_len = _SLOT_HEADER.unpack_from(
+                bucket, start
+            )
+            if not key_len:
+                continue
+            key_start = start + _SLOT_HEADER.size
+            value_start = key_start + KEY_MAX
+            yield (
+                index,
+                key_hash,
+                expires_us,
+                bucket[key_start : key_start + key_len],
+                bucket[value_start : value_start + value_len],
+            )
+
+    def get(self, key: bytes) -> Optional[Tuple[bytes, int]]:
+        """(value, expires_us) stored for key, expired or not."""
+        key_hash = _key_hash(key)
+        bucket = self._snapshot(self._bucket_offset(key_hash))
+        for _, slot_hash, expires_us, slot_key, value in self._slots(bucket):
+            if slot_hash == key_hash and slot_key == key:
+                return value, expires_us
+        return None
+
+    def _update(
+        self, key: bytes, change: Callable[[Optional[Tuple[bytes, int]]], object]
+    ) -> object:
+        """
+        Runs change(current) with the bucket locked. change returns a
+        (value, expires_us) pair to store, None to delete, or ... to leave the
+        slot as it is; the call returns whatever change returned.
+        """
+        key_hash = _key_hash(key)
+        offset = self._bucket_offset(key_hash)
+        with self._locked(offset):
+            return self._update_locked(key, key_hash, offset, change)
+
+    def _update_locked(
+        self,
+        key: bytes,
+        key_hash: int,
+        offset: int,
+        change: Callable[[Optional[Tuple[bytes, int]]], object],
+    ) -> object:
+        bucket = self._mm[offset : offset + self.bucket_size]
+        slots = list(self._slots(bucket))
+        current = next(
+            (slot for slot in slots if slot[1] == key_hash and slot[3] == key), None
+        )
+        result = change((current[4], current[2]) if current else None)
+        if result is ...:
+            return result
+
+        if result is None:
+            if current is not None:
+                self._write(offset, [(current[0], None)], len(slots) - 1)
+            return result
+
+        if not isinstance(result, tuple):
+            raise TypeError("change must return (value, expires_us), None or ...")
+        value, expires_us = result
+        if len(value) > self.value_size:
+            raise ValueError(f"Value of {len(value)} bytes exceeds {self.value_size}")
+        entry = _SLOT_HEADER.pack(key_hash, expires_us, len(key), len(value))
+        entry += key.ljust(KEY_MAX, b"\0") + value
+        if current is not None:
+            self._write(offset, [(current[0], entry)], len(slots))
+            return result
+
+        writes: List[Tuple[int, Optional[bytes]]] = []
+        used = len(slots)
+        if used == BUCKET_SLOTS:
+            now = now_us()
+            expired = [slot[0] for slot in slots if slot[2] <= now]
+            if expired:
+                writes = [(index, None) for index in expired[1:]]
+                index = expired[0]
+                used -= len(expired) - 1
+                self.expired_evictions += len(expired)
+            else:
+                index = min(slots, key=lambda slot: slot[2])[0]
+                self.evictions += 1
+        else:
+            taken = {slot[0] for slot in slots}
+            index = next(i for i in range(BUCKET_SLOTS) if i not in taken)
+            used += 1
+        writes.append((index, entry))
+        self._write(offset, writes, used)
+        return result
+
+    def _write(
+        self,
+        offset: int,
+        writes: List[Tuple[int, Optional[bytes]]],
+        used: int,
+        seq_bump: int = 0,
+    ) -> None:
+        mm = self._mm
+        seq = _SEQ.unpack_from(mm, offset)[0] + seq_bump
+        # Odd while the bucket is being changed, readers spin until it is even again
+        _SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        for index, entry in writes:
+            start = offset + _BUCKET_HEADER.size + index * self.slot_size
+            if entry is None:
+                mm[start : start + self.slot_size] = bytes(self.slot_size)
+            else:
+                mm[start : start + len(entry)] = entry
+        _USED.pack_into(mm, offset + _SEQ.size, used)
+        _SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def put(self, key: bytes, value: bytes, expires_us: int) -> None:
+        if not key or len(key) > KEY_MAX:
+            raise ValueError(f"Key must be 1 to {KEY_MAX} bytes")
+        self._update(key, lambda current: (value, expires_us))
+
+    def pop(self, key: bytes) -> Optional[Tuple[bytes, int]]:
+        if not key or len(key) > KEY_MAX:
+            return None
+        popped: List[Optional[Tuple[bytes, int]]] = []
+
+        def change(current: Optional[Tuple[bytes, int]]) -> object:
+            popped.append(current)
+            return None if current is not None else ...
+
+        self._update(key, change)
+        return popped[0]
+
+    def update(
+        self,
+        key: bytes,
+        change: Callable[[Tuple[bytes, int]], Optional[Tuple[bytes, int]]],
+    ) -> bool:
+        """
+        Replaces an existing entry with change(value, expires_us) atomically;
+        change returning None keeps the entry. Returns whether it was replaced.
+        """
+        if not key or len(key) > KEY_MAX:
+            return False
+
+        def locked_change(current: Optional[Tuple[bytes, int]]) -> object:
+            if current is None:
+                return ...
+            replacement = change(current)
+            return ... if replacement is None else replacement
+
+        return self._update(key, locked_change) is not ...
+
+    def upsert(
+        self,
+        key: bytes,
+        change: Callable[[Optional[Tuple[bytes, int]]], object],
+    ) -> object:
+        """
+        Runs change with the current (value, expires_us), or None when the key
+        is missing, under the bucket lock. change returns a pair to store, None
+        to delete or ... to leave the entry; its result is returned.
+        """
+        if not key or len(key) > KEY_MAX:
+            raise ValueError(f"Key must be 1 to {KEY_MAX} bytes")
+        return self._update(key, change)
+
+    def items(self) -> Iterator[Tuple[bytes, bytes, int]]:
+        """(key, value, expires_us) of every entry, bucket by bucket."""
+        for bucket_index in range(self.bucket_count):
+            offset = _HEADER_SIZE + bucket_index * self.bucket_size
+            if not _USED.unpack_from(self._mm, offset + _SEQ.size)[0]:
+                continue
+            bucket = self._snapshot(offset)
+            for _, _, expires_us, key, value in self._slots(bucket):
+                yield key, value, expires_us
+
+    def purge_expired(self, now: Optional[int] = None) -> int:
+        now = now_us() if now is None else now
+        purged = 0
+        for key, _, expires_us in list(self.items()):
+            if expires_us > now:
+                continue
+            # Re-checked under the lock, another worker may have extended it
+            removed = self._update(
+                key, lambda current: None if current and current[1] <= now else ...
+            )
+            if removed is None:
+                purged += 1
+        self.expired_evictions += purged
+        return purged
+
+    def clear(self) -> None:
+        for bucket_index in range(self.bucket_count):
+            offset = _HEADER_SIZE + bucket_index * self.bucket_size
+            with self._locked(offset):
+                self._write(offset, [(i, None) for i in range(BUCKET_SLOTS)], 0)
+
+    def __len__(self) -> int:
+        mm = self._mm
+        return sum(
+            _USED.unpack_from(mm, _HEADER_SIZE + i * self.bucket_size + _SEQ.size)[0]
+            for i in range(self.bucket_count)
+        )
@@ -0,0 +1,306 @@
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from app.config.settings import get_settings
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger("tracing")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# span id, parent span id, name, start and end (epoch ns), attributes
+SpanData = Tuple[str, str, str, int, int, Dict[str, Any]]
+
+
+class RequestContext:
+    """Per-request values shared by log records and spans, set once by the middleware."""
+
+    __slots__ = (
+        "correlation_id",
+        "caller",
+        "auth_scheme",
+        "trace_id",
+        "root_span_id",
+        "sampled",
+        "spans",
+    )
+
+    def __init__(
+        self, correlation_id: str, caller: str, auth_scheme: str, sampled: bool
+    ):
+        self.correlation_id = correlation_id
+        self.caller = caller
+        self.auth_scheme = auth_scheme
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.root_span_id = _new_span_id()
+        self.sampled = sampled
+        self.spans: List[SpanData] = []
+
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    "request_context", default=None
+)
+# Id of the innermost open span of the running task, the parent of new spans
+_current_span: ContextVar[str] = ContextVar("current_span", default="")
+
+
+def _new_span_id() -> str:
+    return "%016x" % random.getrandbits(64)
+
+
+def current_context() -> Optional[RequestContext]:
+    return _request_context.get()
+
+
+class _Span:
+    __slots__ = (
+        "context",
+        "name",
+        "attributes",
+        "span_id",
+        "parent_id",
+        "start",
+        "token",
+    )
+
+    def __init__(self, context: RequestContext, name: str, attributes: Dict[str, Any]):
+        self.context = context
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> "_Span":
+        self.span_id = _new_span_id()
+        self.parent_id = _current_span.get() or self.context.root_span_id
+        self.token = _current_span.set(self.span_id)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        end = time.time_ns()
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.context.spans.append(
+            (self.span_id, self.parent_id, self.name, self.start, end, self.attributes)
+        )
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Times the enclosed block as a child span; free when the request isn't sampled."""
+    context = _request_context.get()
+    if context is None or not context.sampled:
+        return _NOOP_SPAN
+    return _Span(context, name, attributes)
+
+
+def record_span(name: str, start: int, end: int, **attributes: Any) -> None:
+    """Adds an already timed span (epoch ns) to the sampled request, if any."""
+    context = _request_context.get()
+    if context is not None and context.sampled:
+        span_id = _new_span_id()
+        parent_id = _current_span.get() or context.root_span_id
+        context.spans.append((span_id, parent_id, name, start, end, attributes))
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator running the whole function, sync or async, inside span(name)."""
+
+    def decorator(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    attributes = []
+    for key, value in values.items():
+        typed: Dict[str, Any]
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+def encode_trace(
+    context: RequestContext, name: str, start: int, end: int, status: int
+) -> str:
+    """One request as an OTLP/JSON ExportTraceServiceRequest, on a single line."""
+    root = {
+        "traceId": context.trace_id,
+        "spanId": context.root_span_id,
+        "name": name,
+        "kind": 2,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": _attributes(
+            {
+                "http.response.status_code": status,
+                "correlation_id": context.correlation_id,
+                "caller": context.caller,
+                "auth_scheme": context.auth_scheme,
+            }
+        ),
+        "status": {"code": 2 if status >= 500 else 0},
+    }
+    spans = [root]
+    for span_data in context.spans:
+        span_id, parent_id, span_name, span_start, span_end, attributes = span_data
+        spans.append(
+            {
+                "traceId": context.trace_id,
+                "spanId": span_id,
+                "parentSpanId": parent_id,
+                "name": span_name,
+                "kind": 1,
+                "startTimeUnixNano": str(span_start),
+                "endTimeUnixNano": str(span_end),
+                "attributes": _attributes(attributes),
+                "status": {"code": 2 if "error" in attributes else 0},
+            }
+        )
+    return json.dumps(
+        {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _attributes({"service.name": "aitext-backend"})
+                    },
+                    "scopeSpans": [{"scope": {"name": "app"}, "spans": spans}],
+                }
+            ]
+        },
+        separators=(",", ":"),
+    )
+
+
+class SpanExporter:
+    """
+    Appends finished traces as OTLP/JSON lines (the format the OpenTelemetry
+    collector's otlpjsonfile receiver reads) from a background thread; a full
+    queue drops traces rather than slowing requests down.
+    """
+
+    def __init__(self, path: str, sample_rate: float, queue_size: int = 1000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._queue: (
+            "queue.Queue[Optional[Tuple[RequestContext, str, int, int, int]]]"
+        ) = queue.Queue(queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def should_sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def export(
+        self, context: RequestContext, name: str, start: int, end: int, status: int
+    ) -> None:
+        try:
+            self._queue.put_nowait((context, name, start, end, status))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as output:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    output.write(encode_trace(*item) + "\n")
+                    if self._queue.empty():
+                        output.flush()
+                except Exception as e:
+                    logger.error("Failed to export trace: %s", e)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+_exporter: Optional[SpanExporter] = None
+
+REGISTRY.callback(
+    "traces_dropped_total",
+    "Sampled request traces dropped because the export queue was full",
+    lambda: getattr(_exporter, "dropped", 0),
+    kind="counter",
+)
+
+
+def setup_tracing() -> None:
+    global _exporter
+    settings = get_settings()
+    if _exporter is None and settings.trace_export_path:
+        _exporter = SpanExporter(
+            settings.trace_export_path,
+            settings.trace_sample_rate,
+            settings.trace_queue_size,
+        )
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    if _exporter is not None:
+        _exporter.shutdown()
+        _exporter = None
+
+
+def start_request(correlation_id: str, caller: str, auth_scheme: str) -> Any:
+    """Sets the request context for the current task, returns the token to reset it."""
+    exporter = _exporter
+    sampled = exporter is not None and exporter.should_sample()
+    return _request_context.set(
+        RequestContext(correlation_id, caller, auth_scheme, sampled)
+    )
+
+
+def finish_request(token: Any, name: str, start: int, status: int) -> None:
+    context = _request_context.get()
+    _request_context.reset(token)
+    exporter = _exporter
+    if context is not None and context.sampled and exporter is not None:
+        exporter.export(context, name, start, time.time_ns(), status)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config.settings import get_settings
+from app.models.user import UserRecord
+
+logger = logging.getLogger("user_repository")
+
+# dummy in memory db, the hash is precomputed so startup never runs bcrypt
+DEV_USERS = {
+    "test_user": UserRecord(
+        username="test_user",
+        # bcrypt of "password123"
+        password_hash="$2b$12$6m.BVnI3PON0dSROktUmNOxnWaAHKi.Xk9D/vwu6uxWac/ry4Q6v.",
+        user_id="123",
+        email="test@example.com",
+        public_username="test_user",
+        role="Admin",
+    )
+}
+
+
+class UserRepository(ABC):
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[UserRecord]:
+        """Returns the user or None when no such username exists."""
+
+
+class InMemoryUserRepository(UserRepository):
+    def __init__(self, users: Dict[str, UserRecord]):
+        self.users = users
+
+    async def get_by_username(self, username: str) -> Optional[UserRecord]:
+        return self.users.get(username)
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through cache in front of another repository. Found users are kept
+    for ttl seconds and unknown usernames for negative_ttl seconds, in a
+    bounded LRU. Concurrent misses for the same username share one lookup.
+    """
+
+    def __init__(
+        self,
+        inner: UserRepository,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        max_entries: int = 10_000,
+    ):
+        self.inner = inner
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Optional[UserRecord]]]" = (
+            OrderedDict()
+        )
+        self._in_flight: Dict[str, "asyncio.Future[Optional[UserRecord]]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self) -> None:
+        await self.inner.start()
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+    def invalidate(self, username: str) -> None:
+        self._entries.pop(username, None)
+
+    async def get_by_username(self, username: str) -> Optional[UserRecord]:
+        entry = self._entries.get(username)
+        if entry is not None:
+            expires_at, user = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return user
+            del self._entries[username]
+
+        self.misses += 1
+        pending = self._in_flight.get(username)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future: "asyncio.Future[Optional[UserRecord]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._in_flight[username] = future
+        try:
+            user = await self.inner.get_by_username(username)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(username, None)
+
+        future.set_result(user)
+        ttl = self.ttl if user is not None else self.negative_ttl
+        if ttl > 0 and self.max_entries > 0:
+            self._entries[username] = (time.monotonic() + ttl, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+
+def create_user_repository(name: Optional[str] = None) -> UserRepository:
+    # "memory" serves the built-in development users, "mongo" reads the users collection
+    settings = get_settings()
+    name = name or settings.user_repository
+    if name == "mongo":
+        # Imported lazily so the in-memory setup doesn't need motor at all
+        from app.services.mongo_user_repository import MongoUserRepository
+
+        return CachedUserRepository(
+            MongoUserRepository(),
+            ttl=settings.user_cache_ttl_seconds,
+            negative_ttl=settings.user_cache_negative_ttl_seconds,
+            max_entries=settings.user_cache_max_entries,
+        )
+    if name != "memory":
+        raise ValueError(f"Unknown USER_REPOSITORY '{name}'")
+    return InMemoryUserRepository(DEV_USERS)
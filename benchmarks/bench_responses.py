@@ -0,0 +1,114 @@
+"""
+Per-response cost of the error and success serialization paths.
+
+Compares the previous handlers (error mapping rebuilt per call, untyped dicts
+rendered by JSONResponse) with the cached error registry and the typed models
+rendered by the default ORJSONResponse.
+
+    python -m benchmarks.bench_responses [--number 100000]
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.error.py_error import BaseResponse, ShipotleError
+from app.models.auth import AuthResponse, MessageResponse
+
+
+def legacy_error_mapping(api_response_code: int) -> Dict[str, Any]:
+    error_mappings = {
+        ShipotleError.INTERNAL_ERROR: {
+            "status_code": 500,
+            "message": "Internal Server Error",
+        },
+        ShipotleError.FORBIDDEN: {"status_code": 403, "message": "Forbidden Error"},
+        ShipotleError.AUTHORIZATION: {
+            "status_code": 401,
+            "message": "Authorization Error",
+        },
+        ShipotleError.BADREQUEST: {"status_code": 400, "message": "Bad Request"},
+        ShipotleError.RESOURCE_NOT_FOUND: {
+            "status_code": 404,
+            "message": "Resource Not Found",
+        },
+    }
+    return error_mappings.get(
+        api_response_code, {"status_code": 500, "message": "Unknown Error"}
+    )
+
+
+def legacy_error_response(exc: ShipotleError) -> JSONResponse:
+    error_mapping = legacy_error_mapping(exc.error_response.api_response_code)
+    body = {
+        "status_code": error_mapping["status_code"],
+        "message": exc.error_response.message,
+    }
+    return JSONResponse(status_code=body["status_code"], content=body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    error = ShipotleError(
+        BaseResponse(
+            api_response_code=ShipotleError.AUTHORIZATION,
+            message="Authentication failed",
+        )
+    )
+    login_body = {
+        "auth_scheme": "cookie",
+        "success": True,
+        "expires_in": datetime.now(timezone.utc),
+    }
+    dict_adapter = TypeAdapter(Dict[str, Any])
+    auth_adapter = TypeAdapter(AuthResponse)
+    message_adapter = TypeAdapter(MessageResponse)
+
+    def legacy_success() -> None:
+        for body in (login_body, {"message": "Accessed the protected route"}):
+            content = dict_adapter.dump_python(
+                dict_adapter.validate_python(body), mode="json"
+            )
+            JSONResponse(content=content)
+
+    def typed_success() -> None:
+        content = auth_adapter.dump_python(
+            auth_adapter.validate_python(AuthResponse(**login_body)),
+            mode="json",
+            exclude_none=True,
+        )
+        ORJSONResponse(content=content)
+        message = MessageResponse(message="Accessed the protected route")
+        ORJSONResponse(
+            content=message_adapter.dump_python(
+                message_adapter.validate_python(message), mode="json"
+            )
+        )
+
+    rendered = auth_adapter.dump_python(
+        AuthResponse(**login_body), mode="json", exclude_none=True
+    )
+
+    cases = [
+        ("error: legacy JSONResponse", lambda: legacy_error_response(error), 1),
+        ("error: cached registry", error.to_response, 1),
+        ("render: JSONResponse", lambda: JSONResponse(content=rendered), 1),
+        ("render: ORJSONResponse", lambda: ORJSONResponse(content=rendered), 1),
+        ("success: untyped dict + JSONResponse", legacy_success, 2),
+        ("success: typed model + ORJSONResponse", typed_success, 2),
+    ]
+    for name, func, responses in cases:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        per_response = seconds / (args.number * responses) * 1e6
+        print(f"{name:<40} {per_response:8.2f} us/response")
+
+
+if __name__ == "__main__":
+    main()
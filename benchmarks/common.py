@@ -0,0 +1,75 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def summarize(
+    latencies: List[float], elapsed: float, errors: int = 0
+) -> Dict[str, Any]:
+    """Latencies in seconds in, milliseconds and requests/second out."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path: str, kind: str, params: Dict[str, Any], results: Any) -> None:
+    """Writes one JSON document per run so runs from different commits can be diffed."""
+    document = {
+        "kind": kind,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Saved results to {path}")
+
+
+def print_table(rows: Dict[str, Dict[str, Any]]) -> None:
+    print(
+        f"{'scenario':<24} {'reqs':>7} {'errs':>5} {'rps':>10} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for name, row in rows.items():
+        print(
+            f"{name:<24} {row['requests']:>7} {row['errors']:>5} "
+            f"{row['throughput_rps']:>10} {row['p50_ms']:>9} "
+            f"{row['p95_ms']:>9} {row['p99_ms']:>9}"
+        )
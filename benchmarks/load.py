@@ -0,0 +1,213 @@
+"""
+Load benchmark for /auth/login, /auth/protected and /auth/logout.
+
+Drives every endpoint for both x-authscheme values at a fixed concurrency,
+either in-process through httpx's ASGI transport (no network, isolates app
+overhead) or against a real uvicorn worker over TCP.
+
+    python -m benchmarks.load --mode asgi --concurrency 32 --requests 5000
+    python -m benchmarks.load --mode uvicorn --output results/load.json
+    python -m benchmarks.load --url http://127.0.0.1:8000   # already running server
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import print_table, save_results, summarize
+
+SCHEMES = ("cookie", "jwt")
+SCENARIOS = ("login", "protected", "logout")
+CREDENTIALS = {"username": "test_user", "password": "password123"}
+
+ClientFactory = Callable[[], httpx.AsyncClient]
+
+
+def base_headers(scheme: str) -> Dict[str, str]:
+    return {
+        "x-authscheme": scheme,
+        "x-caller": "benchmark",
+        "x-correlationid": "benchmark",
+    }
+
+
+async def login(client: httpx.AsyncClient, scheme: str) -> Dict[str, str]:
+    """Logs in and returns the headers authenticating follow-up calls."""
+    response = await client.post(
+        "/auth/login", headers=base_headers(scheme), json=CREDENTIALS
+    )
+    response.raise_for_status()
+    headers = base_headers(scheme)
+    if scheme == "jwt":
+        headers["Authorization"] = f"Bearer {response.json()['token']}"
+    return headers
+
+
+async def run_scenario(
+    make_client: ClientFactory,
+    scenario: str,
+    scheme: str,
+    concurrency: int,
+    total_requests: int,
+) -> Dict[str, Any]:
+    per_worker = max(1, math.ceil(total_requests / concurrency))
+    latencies: List[float] = []
+    errors = 0
+    ready = 0
+    all_ready = asyncio.Event()
+
+    async def worker() -> None:
+        nonlocal errors, ready
+        async with make_client() as client:
+            headers = base_headers(scheme)
+            if scenario == "protected":
+                headers = await login(client, scheme)
+            # Start the clock only once every worker finished its set-up
+            ready += 1
+            if ready == concurrency:
+                all_ready.set()
+            await all_ready.wait()
+            for _ in range(per_worker):
+                if scenario == "logout":
+                    # Every logout needs a fresh login, which is not timed
+                    headers = await login(client, scheme)
+                started = time.perf_counter()
+                if scenario == "login":
+                    response = await client.post(
+                        "/auth/login", headers=headers, json=CREDENTIALS
+                    )
+                elif scenario == "protected":
+                    response = await client.get("/auth/protected", headers=headers)
+                else:
+                    response = await client.post("/auth/logout", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+    workers = asyncio.gather(*(worker() for _ in range(concurrency)))
+    await all_ready.wait()
+    started = time.perf_counter()
+    await workers
+    elapsed = time.perf_counter() - started
+    if scenario == "logout":
+        # Wall time includes the untimed logins, use the time spent in logouts instead
+        elapsed = sum(latencies) / concurrency
+    return summarize(latencies, elapsed, errors)
+
+
+async def run_all(
+    make_client: ClientFactory, args: argparse.Namespace
+) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for scheme in args.schemes:
+        for scenario in args.scenarios:
+            requests = args.login_requests if scenario == "login" else args.requests
+            # Warm caches, pools and connections before measuring
+            await run_scenario(
+                make_client, scenario, scheme, args.concurrency, args.concurrency
+            )
+            results[f"{scenario}[{scheme}]"] = await run_scenario(
+                make_client, scenario, scheme, args.concurrency, requests
+            )
+    return results
+
+
+@asynccontextmanager
+async def asgi_target() -> AsyncIterator[ClientFactory]:
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        yield lambda: httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@asynccontextmanager
+async def uvicorn_target(url: Optional[str]) -> AsyncIterator[ClientFactory]:
+    process = None
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--port",
+                str(port),
+                "--log-level",
+                "warning",
+                "--no-access-log",
+            ],
+            env={**os.environ, "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")},
+        )
+    try:
+        async with httpx.AsyncClient(base_url=url) as probe:
+            for _ in range(100):
+                try:
+                    await probe.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f"Server at {url} did not come up")
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        yield lambda: httpx.AsyncClient(base_url=url, limits=limits)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    target = asgi_target() if args.mode == "asgi" else uvicorn_target(args.url)
+    async with target as make_client:
+        results = await run_all(make_client, args)
+    print_table(results)
+    if args.output:
+        params = {
+            key: value for key, value in vars(args).items() if key not in ("output",)
+        }
+        save_results(args.output, "load", params, results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--url", help="benchmark an already running server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument(
+        "--login-requests",
+        type=int,
+        default=200,
+        help="logins are bcrypt bound, so they get their own, smaller budget",
+    )
+    parser.add_argument("--schemes", nargs="+", choices=SCHEMES, default=SCHEMES)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    if args.url:
+        args.mode = "uvicorn"
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Micro-benchmarks for the per-request auth primitives.
+
+    python -m benchmarks.micro [--number 20000] [--output results/micro.json]
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict
+
+from starlette.requests import Request
+
+from app.middleware.session_middleware import check_required_headers
+from app.models.session import UserSessionInfo
+from app.services.jwt_handler import JWTHandler, get_token_cache
+from app.services.metrics import REQUEST_SECONDS, SHIPOTLE_ERRORS
+from app.services.session_service import SessionService
+from benchmarks.common import save_results
+
+REPEAT = 5
+
+
+def per_call_us(seconds: float, number: int) -> float:
+    return round(seconds / number * 1e6, 3)
+
+
+def bench_sync(func: Callable[[], Any], number: int) -> float:
+    return per_call_us(min(timeit.repeat(func, number=number, repeat=REPEAT)), number)
+
+
+def bench_async(func: Callable[[], Any], number: int) -> float:
+    async def run() -> float:
+        best = float("inf")
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            for _ in range(number):
+                await func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    return per_call_us(asyncio.run(run()), number)
+
+
+def make_request(headers: Dict[str, str]) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/auth/protected",
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        }
+    )
+
+
+def session_info() -> UserSessionInfo:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return UserSessionInfo(
+        session_id=str(uuid.uuid4()),
+        user_id="123",
+        role="Admin",
+        created_at=now,
+        expiry_time=now + timedelta(hours=1),
+    )
+
+
+def run(number: int) -> Dict[str, float]:
+    results = {}
+
+    info = session_info()
+    payload = info.model_dump()
+    payload["created_at"] = info.created_at.isoformat(sep=" ", timespec="seconds")
+    payload["expiry_time"] = info.expiry_time.isoformat(sep=" ", timespec="seconds")
+    token = JWTHandler.generate_jwt(payload)
+
+    def verify_uncached() -> None:
+        get_token_cache().clear()
+        JWTHandler.verify_jwt(token)
+
+    results["verify_jwt[cache_miss]"] = bench_sync(verify_uncached, number)
+    results["verify_jwt[cache_hit]"] = bench_sync(
+        lambda: JWTHandler.verify_jwt(token), number
+    )
+
+    async def create() -> str:
+        return await SessionService.create_session(session_info())
+
+    session_id = asyncio.run(create())
+    results["get_session"] = bench_async(
+        lambda: SessionService.get_session(session_id), number
+    )
+
+    complete = make_request(
+        {"x-authscheme": "jwt", "x-caller": "bench", "x-correlationid": "bench"}
+    )
+    results["check_required_headers"] = bench_sync(
+        lambda: check_required_headers(
+            complete, ["x-authscheme", "x-caller", "x-correlationid"]
+        ),
+        number,
+    )
+
+    # Instrumentation cost paid by every request while metrics are enabled
+    results["metrics_histogram_observe"] = bench_sync(
+        lambda: REQUEST_SECONDS.observe(0.0012, "/auth/protected", "200", "jwt"),
+        number,
+    )
+    results["metrics_counter_inc"] = bench_sync(
+        lambda: SHIPOTLE_ERRORS.inc("4001"), number
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20_000)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args.number)
+    for name, value in results.items():
+        print(f"{name:<32} {value:>10} us/call")
+    if args.output:
+        save_results(args.output, "micro", {"number": args.number}, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Cold start profile: per-module import time of app.main plus lifespan startup.
+
+Every run is a fresh interpreter started with `-X importtime`, so the numbers
+are what a new uvicorn worker pays before it can serve its first request.
+
+    python -m benchmarks.startup [--runs 5] [--top 25] [--output results/startup.json]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import save_results
+
+# Runs inside the child interpreter; prints its timings as one JSON line
+CHILD_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def run_lifespan():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    return ready
+
+ready = asyncio.run(run_lifespan())
+print(json.dumps({"import_s": imported - started, "startup_s": ready - imported}))
+"""
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def parse_import_times(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Module -> (self us, cumulative us) from `-X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def run_once() -> Tuple[Dict[str, float], Dict[str, Tuple[int, int]]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return timings, parse_import_times(completed.stderr)
+
+
+def run(runs: int, top: int) -> Dict[str, Any]:
+    phases: Dict[str, List[float]] = {"import_s": [], "startup_s": []}
+    modules: Dict[str, List[Tuple[int, int]]] = {}
+    for _ in range(runs):
+        timings, import_times = run_once()
+        for phase, value in timings.items():
+            phases[phase].append(value)
+        for module, value in import_times.items():
+            modules.setdefault(module, []).append(value)
+
+    per_module = {
+        module: {
+            "self_ms": round(statistics.median(v[0] for v in values) / 1000, 3),
+            "cumulative_ms": round(statistics.median(v[1] for v in values) / 1000, 3),
+        }
+        for module, values in modules.items()
+    }
+    slowest = sorted(
+        per_module.items(), key=lambda item: item[1]["self_ms"], reverse=True
+    )[:top]
+    return {
+        "import_ms": round(statistics.median(phases["import_s"]) * 1000, 3),
+        "startup_ms": round(statistics.median(phases["startup_s"]) * 1000, 3),
+        "app_modules": {
+            module: times
+            for module, times in sorted(per_module.items())
+            if module == "app" or module.startswith("app.")
+        },
+        "slowest_modules": dict(slowest),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25, help="slowest modules to list")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.top)
+    print(f"import app.main   {results['import_ms']:>10} ms (median of {args.runs})")
+    print(f"lifespan startup  {results['startup_ms']:>10} ms")
+    print(f"\n{'module':<48} {'self ms':>10} {'cumul. ms':>10}")
+    for module, times in results["slowest_modules"].items():
+        print(f"{module:<48} {times['self_ms']:>10} {times['cumulative_ms']:>10}")
+    if args.output:
+        save_results(
+            args.output, "startup", {"runs": args.runs, "top": args.top}, results
+        )
+
+
+if __name__ == "__main__":
+    main()
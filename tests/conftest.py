@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Optional
+import uuid
+
+import pytest
+
+# Set before anything reads the settings: bcrypt stays in-process and the
+# tests never depend on a local .env
+os.environ.setdefault("BCRYPT_POOL_WORKERS", "0")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from app.models.session import UserSessionInfo
+from app.services.session_backend import InMemorySessionBackend, SessionBackend
+from app.services.session_journal import SessionJournal
+from app.services.session_store import ShardedSessionStore
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def utc_now() -> datetime:
+    # Whole milliseconds, the precision MongoDB stores
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def make_session(
+    user_id: str = "user-1",
+    age: float = 0.0,
+    lifetime: float = 3600.0,
+    session_id: Optional[str] = None,
+    role: str = "User",
+) -> UserSessionInfo:
+    created_at = utc_now() - timedelta(seconds=age)
+    return UserSessionInfo(
+        session_id=session_id or str(uuid.uuid4()),
+        user_id=user_id,
+        role=role,
+        created_at=created_at,
+        expiry_time=created_at + timedelta(seconds=lifetime),
+    )
+
+
+def _accept_sort(method: Any) -> Any:
+    def add(*args: Any, sort: Any = None, **kwargs: Any) -> Any:
+        return method(*args, **kwargs)
+
+    return add
+
+
+def _mongo_backend() -> SessionBackend:
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import BulkOperationBuilder
+    from app.services.mongo_session_backend import MongoSessionBackend
+
+    # pymongo 4.11 passes sort= to bulk operations, which mongomock 4.3 predates
+    for name in ("add_replace", "add_update"):
+        method = getattr(BulkOperationBuilder, name)
+        if not getattr(method, "accepts_sort", False):
+            patched = _accept_sort(method)
+            patched.accepts_sort = True
+            setattr(BulkOperationBuilder, name, patched)
+
+    database = mongomock_motor.AsyncMongoMockClient()["aitext_test"]
+    return MongoSessionBackend(
+        collection=database["sessions"],
+        revocation_collection=database["revoked_tokens"],
+        refresh_token_collection=database["refresh_tokens"],
+        flush_interval=0.001,
+    )
+
+
+@pytest.fixture(params=["memory", "journal", "shm", "mongo"])
+async def backend(request: Any, tmp_path: Any) -> AsyncIterator[SessionBackend]:
+    """Every SessionBackend implementation, started and closed around the test."""
+    instance: SessionBackend
+    if request.param == "memory":
+        instance = InMemorySessionBackend(ShardedSessionStore(num_shards=4))
+    elif request.param == "journal":
+        instance = InMemorySessionBackend(
+            ShardedSessionStore(num_shards=4),
+            SessionJournal(str(tmp_path / "journal"), fsync_interval=0.01),
+        )
+    elif request.param == "shm":
+        from app.services.shm_session_backend import SharedMemorySessionBackend
+
+        instance = SharedMemorySessionBackend(
+            path=str(tmp_path / "aitext"), capacity=1000, revocation_capacity=1000
+        )
+    else:
+        instance = _mongo_backend()
+    await instance.start()
+    yield instance
+    await instance.close()
+
+
+@pytest.fixture
+async def session_backend() -> AsyncIterator[InMemorySessionBackend]:
+    """An in-memory backend configured as the SessionService one."""
+    from app.services.session_service import SessionService
+
+    backend = InMemorySessionBackend(ShardedSessionStore(num_shards=4), None)
+    SessionService.configure(backend)
+    SessionService._migrated.clear()
+    await backend.start()
+    yield backend
+    await SessionService.close()
@@ -0,0 +1,163 @@
+import asyncio
+from typing import Any, Awaitable
+
+import pytest
+
+from app.services import admission
+from app.services.admission import AdaptiveLimiter, AdmissionController
+
+pytestmark = pytest.mark.anyio
+
+
+def make_limiter(
+    limit: int = 2, max_queue: int = 2, queue_timeout: float = 0.05
+) -> AdaptiveLimiter:
+    return AdaptiveLimiter("/route", "normal", limit, 1, 100, max_queue, queue_timeout)
+
+
+async def test_requests_are_admitted_up_to_the_limit() -> None:
+    limiter = make_limiter(limit=2, max_queue=0)
+
+    assert await limiter.acquire()
+    assert await limiter.acquire()
+    assert not await limiter.acquire()
+
+    assert limiter.in_flight == 2
+    assert limiter.rejected == 1
+
+
+async def test_a_released_slot_is_handed_to_the_oldest_waiter() -> None:
+    limiter = make_limiter(limit=1, queue_timeout=1.0)
+    assert await limiter.acquire()
+
+    first = asyncio.ensure_future(limiter.acquire())
+    second = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 2
+
+    limiter.release(0.01)
+    assert await first
+    assert not second.done()
+    assert limiter.in_flight == 1
+
+    limiter.release(0.01)
+    assert await second
+    limiter.release(0.01)
+    assert limiter.in_flight == 0
+    assert limiter.queued == 0
+
+
+async def test_waiters_over_the_queue_size_are_shed() -> None:
+    limiter = make_limiter(limit=1, max_queue=1, queue_timeout=1.0)
+    assert await limiter.acquire()
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+
+    assert not await limiter.acquire()
+    assert not await limiter.acquire(may_queue=False)
+
+    limiter.release(0.01)
+    assert await waiting
+    assert limiter.rejected == 2
+
+
+async def test_a_waiter_is_shed_after_the_queue_timeout() -> None:
+    limiter = make_limiter(limit=1, queue_timeout=0.01)
+    assert await limiter.acquire()
+
+    assert not await limiter.acquire()
+
+    assert limiter.rejected == 1
+    assert limiter.queued == 0
+    assert limiter.in_flight == 1
+
+
+async def test_a_slot_handed_over_as_the_timeout_fires_is_kept(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    limiter = make_limiter(limit=1, queue_timeout=1.0)
+    assert await limiter.acquire()
+
+    async def wait_for(future: Awaitable[Any], timeout: float) -> None:
+        # The holder finishes in the same iteration the timeout fires: the
+        # waiter already has its slot when the TimeoutError is raised
+        limiter.release(0.01)
+        assert asyncio.ensure_future(future).done()
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(admission.asyncio, "wait_for", wait_for)
+
+    assert await limiter.acquire()
+    assert limiter.rejected == 0
+    assert limiter.in_flight == 1
+    limiter.release(0.01)
+    assert limiter.in_flight == 0
+
+
+async def test_a_cancelled_waiter_leaves_the_queue_without_a_slot() -> None:
+    limiter = make_limiter(limit=1, queue_timeout=1.0)
+    assert await limiter.acquire()
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter.queued == 0
+
+    limiter.release(0.01)
+    assert limiter.in_flight == 0
+
+
+def _complete_window(limiter: AdaptiveLimiter, latency: float, used: int) -> None:
+    limiter.in_flight = used
+    limiter._window_peak = used
+    for _ in range(admission.WINDOW_SAMPLES):
+        limiter.in_flight += 1
+        limiter.release(latency)
+
+
+async def test_the_limit_shrinks_when_latency_rises() -> None:
+    limiter = make_limiter(limit=20)
+    _complete_window(limiter, 0.01, used=20)
+    baseline = limiter.limit
+
+    _complete_window(limiter, 0.1, used=20)
+
+    assert limiter.gradient < 1.0
+    assert limiter.limit < baseline
+
+
+async def test_the_limit_grows_only_while_it_is_used() -> None:
+    limiter = make_limiter(limit=20)
+    _complete_window(limiter, 0.01, used=2)
+    assert limiter.limit == 20
+
+    _complete_window(limiter, 0.01, used=20)
+
+    assert limiter.gradient == 1.0
+    assert limiter.limit > 20
+
+
+async def test_low_priority_requests_are_shed_while_a_critical_route_is_congested() -> (
+    None
+):
+    controller = AdmissionController({"/check": "critical", "/login": "low"}, 1.0)
+    critical = controller.limiter("/check")
+    low = controller.limiter("/login")
+    assert controller.may_queue(low)
+
+    critical.gradient = 0.5
+
+    assert not controller.may_queue(low)
+    assert controller.may_queue(controller.limiter("/other"))
+    assert critical.priority == "critical"
+
+
+async def test_unknown_paths_share_one_limiter() -> None:
+    controller = AdmissionController({}, 1.0)
+    controller.set_routes(["/known"])
+
+    assert controller.limiter("/known").route == "/known"
+    assert controller.limiter("/unknown-1") is controller.limiter("/unknown-2")
+    assert controller.limiter("/unknown-1").route == admission.OTHER_ROUTE
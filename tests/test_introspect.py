@@ -0,0 +1,64 @@
+import uuid
+from typing import Dict, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.role import Role
+from app.services.jwt_handler import JWTHandler
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    with TestClient(app) as client:
+        yield client
+
+
+def _headers(role: Role) -> Dict[str, str]:
+    token = JWTHandler.generate_jwt(
+        {
+            "session_id": str(uuid.uuid4()),
+            "user_id": f"{role.value.lower()}-service",
+            "role": role.value,
+        }
+    )
+    return {
+        "x-authscheme": "jwt",
+        "x-caller": "gateway",
+        "x-correlationid": str(uuid.uuid4()),
+        "Authorization": f"Bearer {token}",
+    }
+
+
+def _batch(role: Role) -> Dict[str, object]:
+    token = _headers(role)["Authorization"].partition(" ")[2]
+    return {"items": [{"scheme": "jwt", "token": token}]}
+
+
+def test_callers_without_the_permission_are_forbidden(client: TestClient) -> None:
+    response = client.post(
+        "/auth/introspect/batch", headers=_headers(Role.USER), json=_batch(Role.USER)
+    )
+
+    assert response.status_code == 403
+
+
+def test_unauthenticated_callers_are_rejected(client: TestClient) -> None:
+    headers = _headers(Role.ADMIN)
+    headers["Authorization"] = "Bearer not-a-token"
+
+    response = client.post(
+        "/auth/introspect/batch", headers=headers, json=_batch(Role.USER)
+    )
+
+    assert response.status_code == 401
+
+
+def test_trusted_callers_introspect_tokens(client: TestClient) -> None:
+    response = client.post(
+        "/auth/introspect/batch", headers=_headers(Role.ADMIN), json=_batch(Role.USER)
+    )
+
+    assert response.status_code == 200
+    assert [result["active"] for result in response.json()["results"]] == [True]
@@ -0,0 +1,57 @@
+import logging
+import queue
+from logging.handlers import QueueListener
+from typing import List, Tuple
+
+from app.config.logging_config import (
+    REDACTED,
+    RedactionFilter,
+    _DeferredQueueHandler,
+)
+
+
+class _Collect(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(self.format(record))
+
+
+def _pipeline() -> Tuple[logging.Logger, _Collect, QueueListener]:
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    output = _Collect()
+    output.addFilter(RedactionFilter())
+    # Started by the tests once they have logged, so the listener formats
+    # nothing early
+    listener = QueueListener(log_queue, output)
+    logger = logging.getLogger("test_logging_config")
+    logger.propagate = False
+    logger.handlers = [_DeferredQueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    return logger, output, listener
+
+
+def test_a_malformed_record_doesnt_stop_the_listener() -> None:
+    logger, output, listener = _pipeline()
+    logger.info("%s and %d", "session_id=abc")
+    logger.info("after eyJhbGciOi.eyJzdWIiOi.c2lnbmF0dXJl")
+    listener.start()
+    listener.stop()
+
+    assert output.messages == [
+        "%s and %d [unformatted: arguments didn't match]",
+        f"after {REDACTED}",
+    ]
+
+
+def test_arguments_are_formatted_when_logged() -> None:
+    logger, output, listener = _pipeline()
+    roles = ["user"]
+    logger.info("roles %s", roles)
+    roles.append("admin")
+    listener.start()
+    listener.stop()
+
+    assert output.messages == ["roles ['user']"]
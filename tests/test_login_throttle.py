@@ -0,0 +1,139 @@
+import dataclasses
+import math
+from typing import Tuple
+
+import pytest
+
+from app.config.settings import get_settings
+from app.services import login_throttle
+from app.services.login_throttle import (
+    LoginThrottle,
+    acquire_login,
+    login_keys,
+    record_login_failure,
+)
+
+
+def test_attempts_beyond_the_burst_wait_for_the_refill() -> None:
+    throttle = LoginThrottle("username", burst=2, rate=0.5)
+
+    for _ in range(2):
+        assert throttle.check("alice", now=0) == 0
+        throttle.take("alice", now=0)
+
+    assert throttle.check("alice", now=0) == pytest.approx(2.0)
+    assert throttle.check("alice", now=2.0) == 0
+    assert throttle.check("bob", now=0) == 0
+    assert throttle.rejected == 1
+
+
+def test_a_zero_rate_never_refills() -> None:
+    throttle = LoginThrottle("caller", burst=1, rate=0)
+    throttle.take("caller", now=0)
+
+    assert throttle.check("caller", now=1000) == math.inf
+
+
+def test_repeated_failures_lock_the_key_for_doubling_periods() -> None:
+    throttle = LoginThrottle(
+        "username", burst=100, rate=1, lockout_after=2, lockout_base=1, lockout_max=3
+    )
+
+    throttle.record_failure("alice", now=0)
+    assert throttle.check("alice", now=0) == 0
+    throttle.record_failure("alice", now=0)
+    assert throttle.check("alice", now=0) == pytest.approx(1)
+    throttle.record_failure("alice", now=0)
+    assert throttle.check("alice", now=0) == pytest.approx(2)
+    throttle.record_failure("alice", now=0)
+    assert throttle.check("alice", now=0) == pytest.approx(3)
+
+    throttle.reset("alice")
+    assert throttle.check("alice", now=0) == 0
+
+
+def test_failures_outside_the_window_are_forgotten() -> None:
+    throttle = LoginThrottle(
+        "username", burst=100, rate=1, lockout_after=2, failure_window=10
+    )
+
+    throttle.record_failure("alice", now=0)
+    throttle.record_failure("alice", now=20)
+
+    assert throttle.check("alice", now=20) == 0
+
+
+def test_keys_are_bounded_per_shard() -> None:
+    throttle = LoginThrottle("ip", burst=1, rate=1, num_shards=4, max_entries=8)
+
+    for index in range(100):
+        throttle.take(f"10.0.0.{index}", now=0)
+
+    assert len(throttle) <= 8
+
+
+@pytest.fixture
+def throttles(monkeypatch: pytest.MonkeyPatch) -> Tuple[LoginThrottle, ...]:
+    throttles = (
+        LoginThrottle("username", burst=5, rate=0),
+        LoginThrottle("ip", burst=1, rate=0),
+        LoginThrottle("caller", burst=5, rate=0),
+    )
+    monkeypatch.setattr(login_throttle, "get_throttles", lambda: throttles)
+    return throttles
+
+
+def test_a_login_takes_an_attempt_from_every_dimension(
+    throttles: Tuple[LoginThrottle, ...],
+) -> None:
+    assert acquire_login(["alice", "10.0.0.1", "app"]) == 0
+
+    assert throttles[0].check("alice", now=0) == 0
+    assert throttles[1].check("10.0.0.1") == math.inf
+    assert throttles[2].check("app") == 0
+
+
+def test_a_rejected_login_takes_nothing_from_the_other_dimensions(
+    throttles: Tuple[LoginThrottle, ...],
+) -> None:
+    assert acquire_login(["alice", "10.0.0.1", "app"]) == 0
+    for _ in range(10):
+        assert acquire_login(["bob", "10.0.0.1", "app"]) == math.inf
+
+    # Only the first login used up bob's IP; bob and the caller are untouched
+    username, _, caller = throttles
+    for _ in range(5):
+        assert username.check("bob") == 0
+        username.take("bob")
+    for _ in range(4):
+        assert caller.check("app") == 0
+        caller.take("app")
+
+
+def test_missing_dimensions_are_not_limited(
+    throttles: Tuple[LoginThrottle, ...],
+) -> None:
+    for _ in range(3):
+        assert acquire_login(["alice", None, None]) == 0
+
+
+def test_one_ip_failing_logins_doesnt_lock_out_other_usernames(
+    throttles: Tuple[LoginThrottle, ...],
+) -> None:
+    # No trusted proxy: every client arrives with the proxy's address
+    for index in range(100):
+        keys = login_keys(f"user-{index}", "10.0.0.1", None)
+        assert acquire_login(keys) == 0
+        record_login_failure(keys)
+
+    assert acquire_login(login_keys("alice", "10.0.0.1", None)) == 0
+
+
+def test_the_ip_is_limited_once_enabled(
+    throttles: Tuple[LoginThrottle, ...], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = dataclasses.replace(get_settings(), login_throttle_ip_enabled=True)
+    monkeypatch.setattr(login_throttle, "get_settings", lambda: settings)
+
+    assert acquire_login(login_keys("alice", "10.0.0.1", None)) == 0
+    assert acquire_login(login_keys("bob", "10.0.0.1", None)) == math.inf
@@ -0,0 +1,102 @@
+import asyncio
+import dataclasses
+import uuid
+
+import pytest
+
+from app.config.settings import get_settings
+from app.error.py_error import ShipotleError
+from app.services import refresh_token_service
+from app.services.refresh_token_service import RefreshTokenService
+from app.services.revocation_service import RevocationService
+from app.services.session_backend import InMemorySessionBackend, SessionBackend
+from app.services.session_service import SessionService
+from tests.conftest import make_session
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_revoking_a_user_ends_all_of_their_families(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    user_id = f"user-{uuid.uuid4()}"
+    logins = [make_session(user_id=user_id) for _ in range(3)]
+    for login in logins:
+        await RefreshTokenService.issue(login)
+    other = make_session(user_id="someone-else")
+    await RefreshTokenService.issue(other)
+
+    assert await RefreshTokenService.revoke_user_families(user_id) == 3
+
+    for login in logins:
+        assert await session_backend.get_refresh_token(login.session_id) is None
+        # Access tokens carry the family as their session_id
+        assert RevocationService.is_revoked(login.session_id)
+    assert await session_backend.get_refresh_token(other.session_id) is not None
+    assert not RevocationService.is_revoked(other.session_id)
+    assert await RefreshTokenService.revoke_user_families(user_id) == 0
+
+
+async def test_rotation_replaces_the_refresh_token(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    login = make_session()
+    token = await RefreshTokenService.issue(login)
+
+    record, rotated = await RefreshTokenService.rotate(token)
+
+    assert record.family_id == login.session_id
+    assert record.user_id == login.user_id
+    assert rotated != token
+    assert rotated.partition(".")[0] == login.session_id
+    _, rotated_again = await RefreshTokenService.rotate(rotated)
+    assert rotated_again not in (token, rotated)
+
+
+async def test_reusing_a_rotated_token_revokes_the_family(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    login = make_session()
+    token = await RefreshTokenService.issue(login)
+    _, rotated = await RefreshTokenService.rotate(token)
+
+    with pytest.raises(ShipotleError) as reused:
+        await RefreshTokenService.rotate(token)
+
+    assert reused.value.error_response.api_response_code == ShipotleError.AUTHORIZATION
+    assert reused.value.error_response.message == "Refresh token has been revoked"
+    assert await session_backend.get_refresh_token(login.session_id) is None
+    assert RevocationService.is_revoked(login.session_id)
+    # The legitimate holder's current token died with the family
+    with pytest.raises(ShipotleError):
+        await RefreshTokenService.rotate(rotated)
+
+
+@pytest.mark.parametrize("token", ["", "no-secret", ".secret", "unknown.secret"])
+async def test_malformed_and_unknown_tokens_are_rejected(
+    session_backend: InMemorySessionBackend, token: str
+) -> None:
+    with pytest.raises(ShipotleError) as rejected:
+        await RefreshTokenService.rotate(token)
+
+    assert rejected.value.error_response.message == "Invalid refresh token"
+
+
+async def test_a_login_beyond_the_limit_ends_the_oldest_family(
+    backend: SessionBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    settings = dataclasses.replace(get_settings(), refresh_token_max_per_user=2)
+    monkeypatch.setattr(refresh_token_service, "get_settings", lambda: settings)
+    monkeypatch.setattr(SessionService, "backend", backend)
+    user_id = f"user-{uuid.uuid4()}"
+    logins = [make_session(user_id=user_id) for _ in range(3)]
+    for login in logins:
+        await RefreshTokenService.issue(login)
+        # Distinct created_at, in the milliseconds MongoDB keeps
+        await asyncio.sleep(0.002)
+
+    assert await backend.get_refresh_token(logins[0].session_id) is None
+    assert RevocationService.is_revoked(logins[0].session_id)
+    assert sorted(await backend.list_user_refresh_families(user_id)) == sorted(
+        login.session_id for login in logins[1:]
+    )
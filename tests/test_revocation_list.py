@@ -0,0 +1,68 @@
+import time
+
+from app.services.revocation_list import BloomFilter, RevocationList
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(1000)
+    items = [f"jti-{index}" for index in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positives_stay_near_the_error_rate() -> None:
+    bloom = BloomFilter(10_000, error_rate=0.01)
+    for index in range(10_000):
+        bloom.add(f"jti-{index}")
+
+    false_positives = sum(f"other-{index}" in bloom for index in range(10_000))
+
+    assert false_positives < 10_000 * 0.01 * 2
+
+
+def test_revoked_ids_are_reported_until_they_expire() -> None:
+    revocations = RevocationList(capacity=100)
+    now = time.time()
+    revocations.revoke("live", now + 60)
+    revocations.revoke("expired", now - 1)
+
+    assert revocations.is_revoked("live")
+    assert not revocations.is_revoked("expired")
+    assert not revocations.is_revoked("never-revoked")
+    assert len(revocations) == 1
+
+
+def test_prune_drops_expired_entries_but_keeps_extended_ones() -> None:
+    revocations = RevocationList(capacity=100)
+    now = time.time()
+    revocations.revoke("short", now + 10)
+    revocations.revoke("extended", now + 10)
+    revocations.revoke("extended", now + 100)
+
+    assert revocations.prune(now + 50) == 1
+
+    assert len(revocations) == 1
+    assert revocations.is_revoked("extended")
+
+
+def test_the_filter_grows_past_its_capacity() -> None:
+    revocations = RevocationList(capacity=10)
+    expires_at = time.time() + 60
+    for index in range(100):
+        revocations.revoke(f"jti-{index}", expires_at)
+
+    assert all(revocations.is_revoked(f"jti-{index}") for index in range(100))
+    assert revocations._bloom.capacity >= 100
+
+
+def test_bloom_hits_for_unknown_ids_are_counted_as_false_positives() -> None:
+    revocations = RevocationList(capacity=1, error_rate=0.5)
+    revocations.revoke("jti", time.time() + 60)
+
+    checked = [f"other-{index}" for index in range(200)]
+    results = [revocations.is_revoked(jti) for jti in checked]
+
+    assert not any(results)
+    assert revocations.false_positives > 0
@@ -0,0 +1,47 @@
+import dataclasses
+import os
+from typing import Any
+
+import pytest
+
+from app import serve
+from app.config.settings import get_settings
+
+
+@pytest.fixture
+def memory_backend(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = dataclasses.replace(
+        get_settings(), session_backend="memory", session_persist_dir=None
+    )
+    monkeypatch.setattr(serve, "get_settings", lambda: settings)
+    # share_sessions sets it for the workers; monkeypatch restores it afterwards
+    monkeypatch.setenv("SESSION_BACKEND", "memory")
+
+
+def test_workers_share_sessions_through_shm_when_the_tables_fit(
+    memory_backend: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(serve, "shm_free_bytes", lambda tables: 2**40)
+
+    assert serve.share_sessions(4) == 4
+    assert os.environ["SESSION_BACKEND"] == "shm"
+
+
+def test_a_single_worker_runs_when_the_tables_dont_fit(
+    memory_backend: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Docker's default /dev/shm
+    monkeypatch.setattr(serve, "shm_free_bytes", lambda tables: 64 * 2**20)
+
+    assert serve.share_sessions(4) == 1
+    assert os.environ["SESSION_BACKEND"] == "memory"
+
+
+def test_table_files_from_an_earlier_run_count_as_free(tmp_path: Any) -> None:
+    tables = {str(tmp_path / "aitext-sessions"): (100, 16)}
+    before = serve.shm_free_bytes(tables)
+    with open(tmp_path / "aitext-sessions", "wb") as f:
+        f.write(b"\1" * 2**20)
+
+    # The file's blocks came out of the free space but are reused
+    assert serve.shm_free_bytes(tables) >= before - 2**16
@@ -0,0 +1,260 @@
+import dataclasses
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+
+from app.config.settings import get_settings
+from app.services.session_backend import SessionBackend
+from app.services.session_store import RefreshTokenRecord
+from tests.conftest import make_session, utc_now
+
+pytestmark = pytest.mark.anyio
+
+
+def make_refresh_token(
+    family_id: str = "family-1",
+    user_id: str = "user-1",
+    digest: str = "digest-1",
+    age: float = 0.0,
+) -> RefreshTokenRecord:
+    now = utc_now()
+    return RefreshTokenRecord(
+        family_id=family_id,
+        user_id=user_id,
+        role="User",
+        token_digest=digest,
+        created_at=now - timedelta(seconds=age),
+        expiry_time=now + timedelta(days=7),
+    )
+
+
+async def test_create_then_get_returns_the_session(backend: SessionBackend) -> None:
+    session = make_session()
+
+    assert await backend.create(session) == session.session_id
+    record = await backend.get(session.session_id)
+
+    assert record is not None
+    assert record.session_id == session.session_id
+    assert record.user_id == session.user_id
+    assert record.role == session.role
+    assert record.created_at == session.created_at
+    assert record.expiry_time == session.expiry_time
+    assert not record.is_expired()
+
+
+async def test_get_unknown_session_returns_none(backend: SessionBackend) -> None:
+    assert await backend.get("00000000-0000-4000-8000-000000000000") is None
+
+
+async def test_touch_moves_the_expiry(backend: SessionBackend) -> None:
+    session = make_session(lifetime=60)
+    await backend.create(session)
+    expiry_time = session.expiry_time + timedelta(hours=2)
+
+    await backend.touch(session.session_id, expiry_time)
+
+    record = await backend.get(session.session_id)
+    assert record is not None
+    assert record.expiry_time == expiry_time
+
+
+async def test_touch_ignores_unknown_sessions(backend: SessionBackend) -> None:
+    await backend.touch("00000000-0000-4000-8000-000000000000", utc_now())
+
+    assert await backend.get("00000000-0000-4000-8000-000000000000") is None
+
+
+async def test_delete_reports_whether_the_session_existed(
+    backend: SessionBackend,
+) -> None:
+    session = make_session()
+    await backend.create(session)
+
+    assert await backend.delete(session.session_id) is True
+    assert await backend.get(session.session_id) is None
+    assert await backend.delete(session.session_id) is False
+
+
+async def test_expired_sessions_are_not_served(backend: SessionBackend) -> None:
+    session = make_session(age=7200, lifetime=3600)
+    await backend.create(session)
+
+    record = await backend.get(session.session_id)
+
+    assert record is None or record.is_expired()
+    assert await backend.list_user_sessions(session.user_id) == []
+
+
+async def test_list_user_sessions_returns_only_that_user_oldest_first(
+    backend: SessionBackend,
+) -> None:
+    newest = make_session(age=10)
+    oldest = make_session(age=30)
+    middle = make_session(age=20)
+    for session in (newest, oldest, middle):
+        await backend.create(session)
+    await backend.create(make_session(user_id="user-2"))
+
+    records = await backend.list_user_sessions("user-1")
+
+    assert [record.session_id for record in records] == [
+        oldest.session_id,
+        middle.session_id,
+        newest.session_id,
+    ]
+
+
+async def test_trim_user_sessions_removes_the_oldest(backend: SessionBackend) -> None:
+    sessions = [make_session(age=age) for age in (30, 20, 10)]
+    for session in sessions:
+        await backend.create(session)
+
+    evicted = await backend.trim_user_sessions("user-1", 2)
+
+    assert evicted == [sessions[0].session_id]
+    assert await backend.get(sessions[0].session_id) is None
+    remaining = await backend.list_user_sessions("user-1")
+    assert [record.session_id for record in remaining] == [
+        sessions[1].session_id,
+        sessions[2].session_id,
+    ]
+
+
+async def test_delete_user_sessions_removes_every_session_of_the_user(
+    backend: SessionBackend,
+) -> None:
+    for age in (30, 20, 10):
+        await backend.create(make_session(age=age))
+    other = make_session(user_id="user-2")
+    await backend.create(other)
+
+    assert await backend.delete_user_sessions("user-1") == 3
+
+    assert await backend.list_user_sessions("user-1") == []
+    assert await backend.get(other.session_id) is not None
+
+
+async def test_refresh_token_round_trip(backend: SessionBackend) -> None:
+    record = make_refresh_token()
+
+    await backend.save_refresh_token(record)
+    stored = await backend.get_refresh_token(record.family_id)
+
+    assert stored is not None
+    assert stored.user_id == record.user_id
+    assert stored.role == record.role
+    assert stored.token_digest == record.token_digest
+    assert stored.expiry_time == record.expiry_time
+    assert await backend.get_refresh_token("unknown-family") is None
+
+
+async def test_rotate_refresh_token_is_a_compare_and_swap(
+    backend: SessionBackend,
+) -> None:
+    record = make_refresh_token()
+    await backend.save_refresh_token(record)
+    expiry_time = record.expiry_time + timedelta(days=1)
+
+    assert await backend.rotate_refresh_token(
+        record.family_id, "digest-1", "digest-2", expiry_time
+    )
+    # The digest was already rotated away: a second use of the same token fails
+    assert not await backend.rotate_refresh_token(
+        record.family_id, "digest-1", "digest-3", expiry_time
+    )
+    assert not await backend.rotate_refresh_token(
+        "unknown-family", "digest-1", "digest-3", expiry_time
+    )
+
+    stored = await backend.get_refresh_token(record.family_id)
+    assert stored is not None
+    assert stored.token_digest == "digest-2"
+    assert stored.expiry_time == expiry_time
+
+
+async def test_delete_refresh_token(backend: SessionBackend) -> None:
+    record = make_refresh_token()
+    await backend.save_refresh_token(record)
+
+    assert await backend.delete_refresh_token(record.family_id) is True
+    assert await backend.get_refresh_token(record.family_id) is None
+    assert await backend.delete_refresh_token(record.family_id) is False
+
+
+async def test_revoked_tokens_are_loaded_until_they_expire(
+    backend: SessionBackend,
+) -> None:
+    now = utc_now()
+    await backend.revoke_token("jti-live", now + timedelta(hours=1))
+    await backend.revoke_token("jti-expired", now - timedelta(seconds=1))
+
+    revoked = await backend.load_revoked_tokens()
+
+    assert revoked == {"jti-live": now + timedelta(hours=1)}
+
+
+async def test_load_revoked_tokens_since_returns_only_newer_revocations(
+    backend: SessionBackend,
+) -> None:
+    now = utc_now()
+    await backend.revoke_token("jti-old", now + timedelta(hours=1))
+    since = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=1)
+
+    assert await backend.load_revoked_tokens(since) == {}
+    assert "jti-old" in await backend.load_revoked_tokens(since - timedelta(hours=1))
+
+
+async def test_refresh_families_are_listed_by_user(backend: SessionBackend) -> None:
+    for family_id, user_id in (("family-1", "user-1"), ("family-2", "user-1")):
+        await backend.save_refresh_token(make_refresh_token(family_id, user_id))
+    await backend.save_refresh_token(make_refresh_token("family-3", "user-2"))
+
+    assert sorted(await backend.list_user_refresh_families("user-1")) == [
+        "family-1",
+        "family-2",
+    ]
+
+    await backend.rotate_refresh_token(
+        "family-1", "digest-1", "digest-2", utc_now() + timedelta(days=8)
+    )
+    await backend.delete_refresh_token("family-2")
+
+    assert await backend.list_user_refresh_families("user-1") == ["family-1"]
+    assert await backend.list_user_refresh_families("user-2") == ["family-3"]
+    assert await backend.list_user_refresh_families("user-3") == []
+
+
+async def test_trim_user_refresh_families_removes_the_oldest(
+    backend: SessionBackend,
+) -> None:
+    for family_id, age in (("family-1", 30), ("family-2", 20), ("family-3", 10)):
+        await backend.save_refresh_token(make_refresh_token(family_id, age=age))
+    await backend.save_refresh_token(make_refresh_token("family-4", "user-2", age=40))
+
+    evicted = await backend.trim_user_refresh_families("user-1", 2)
+
+    assert evicted == ["family-1"]
+    assert await backend.get_refresh_token("family-1") is None
+    assert sorted(await backend.list_user_refresh_families("user-1")) == [
+        "family-2",
+        "family-3",
+    ]
+    assert await backend.list_user_refresh_families("user-2") == ["family-4"]
+
+
+@pytest.mark.parametrize(
+    "limit", ["session_max_per_user", "refresh_token_max_per_user"]
+)
+def test_shm_refuses_unlimited_sessions_per_user(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Any, limit: str
+) -> None:
+    from app.services import shm_session_backend
+    from app.services.shm_session_backend import SharedMemorySessionBackend
+
+    settings = dataclasses.replace(get_settings(), **{limit: 0})
+    monkeypatch.setattr(shm_session_backend, "get_settings", lambda: settings)
+
+    with pytest.raises(ValueError):
+        SharedMemorySessionBackend(path=str(tmp_path / "aitext"), capacity=100)
@@ -0,0 +1,103 @@
+import time
+import uuid
+
+import pytest
+
+from app.services.session_backend import InMemorySessionBackend
+from app.services.session_ids import (
+    ENCODED_SIZE,
+    SessionIdCodec,
+    shard_hint,
+)
+from app.services.session_service import SessionService
+from tests.conftest import make_session
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def codec() -> SessionIdCodec:
+    return SessionIdCodec(b"k" * 32)
+
+
+def test_new_ids_pass_the_check(codec: SessionIdCodec) -> None:
+    session_id = codec.new(time.time() + 60)
+
+    assert len(session_id) == ENCODED_SIZE
+    assert codec.check(session_id) is None
+    assert shard_hint(session_id) in range(64)
+    assert codec.new(time.time() + 60) != session_id
+
+
+def test_the_embedded_expiry_is_returned_and_enforced(codec: SessionIdCodec) -> None:
+    expires_at = int(time.time()) + 60
+    session_id = codec.new(expires_at)
+
+    assert codec.expires_at(session_id) == expires_at
+    assert codec.check(session_id, now=expires_at) == "expired"
+
+
+def test_ids_signed_with_another_key_are_forged(codec: SessionIdCodec) -> None:
+    other = SessionIdCodec(b"o" * 32)
+
+    assert codec.check(other.new(time.time() + 60)) == "forged"
+
+
+def test_a_changed_character_makes_the_id_forged(codec: SessionIdCodec) -> None:
+    session_id = codec.new(time.time() + 60)
+    changed = (
+        session_id[:20] + ("A" if session_id[20] != "A" else "B") + session_id[21:]
+    )
+
+    assert codec.check(changed) == "forged"
+
+
+@pytest.mark.parametrize("session_id", ["", "short", "!" * ENCODED_SIZE, "x" * 100])
+def test_garbage_is_malformed(codec: SessionIdCodec, session_id: str) -> None:
+    assert codec.check(session_id) == "malformed"
+    assert codec.expires_at(session_id) is None
+    assert shard_hint(session_id) is None
+
+
+def test_legacy_ids_pass_only_while_accepted(codec: SessionIdCodec) -> None:
+    legacy = str(uuid.uuid4())
+
+    assert codec.is_legacy(legacy)
+    assert codec.check(legacy) is None
+    assert codec.expires_at(legacy) is None
+    assert SessionIdCodec(b"k" * 32, accept_legacy=False).check(legacy) == "malformed"
+
+
+async def test_migrating_a_legacy_session_twice_returns_the_same_id(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    legacy = make_session()
+    await session_backend.create(legacy)
+
+    first = await SessionService.migrate_session(legacy)
+    second = await SessionService.migrate_session(legacy)
+
+    assert first == second
+    assert not SessionService.is_legacy_session_id(first)
+    sessions = await session_backend.list_user_sessions(legacy.user_id)
+    assert sorted(record.session_id for record in sessions) == sorted(
+        [legacy.session_id, first]
+    )
+
+
+async def test_migration_applies_the_per_user_session_limit(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    from app.config.settings import get_settings
+
+    limit = get_settings().session_max_per_user
+    sessions = [make_session(age=100 - age) for age in range(limit)]
+    for session in sessions:
+        await session_backend.create(session)
+
+    migrated = await SessionService.migrate_session(sessions[-1])
+
+    remaining = await session_backend.list_user_sessions("user-1")
+    assert len(remaining) == limit
+    assert sessions[0].session_id not in {record.session_id for record in remaining}
+    assert migrated in {record.session_id for record in remaining}
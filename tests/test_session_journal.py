@@ -0,0 +1,131 @@
+import os
+from datetime import timedelta
+from typing import Any
+
+import pytest
+
+from app.services.session_backend import InMemorySessionBackend
+from app.services.session_journal import (
+    SessionJournal,
+    decode_frames,
+    encode_delete,
+    encode_put,
+)
+from app.services.session_store import SessionRecord, ShardedSessionStore
+from tests.conftest import make_session
+
+pytestmark = pytest.mark.anyio
+
+
+def make_backend(directory: str) -> InMemorySessionBackend:
+    return InMemorySessionBackend(
+        ShardedSessionStore(num_shards=4),
+        SessionJournal(directory, fsync_interval=60, snapshot_interval=3600),
+    )
+
+
+def test_frames_round_trip_strings_longer_than_a_byte() -> None:
+    record = SessionRecord.from_session_info(
+        make_session(user_id="u" * 300, role="r" * 256)
+    )
+
+    frames = list(decode_frames(encode_put(record) + encode_delete("s" * 1000)))
+
+    assert len(frames) == 2
+    decoded = frames[0][1]
+    assert isinstance(decoded, SessionRecord)
+    assert decoded.user_id == record.user_id
+    assert decoded.role == record.role
+    assert decoded.session_id == record.session_id
+    assert frames[1][1] == "s" * 1000
+
+
+def test_decoding_stops_at_a_torn_frame() -> None:
+    first = encode_delete("first")
+    second = encode_delete("second")
+
+    frames = list(decode_frames(first + second[:-1]))
+
+    assert [value for _, value in frames] == ["first"]
+
+
+async def test_sessions_survive_a_restart(tmp_path: Any) -> None:
+    directory = str(tmp_path)
+    backend = make_backend(directory)
+    await backend.start()
+    kept, touched, deleted = (make_session() for _ in range(3))
+    for session in (kept, touched, deleted):
+        await backend.create(session)
+    expiry_time = touched.expiry_time + timedelta(hours=1)
+    await backend.touch(touched.session_id, expiry_time)
+    await backend.delete(deleted.session_id)
+    await backend.close()
+
+    restarted = make_backend(directory)
+    await restarted.start()
+    try:
+        assert await restarted.get(kept.session_id) is not None
+        record = await restarted.get(touched.session_id)
+        assert record is not None
+        assert record.expiry_time == expiry_time
+        assert await restarted.get(deleted.session_id) is None
+    finally:
+        await restarted.close()
+
+
+async def test_the_log_is_replayed_after_a_crash(tmp_path: Any) -> None:
+    directory = str(tmp_path)
+    backend = make_backend(directory)
+    await backend.start()
+    session = make_session(user_id="x" * 300)
+    await backend.create(session)
+    journal = backend.journal
+    assert journal is not None and journal._task is not None
+    await journal.flush()
+    # Stop without the snapshot of a clean shutdown, leaving only the log
+    journal._task.cancel()
+    for file in (journal._log, journal._lock_file):
+        assert file is not None
+        file.close()
+
+    restarted = make_backend(directory)
+    await restarted.start()
+    try:
+        record = await restarted.get(session.session_id)
+        assert record is not None
+        assert record.user_id == session.user_id
+    finally:
+        await restarted.close()
+
+
+async def test_a_failed_flush_keeps_the_records_for_the_next_one(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    directory = str(tmp_path)
+    backend = make_backend(directory)
+    await backend.start()
+    journal = backend.journal
+    assert journal is not None
+    first = make_session()
+    await backend.create(first)
+
+    def failing_fsync(descriptor: int) -> None:
+        raise OSError("disk full")
+
+    # The records reach the file, but aren't known to be durable
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        await journal.flush()
+    second = make_session()
+    await backend.create(second)
+    monkeypatch.undo()
+    await journal.flush()
+
+    log_path = os.path.join(directory, f"sessions.{journal.generation}.log")
+    with open(log_path, "rb") as f:
+        frames = list(decode_frames(f.read()))
+    assert [getattr(value, "session_id") for _, value in frames] == [
+        first.session_id,
+        second.session_id,
+    ]
+    await backend.close()
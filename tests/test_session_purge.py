@@ -0,0 +1,71 @@
+import asyncio
+import dataclasses
+from typing import Any
+
+import pytest
+
+from app.config.settings import get_settings
+from app.services import session_backend
+from app.services.session_backend import InMemorySessionBackend, purge_periodically
+from app.services.session_store import ShardedSessionStore
+from tests.conftest import make_session
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_purge_runs_every_interval_and_survives_errors() -> None:
+    calls = []
+
+    def purge() -> int:
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return 1
+
+    task = asyncio.create_task(purge_periodically(purge, 0.001))
+    while len(calls) < 3:
+        await asyncio.sleep(0.001)
+    task.cancel()
+
+    assert len(calls) >= 3
+
+
+@pytest.mark.parametrize("interval", [0.001, 0])
+async def test_memory_backend_purges_expired_sessions_in_the_background(
+    monkeypatch: pytest.MonkeyPatch, interval: float
+) -> None:
+    settings = dataclasses.replace(get_settings(), session_purge_seconds=interval)
+    monkeypatch.setattr(session_backend, "get_settings", lambda: settings)
+    store = ShardedSessionStore(num_shards=4)
+    backend = InMemorySessionBackend(store)
+    await backend.start()
+    try:
+        await backend.create(make_session(age=7200, lifetime=3600))
+        for _ in range(50):
+            await asyncio.sleep(0.005)
+        assert len(store) == (0 if interval else 1)
+    finally:
+        await backend.close()
+
+
+async def test_shm_backend_purges_expired_sessions_in_the_background(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Any
+) -> None:
+    from app.services import shm_session_backend
+    from app.services.shm_session_backend import SharedMemorySessionBackend
+
+    settings = dataclasses.replace(get_settings(), session_purge_seconds=0.001)
+    monkeypatch.setattr(shm_session_backend, "get_settings", lambda: settings)
+    backend = SharedMemorySessionBackend(
+        path=str(tmp_path / "aitext"), capacity=100, revocation_capacity=100
+    )
+    await backend.start()
+    try:
+        await backend.create(make_session(age=7200, lifetime=3600))
+        for _ in range(50):
+            if not len(backend.store):
+                break
+            await asyncio.sleep(0.005)
+        assert len(backend.store) == 0
+    finally:
+        await backend.close()
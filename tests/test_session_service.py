@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import pytest
+
+from app.services.session_backend import InMemorySessionBackend
+from app.services.session_service import SESSION_IDLE_TIMEOUT, SessionService
+from tests.conftest import make_session, utc_now
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_session_used_past_half_its_idle_timeout_is_extended(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    session_id = await SessionService.create_session(make_session())
+    await session_backend.touch(session_id, utc_now() + timedelta(minutes=20))
+
+    session_info = await SessionService.get_session(session_id)
+
+    record = await session_backend.get(session_id)
+    assert record is not None
+    assert record.expiry_time > utc_now() + SESSION_IDLE_TIMEOUT / 2
+    assert session_info.expiry_time == record.expiry_time
+
+
+async def test_a_recently_extended_session_isnt_written_again(
+    session_backend: InMemorySessionBackend,
+) -> None:
+    session_id = await SessionService.create_session(make_session())
+    expiry_time = utc_now() + SESSION_IDLE_TIMEOUT - timedelta(minutes=5)
+    await session_backend.touch(session_id, expiry_time)
+
+    await SessionService.get_session(session_id)
+
+    record = await session_backend.get(session_id)
+    assert record is not None and record.expiry_time == expiry_time
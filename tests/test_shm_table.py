@@ -0,0 +1,88 @@
+import os
+from typing import Any, Optional, Tuple
+
+from app.services.shm_table import SharedHashTable, now_us
+
+
+def _future() -> int:
+    return now_us() + 60_000_000
+
+
+def test_entries_are_shared_by_every_opener_of_the_path(tmp_path: Any) -> None:
+    path = str(tmp_path / "table")
+    first = SharedHashTable(path, 100, 16)
+    second = SharedHashTable(path, 100, 16)
+    try:
+        first.put(b"key", b"value", _future())
+
+        entry = second.get(b"key")
+        assert entry is not None and entry[0] == b"value"
+        assert second.pop(b"key") is not None
+        assert first.get(b"key") is None
+    finally:
+        first.close()
+        second.close()
+
+
+def test_update_and_upsert_change_entries_atomically(tmp_path: Any) -> None:
+    table = SharedHashTable(str(tmp_path / "table"), 100, 16)
+    try:
+        expires_us = _future()
+        assert not table.update(b"key", lambda current: (b"new", expires_us))
+
+        def count(current: Optional[Tuple[bytes, int]]) -> Tuple[bytes, int]:
+            value = int(current[0]) + 1 if current is not None else 1
+            return str(value).encode(), expires_us
+
+        for _ in range(3):
+            table.upsert(b"key", count)
+        assert table.get(b"key") == (b"3", expires_us)
+
+        assert table.update(b"key", lambda current: None) is False
+        assert table.upsert(b"key", lambda current: None) is None
+        assert table.get(b"key") is None
+    finally:
+        table.close()
+
+
+def test_a_full_bucket_drops_expired_entries_first(tmp_path: Any) -> None:
+    table = SharedHashTable(str(tmp_path / "table"), 1, 16)
+    try:
+        # A single bucket: every key lands in it
+        assert table.bucket_count == 1
+        for index in range(table.capacity):
+            table.put(f"old-{index}".encode(), b"", now_us() - 1)
+
+        table.put(b"new", b"", _future())
+
+        assert table.get(b"new") is not None
+        assert table.expired_evictions == table.capacity
+        assert table.evictions == 0
+    finally:
+        table.close()
+
+
+def test_another_layout_gets_a_new_file_and_keeps_the_old_mapping(
+    tmp_path: Any,
+) -> None:
+    path = str(tmp_path / "table")
+    old = SharedHashTable(path, 100, 16)
+    old.put(b"key", b"value", _future())
+    old_inode = os.stat(path).st_ino
+
+    new = SharedHashTable(path, 100, 32)
+    try:
+        assert os.stat(path).st_ino != old_inode
+        assert new.get(b"key") is None
+        # The process with the old layout still reads its mapping safely
+        entry = old.get(b"key")
+        assert entry is not None and entry[0] == b"value"
+        assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+        reopened = SharedHashTable(path, 100, 32)
+        new.put(b"other", b"value", _future())
+        assert reopened.get(b"other") is not None
+        reopened.close()
+    finally:
+        old.close()
+        new.close()